@@ -18,6 +18,10 @@ def create_app(config_name=None):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     
+    # JSON 序列化（优先使用 orjson）
+    from app.utils.json_provider import init_json_provider
+    init_json_provider(app)
+    
     # 初始化扩展
     db.init_app(app)
     jwt.init_app(app)
@@ -27,13 +31,33 @@ def create_app(config_name=None):
         r"/api/*": {
             "origins": app.config.get('CORS_ORIGINS', ['http://localhost:3000', 'http://localhost:8080']),
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization", "X-Requested-With"]
+            "allow_headers": ["Content-Type", "Authorization", "X-Requested-With", "X-Read-Your-Writes"]
         }
     })
     
     # 配置日志
     configure_logging(app)
     
+    # SQLite 连接参数
+    from app.utils.sqlite_pragmas import configure_sqlite
+    with app.app_context():
+        configure_sqlite(app, db.engine)
+    
+    # 读写分离
+    if app.config.get('READ_ROUTING_ENABLED'):
+        from app.utils.db_routing import init_read_routing
+        init_read_routing(app, db)
+    
+    # 运行指标（需在响应压缩之前注册，记录压缩后的响应大小）
+    if app.config.get('METRICS_ENABLED'):
+        from app.utils.metrics import init_metrics
+        init_metrics(app, db)
+    
+    # 慢查询日志
+    if app.config.get('SLOW_QUERY_LOG_ENABLED'):
+        from app.utils.slow_queries import init_slow_query_log
+        init_slow_query_log(app, db)
+    
     # 注册蓝图
     from app.auth import auth_bp
     from app.api.ledger import ledger_bp
@@ -45,38 +69,64 @@ def create_app(config_name=None):
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
     app.register_blueprint(meta_bp, url_prefix='/api/meta')
     
+    # 响应压缩
+    if app.config.get('COMPRESS_ENABLED'):
+        from app.utils.compression import init_compression
+        init_compression(app)
+    
     # 错误处理
     register_error_handlers(app)
     
     # JWT错误处理
     register_jwt_handlers(jwt)
     
-    # 创建数据库表
-    with app.app_context():
-        db.create_all()
-        init_database(app)
+    # 注册CLI命令
+    from app.cli import register_commands
+    register_commands(app)
+    
+    # 创建表、执行迁移和写入初始数据；生产环境由 flask init-db 显式执行，worker 启动时不访问数据库
+    if app.config.get('AUTO_INIT_DB'):
+        with app.app_context():
+            setup_database(app)
+    
+    # 活动日志批量写入队列
+    if app.config.get('AUDIT_ASYNC'):
+        from app.utils.audit import init_audit_queue
+        init_audit_queue(app)
+    
+    # 后台构建自动补全索引
+    if app.config.get('SUGGESTION_INDEX_ENABLED'):
+        from app.utils.suggestions import init_suggestion_index
+        init_suggestion_index(app)
     
     app.logger.info(f'Application started in {config_name} mode')
 
-    # 打印所有注册的路由
-    for rule in app.url_map.iter_rules():
-        print(f"[ROUTE] {rule}")
-
     return app
 
+def setup_database(app):
+    """创建数据库表、补充新列和索引、写入初始数据并回填派生数据（可重复执行）"""
+    from app.utils.migrations import run_migrations
+    from app.utils.search import init_search
+    from app.utils.rollups import init_rollups
+    
+    db.create_all()
+    # 为已有数据库补充新列和索引（需在查询用户前完成）
+    run_migrations(app)
+    init_database(app)
+    
+    # 初始化全文索引
+    init_search(app)
+    
+    # 回填统计汇总表
+    init_rollups(app)
+
 def configure_logging(app):
     """配置日志"""
     if not os.path.exists('logs'):
         os.makedirs('logs')
     
-    # 使用不同的日志文件名
+    # 追加写入并按大小轮转，重启时保留历史日志
     log_file = app.config['LOG_FILE_PATH']
-    if os.path.exists(log_file):
-        try:
-            os.remove(log_file)
-        except:
-            pass
-    
     file_handler = RotatingFileHandler(
         log_file,
         maxBytes=app.config['LOG_MAX_BYTES'],
@@ -137,6 +187,21 @@ def register_error_handlers(app):
 
 def register_jwt_handlers(jwt):
     """注册JWT错误处理器"""
+    from app.utils.user_cache import is_token_revoked
+    
+    @jwt.token_in_blocklist_loader
+    def check_token_revoked(jwt_header, jwt_payload):
+        # 用户已删除或修改过密码的令牌视为已撤销（查询走进程内用户缓存）
+        return is_token_revoked(jwt_payload)
+    
+    @jwt.revoked_token_loader
+    def revoked_token_callback(jwt_header, jwt_payload):
+        return jsonify({
+            'success': False,
+            'message': 'Token has been revoked',
+            'error': 'Token revoked'
+        }), 401
+    
     @jwt.unauthorized_loader
     def unauthorized_callback(error):
         return jsonify({
@@ -173,10 +238,7 @@ def init_database(app):
     
     # 初始化省份数据
     if not Province.query.first():
-        provinces = [
-            '上海', '江苏', '浙江', '安徽', '福建', '江西', '山东', '其他', '另外'
-        ]
-        for province_name in provinces:
+        for province_name in app.config['PROVINCES']:
             province = Province(name=province_name)
             db.session.add(province)
         db.session.commit()
@@ -1,21 +1,32 @@
-from flask import Blueprint, request, jsonify, current_app, Response
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import LedgerEntry
 
 
-from app.models import db, User, ActivityLog
+from app.models import db, User, ActivityLog, LedgerDailyProvinceStat
 from app.utils.decorators import role_required
 from app.auth import log_activity
+from app.utils.rollups import rollup_start_day
+from app.utils.metrics import count_export_rows
+from app.utils.slow_queries import get_slow_query_log
+from app.utils.pagination import paginate_select, rows_to_dicts
+from app.utils.exporters import (
+    iter_csv, iter_file, file_size, write_docx, write_xlsx, EXPORT_BATCH_SIZE, XLSX_MIMETYPE, DOCX_MIMETYPE
+)
 from flask_cors import CORS
-import csv
-import io
-from openpyxl import Workbook
-from docx import Document
-from docx.shared import Pt
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
 
 admin_bp = Blueprint('admin', __name__)
 CORS(admin_bp)
 
+# 用户列表可用的排序字段
+USER_SORT_COLUMNS = {
+    'created_at': User.created_at,
+    'entry_count': User.entry_count,
+    'username': User.username,
+}
+
 @admin_bp.route('/logs', methods=['GET'])
 @jwt_required()
 @role_required(['admin'])
@@ -39,20 +50,29 @@ def get_activity_logs():
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
-        # 构建查询
-        query = ActivityLog.query
+        # 构建查询（列投影，录入人员在同一语句中 left join）
+        query = select(
+            ActivityLog.id,
+            ActivityLog.timestamp,
+            ActivityLog.level,
+            ActivityLog.message,
+            ActivityLog.user_id,
+            User.username,
+            ActivityLog.details,
+            ActivityLog.ip_address
+        ).outerjoin(User, User.id == ActivityLog.user_id)
         
         if level and level in ['INFO', 'WARNING', 'ERROR']:
-            query = query.filter_by(level=level)
+            query = query.where(ActivityLog.level == level)
         
         if user_id:
-            query = query.filter_by(user_id=user_id)
+            query = query.where(ActivityLog.user_id == user_id)
         
         if start_date:
             try:
                 from datetime import datetime
                 start = datetime.strptime(start_date, '%Y-%m-%d')
-                query = query.filter(ActivityLog.timestamp >= start)
+                query = query.where(ActivityLog.timestamp >= start)
             except ValueError:
                 pass
         
@@ -61,7 +81,7 @@ def get_activity_logs():
                 from datetime import datetime
                 end = datetime.strptime(end_date, '%Y-%m-%d')
                 end = end.replace(hour=23, minute=59, second=59)
-                query = query.filter(ActivityLog.timestamp <= end)
+                query = query.where(ActivityLog.timestamp <= end)
             except ValueError:
                 pass
         
@@ -69,14 +89,10 @@ def get_activity_logs():
         query = query.order_by(ActivityLog.timestamp.desc())
         
         # 分页
-        pagination = query.paginate(
-            page=page,
-            per_page=limit,
-            error_out=False
-        )
+        pagination = paginate_select(db.session, query, page, limit)
         
-        # 构建响应
-        logs = [log.to_dict() for log in pagination.items]
+        # 构建响应（字段与 ActivityLog.to_dict() 一致）
+        logs = rows_to_dicts(pagination.items)
         
         return jsonify({
             'code': 0,
@@ -125,8 +141,12 @@ def get_users():
         if role and role in ['user', 'power_user', 'admin']:
             query = query.filter_by(role=role)
         
-        # 排序
-        query = query.order_by(User.created_at.desc())
+        # 排序（sort: created_at / entry_count / username，order: asc / desc）
+        sort_column = USER_SORT_COLUMNS.get(request.args.get('sort'), User.created_at)
+        if request.args.get('order', 'desc').lower() == 'asc':
+            query = query.order_by(sort_column.asc(), User.id.asc())
+        else:
+            query = query.order_by(sort_column.desc(), User.id.desc())
         
         # 分页
         pagination = query.paginate(
@@ -135,12 +155,11 @@ def get_users():
             error_out=False
         )
         
-        # 构建响应
+        # 构建响应（台账数量取自 users.entry_count，无需逐行统计）
         users = []
         for user in pagination.items:
             user_dict = user.to_dict()
-            # 添加统计信息
-            user_dict['entry_count'] = user.entries.count()
+            user_dict['entry_count'] = user.entry_count
             users.append(user_dict)
         
         return jsonify({
@@ -171,7 +190,7 @@ def update_user_role(user_id):
     try:
         admin_id = get_jwt_identity()
         
-        if user_id == admin_id:
+        if user_id == int(admin_id):
             return jsonify({
                 'code': 400,
                 'message': 'Cannot change your own role'
@@ -202,7 +221,8 @@ def update_user_role(user_id):
         log_activity(
             'INFO', 
             f'User role changed: {user.username} from {old_role} to {new_role}',
-            user_id=admin_id
+            user_id=admin_id,
+            sync=True
         )
         
         return jsonify({
@@ -228,7 +248,7 @@ def delete_user(user_id):
     try:
         admin_id = get_jwt_identity()
         
-        if user_id == admin_id:
+        if user_id == int(admin_id):
             return jsonify({
                 'code': 400,
                 'message': 'Cannot delete your own account'
@@ -250,7 +270,8 @@ def delete_user(user_id):
         log_activity(
             'WARNING',
             f'User deleted: {username}',
-            user_id=admin_id
+            user_id=admin_id,
+            sync=True
         )
         
         return jsonify({
@@ -274,7 +295,6 @@ def get_statistics():
     """获取系统统计信息"""
     try:
         from sqlalchemy import func
-        from datetime import datetime, timedelta
         
         # 用户统计
         total_users = User.query.count()
@@ -283,20 +303,23 @@ def get_statistics():
             func.count(User.id)
         ).group_by(User.role).all()
         
-        # 台账统计
-        total_entries = LedgerEntry.query.count()
+        # 台账统计（从每日汇总表读取，不扫描台账表）
+        entries_by_province = db.session.query(
+            LedgerDailyProvinceStat.province,
+            func.sum(LedgerDailyProvinceStat.count)
+        ).group_by(
+            LedgerDailyProvinceStat.province
+        ).having(
+            func.sum(LedgerDailyProvinceStat.count) > 0
+        ).all()
+        total_entries = sum(count for _, count in entries_by_province)
         
         # 最近7天的活动
-        week_ago = datetime.utcnow() - timedelta(days=7)
-        recent_entries = LedgerEntry.query.filter(
-            LedgerEntry.created_at >= week_ago
-        ).count()
-        
-        # 按省份统计
-        entries_by_province = db.session.query(
-            LedgerEntry.province,
-            func.count(LedgerEntry.id)
-        ).group_by(LedgerEntry.province).all()
+        recent_entries = db.session.query(
+            func.coalesce(func.sum(LedgerDailyProvinceStat.count), 0)
+        ).filter(
+            LedgerDailyProvinceStat.day >= rollup_start_day(7)
+        ).scalar()
         
         # 构建响应
         return jsonify({
@@ -323,102 +346,83 @@ def get_statistics():
             'data': None
         }), 500
 
+@admin_bp.route('/slow-queries', methods=['GET'])
+@jwt_required()
+@role_required(['admin'])
+def get_slow_queries():
+    """最近的慢查询按 SQL 汇总，按总耗时排序（读取所有 worker 共用的慢查询日志文件）"""
+    log = get_slow_query_log()
+    if log is None:
+        return jsonify({
+            'code': 404,
+            'message': 'Slow query log is disabled',
+            'data': None
+        }), 404
+    
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    records = log.shared_records()
+    return jsonify({
+        'code': 0,
+        'message': 'success',
+        'data': {
+            'threshold_ms': log.threshold * 1000,
+            'recorded': len(records),
+            'queries': log.top(limit, records)
+        }
+    }), 200
+
 @admin_bp.route('/export/logs')
 @jwt_required()
 @role_required(['admin'])
 def export_logs():
     # 获取导出格式
     export_format = request.args.get('format', 'csv').lower()
-    # 查询所有日志
-    logs = ActivityLog.query.order_by(ActivityLog.timestamp.desc()).all()
+    # 查询所有日志（分批读取，同一语句中加载用户）
+    query = ActivityLog.query.options(joinedload(ActivityLog.user)).order_by(ActivityLog.timestamp.desc())
     headers = ['ID', '时间', '级别', '用户', '消息', 'IP地址', '详情']
-    rows = [
-        [
-            log.id,
-            log.timestamp.strftime('%Y-%m-%d %H:%M:%S') if log.timestamp else '',
-            log.level,
-            log.username or '',
-            log.message,
-            log.ip_address or '',
-            log.details or ''
-        ] for log in logs
-    ]
+    
+    def generate_rows():
+        for log in query.yield_per(EXPORT_BATCH_SIZE):
+            yield [
+                log.id,
+                log.timestamp.strftime('%Y-%m-%d %H:%M:%S') if log.timestamp else '',
+                log.level,
+                log.user.username if log.user else '',
+                log.message,
+                log.ip_address or '',
+                log.details or ''
+            ]
+    
+    rows = count_export_rows(generate_rows(), 'logs', export_format if export_format in ('excel', 'word') else 'csv')
+    
     if export_format == 'excel':
-        wb = Workbook()
-        ws = wb.active
-        ws.append(headers)
-        from openpyxl.styles import Font, Alignment
-        for cell in ws[1]:
-            cell.font = Font(bold=True)
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-        for row in rows:
-            ws.append(row)
-        for col in ws.columns:
-            max_length = 0
-            col_letter = col[0].column_letter
-            for cell in col:
-                try:
-                    max_length = max(max_length, len(str(cell.value)))
-                except:
-                    pass
-            ws.column_dimensions[col_letter].width = max_length + 2
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
+        output = write_xlsx(headers, rows)
         return Response(
-            output.getvalue(),
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            iter_file(output),
+            mimetype=XLSX_MIMETYPE,
             headers={
                 'Content-Disposition': 'attachment; filename=logs_export.xlsx',
-                'Content-Type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                'Content-Type': XLSX_MIMETYPE,
+                'Content-Length': str(file_size(output))
             }
         )
     elif export_format == 'word':
-        doc = Document()
-        doc.add_heading('系统日志导出', 0)
-        table = doc.add_table(rows=1, cols=len(headers))
-        table.style = 'Table Grid'
-        hdr_cells = table.rows[0].cells
-        for i, h in enumerate(headers):
-            hdr_cells[i].text = h
-            run = hdr_cells[i].paragraphs[0].runs[0]
-            run.bold = True
-            run.font.size = Pt(11)
-        for row in rows:
-            row_cells = table.add_row().cells
-            for i, val in enumerate(row):
-                row_cells[i].text = str(val)
-        for row in table.rows:
-            for cell in row.cells:
-                for paragraph in cell.paragraphs:
-                    for run in paragraph.runs:
-                        run.font.size = Pt(10)
-        output = io.BytesIO()
-        doc.save(output)
-        output.seek(0)
+        output = write_docx('系统日志导出', headers, rows)
         return Response(
-            output.getvalue(),
-            mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+            iter_file(output),
+            mimetype=DOCX_MIMETYPE,
             headers={
                 'Content-Disposition': 'attachment; filename=logs_export.docx',
-                'Content-Type': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+                'Content-Type': DOCX_MIMETYPE,
+                'Content-Length': str(file_size(output))
             }
         )
     else:
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow(headers)
-        for row in rows:
-            writer.writerow(row)
-        output.seek(0)
-        csv_content = '\ufeff' + output.getvalue()
-        if not rows:
-            csv_content = '\ufeff' + ','.join(headers) + '\n'
         return Response(
-            csv_content,
+            stream_with_context(iter_csv(headers, rows)),
             mimetype='text/csv',
             headers={
                 'Content-Disposition': 'attachment;filename=logs_export.csv',
                 'Content-Type': 'text/csv; charset=utf-8'
             }
-        )
\ No newline at end of file
+        )
@@ -1,10 +1,19 @@
 from datetime import datetime
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from sqlalchemy import or_
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import joinedload
 
-from app.models import db, LedgerEntry, ActivityLog, User, Province
+from app.models import db, LedgerEntry, ActivityLog, User
 from app.auth import log_activity
+from app.utils.ledger_query import parse_ledger_filters, parse_entry_fields, ledger_list_select
+from app.utils.pagination import keyset_paginate, paginate_select, rows_to_dicts, CursorError
+from app.utils.search import apply_search
+from app.utils.ledger_events import LEDGER_FIELDS, LedgerChange, dispatch_ledger_changes
+from app.utils.data_version import get_data_versions
+from app.utils.http_cache import make_etag, etag_matches, not_modified, with_etag
+from app.utils.user_cache import current_user_role
+from app.utils.lookups import get_province_list, NATURE_OPTIONS, NATURE_OPTIONS_ETAG
 
 ledger_bp = Blueprint('ledger', __name__)
 
@@ -14,7 +23,7 @@ def get_ledger_entries():
     """获取台账列表"""
     try:
         user_id = get_jwt_identity()
-        user_role = get_jwt().get('role', 'user')
+        user_role = current_user_role()
         
         # 分页参数
         page = request.args.get('page', 1, type=int)
@@ -23,61 +32,30 @@ def get_ledger_entries():
         # 限制每页最大数量
         page_size = min(page_size, current_app.config['MAX_PAGE_SIZE'])
         
-        # 搜索参数
-        project_name = request.args.get('project_name', '').strip()
-        location = request.args.get('location', '').strip()
-        province = request.args.get('province', '').strip()
-        recorder = request.args.get('recorder', '').strip()
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
+        # 搜索参数（列投影查询，直接返回元组行，不经过 ORM 对象）
+        filters = parse_ledger_filters(request.args)
+        query = ledger_list_select(filters)
         
-        # 构建查询
-        query = LedgerEntry.query
+        # 全文检索
+        rank = None
+        keyword = request.args.get('q', '').strip()
+        if keyword:
+            query, rank = apply_search(query, keyword)
         
-        # 搜索过滤
-        if project_name:
-            project_pattern = f'%{project_name}%'
-            query = query.filter(LedgerEntry.project_name.ilike(project_pattern))
-        if location:
-            location_pattern = f'%{location}%'
-            query = query.filter(LedgerEntry.location.ilike(location_pattern))
+        # 游标分页模式：传入 cursor 参数（首页传空值）即启用
+        if 'cursor' in request.args:
+            return _get_ledger_entries_by_cursor(query, page_size)
         
-        # 省份过滤
-        if province:
-            query = query.filter_by(province=province)
-        
-        # 录入人员过滤
-        if recorder:
-            # 需要join User表来过滤录入人员
-            query = query.join(User).filter(User.username == recorder)
-        
-        # 日期范围过滤
-        if start_date:
-            try:
-                start = datetime.strptime(start_date, '%Y-%m-%d').date()
-                query = query.filter(LedgerEntry.date >= start)
-            except ValueError:
-                pass
-        
-        if end_date:
-            try:
-                end = datetime.strptime(end_date, '%Y-%m-%d').date()
-                query = query.filter(LedgerEntry.date <= end)
-            except ValueError:
-                pass
-        
-        # 排序
+        # 排序（全文检索时按相关度优先）
+        if rank is not None:
+            query = query.order_by(rank)
         query = query.order_by(LedgerEntry.created_at.desc())
         
         # 分页
-        pagination = query.paginate(
-            page=page,
-            per_page=page_size,
-            error_out=False
-        )
+        pagination = paginate_select(db.session, query, page, page_size)
         
         # 构建响应
-        items = [entry.to_dict() for entry in pagination.items]
+        items = rows_to_dicts(pagination.items)
         
         return jsonify({
             'code': 0,
@@ -99,23 +77,74 @@ def get_ledger_entries():
             'data': None
         }), 500
 
+def _get_ledger_entries_by_cursor(query, page_size):
+    """按 (created_at, id) 游标分页返回台账列表"""
+    # 总数需要扫描整个过滤结果集，默认不计算
+    with_total = request.args.get('with_total', '').lower() in ('1', 'true', 'yes')
+    total = db.session.execute(
+        select(func.count()).select_from(query.order_by(None).subquery())
+    ).scalar() if with_total else None
+    
+    try:
+        entries, next_cursor, prev_cursor = keyset_paginate(
+            query,
+            LedgerEntry.created_at,
+            LedgerEntry.id,
+            request.args.get('cursor'),
+            page_size,
+            fetch=lambda stmt: db.session.execute(stmt).all()
+        )
+    except CursorError:
+        return jsonify({
+            'code': 400,
+            'message': 'Invalid cursor',
+            'data': None
+        }), 400
+    
+    return jsonify({
+        'code': 0,
+        'message': 'success',
+        'data': {
+            'items': rows_to_dicts(entries),
+            'total': total,
+            'pageSize': page_size,
+            'next_cursor': next_cursor,
+            'prev_cursor': prev_cursor
+        }
+    }), 200
+
+def _get_entry_with_author(entry_id, refresh=False):
+    """按ID获取台账条目，并在同一条语句中加载录入人员"""
+    return db.session.get(
+        LedgerEntry,
+        entry_id,
+        options=[joinedload(LedgerEntry.author)],
+        populate_existing=refresh
+    )
+
 @ledger_bp.route('/ledger/<int:entry_id>', methods=['GET'])
 @jwt_required()
 def get_ledger_entry(entry_id):
     """获取单个台账条目"""
     try:
-        entry = LedgerEntry.query.get(entry_id)
+        # 台账表任何写入都会改变数据版本（详情含录入人员用户名，同时跟踪用户数据版本），版本未变时无需加载条目
+        etag = make_etag('ledger', entry_id, *get_data_versions(LedgerEntry.__tablename__, User.__tablename__))
+        if etag_matches(etag):
+            return not_modified(etag)
+        
+        entry = _get_entry_with_author(entry_id)
         if not entry:
             return jsonify({
                 'code': 404,
                 'message': 'Entry not found'
             }), 404
         # 允许所有已登录用户查看详情
-        return jsonify({
+        response = jsonify({
             'code': 0,
             'message': 'success',
             'data': entry.to_dict()
-        }), 200
+        })
+        return with_etag(response, etag), 200
     except Exception as e:
         current_app.logger.error(f'Get ledger entry error: {str(e)}')
         return jsonify({
@@ -132,38 +161,16 @@ def create_ledger_entry():
         user_id = get_jwt_identity()
         data = request.get_json()
         
-        # 验证必填字段
-        required_fields = ['province', 'project_name', 'date', 'location', 
-                         'personnel', 'nature', 'specific_matters']
-        
-        for field in required_fields:
-            if not data.get(field):
-                return jsonify({
-                    'code': 400,
-                    'message': f'Field "{field}" is required'
-                }), 400
-        
-        # 验证日期格式
-        try:
-            date_obj = datetime.strptime(data['date'], '%Y-%m-%d').date()
-        except ValueError:
+        # 验证必填字段和日期格式
+        values, error = parse_entry_fields(data)
+        if error:
             return jsonify({
                 'code': 400,
-                'message': 'Invalid date format, use YYYY-MM-DD'
+                'message': error
             }), 400
         
         # 创建新条目
-        new_entry = LedgerEntry(
-            user_id=user_id,
-            province=data['province'],
-            project_name=data['project_name'],
-            date=date_obj,
-            location=data['location'],
-            personnel=data['personnel'],
-            nature=data['nature'],
-            specific_matters=data['specific_matters'],
-            follow_up_points=data.get('follow_up_points', '')
-        )
+        new_entry = LedgerEntry(user_id=user_id, **values)
         
         db.session.add(new_entry)
         db.session.commit()
@@ -171,6 +178,9 @@ def create_ledger_entry():
         # 记录日志
         log_activity('INFO', f'Created ledger entry: {new_entry.id}', user_id=user_id)
         
+        # 提交后对象已过期，重新加载时一并取回录入人员
+        new_entry = _get_entry_with_author(new_entry.id, refresh=True)
+        
         return jsonify({
             'code': 0,
             'message': 'Entry created successfully',
@@ -192,38 +202,32 @@ def update_ledger_entry(entry_id):
     """更新台账条目"""
     try:
         user_id = get_jwt_identity()
-        user_role = get_jwt().get('role', 'user')
+        user_role = current_user_role()
         entry = LedgerEntry.query.get(entry_id)
         if not entry:
             return jsonify({
                 'code': 404,
                 'message': 'Entry not found'
             }), 404
-        # 只有普通用户(user)才限制只能操作自己录入的
-        if user_role == 'user' and entry.user_id != user_id:
+        # 只有普通用户(user)才限制只能操作自己录入的（JWT identity 为字符串）
+        if user_role == 'user' and entry.user_id != int(user_id):
             return jsonify({
                 'code': 403,
                 'message': 'Access denied'
             }), 403
         # power_user和admin可以编辑所有台账
-        data = request.get_json()
-        update_fields = ['province', 'project_name', 'date', 'location', 
-                        'personnel', 'nature', 'specific_matters', 'follow_up_points']
-        for field in update_fields:
-            if field in data:
-                if field == 'date':
-                    try:
-                        setattr(entry, field, datetime.strptime(data[field], '%Y-%m-%d').date())
-                    except ValueError:
-                        return jsonify({
-                            'code': 400,
-                            'message': 'Invalid date format, use YYYY-MM-DD'
-                        }), 400
-                else:
-                    setattr(entry, field, data[field])
+        values, error = parse_entry_fields(request.get_json(), partial=True)
+        if error:
+            return jsonify({
+                'code': 400,
+                'message': error
+            }), 400
+        for field, value in values.items():
+            setattr(entry, field, value)
         entry.updated_at = datetime.utcnow()
         db.session.commit()
         log_activity('INFO', f'Updated ledger entry: {entry_id}', user_id=user_id)
+        entry = _get_entry_with_author(entry_id, refresh=True)
         return jsonify({
             'code': 0,
             'message': 'Entry updated successfully',
@@ -244,15 +248,15 @@ def delete_ledger_entry(entry_id):
     """删除台账条目"""
     try:
         user_id = get_jwt_identity()
-        user_role = get_jwt().get('role', 'user')
+        user_role = current_user_role()
         entry = LedgerEntry.query.get(entry_id)
         if not entry:
             return jsonify({
                 'code': 404,
                 'message': 'Entry not found'
             }), 404
-        # 只有普通用户(user)才限制只能操作自己录入的
-        if user_role == 'user' and entry.user_id != user_id:
+        # 只有普通用户(user)才限制只能操作自己录入的（JWT identity 为字符串）
+        if user_role == 'user' and entry.user_id != int(user_id):
             return jsonify({
                 'code': 403,
                 'message': 'Access denied'
@@ -275,121 +279,202 @@ def delete_ledger_entry(entry_id):
             'data': None
         }), 500
 
-# ========== 新增的路由 ==========
-
-@ledger_bp.route('/provinces', methods=['GET'])
+@ledger_bp.route('/ledger/batch', methods=['POST'])
 @jwt_required()
-def get_provinces():
-    """获取省份列表"""
+def batch_ledger_entries():
+    """批量新建/修改/删除台账
+
+    请求体 {"operations": [{"op": "create", "data": {...}}, {"op": "update", "id": 1, "data": {...}},
+    {"op": "delete", "id": 2}]}。先校验全部操作（字段、存在性、权限），任一失败则不写入并返回
+    各项结果；全部通过后在同一事务中批量执行。
+    """
     try:
-        # 获取所有省份，按名称排序
-        provinces = Province.query.order_by(Province.name).all()
-        province_list = [p.name for p in provinces]
+        user_id = int(get_jwt_identity())
+        user_role = current_user_role()
+        data = request.get_json(silent=True) or {}
+        operations = data.get('operations')
+        max_operations = current_app.config['LEDGER_BATCH_MAX_OPERATIONS']
+        if not isinstance(operations, list) or not operations:
+            return jsonify({
+                'code': 400,
+                'message': 'Field "operations" must be a non-empty list'
+            }), 400
+        if len(operations) > max_operations:
+            return jsonify({
+                'code': 400,
+                'message': f'Too many operations, at most {max_operations} per batch'
+            }), 400
+        
+        # 一次查询取回所有待修改/删除的条目（含变更事件需要的旧值）
+        target_ids = {
+            op.get('id') for op in operations
+            if isinstance(op, dict) and op.get('op') in ('update', 'delete') and _is_entry_id(op.get('id'))
+        }
+        existing = {}
+        if target_ids:
+            columns = [getattr(LedgerEntry, field) for field in LEDGER_FIELDS]
+            rows = db.session.execute(select(*columns).where(LedgerEntry.id.in_(target_ids))).all()
+            existing = {row.id: dict(row._mapping) for row in rows}
+        
+        # 校验全部操作
+        results = []
+        planned = []
+        seen_ids = set()
+        for index, op in enumerate(operations):
+            item, error = _plan_batch_operation(op, existing, seen_ids, user_id, user_role)
+            if error:
+                code, message = error
+                results.append({'index': index, 'status': 'error', 'code': code, 'message': message})
+            else:
+                results.append({'index': index, 'status': 'ok', 'op': item[0], 'id': item[1]})
+                planned.append((index, item))
+        if len(planned) != len(operations):
+            return jsonify({
+                'code': 400,
+                'message': 'Batch validation failed, nothing was written',
+                'data': {'results': results}
+            }), 400
         
-        # 如果数据库中没有省份数据，返回默认列表
-        if not province_list:
-            province_list = [
-                '上海', '江苏', '浙江', '安徽', '福建', '江西', '山东', '其他', '另外'
-            ]
-            # 将默认省份保存到数据库
-            for province_name in province_list:
-                province = Province(name=province_name)
-                db.session.add(province)
-            db.session.commit()
+        now = datetime.utcnow()
+        changes = []
+        
+        # 新建：一条 INSERT 语句批量执行，按参数顺序返回主键
+        creates = [(index, values) for index, (op, _, values) in planned if op == 'create']
+        if creates:
+            rows = [dict(values, user_id=user_id, created_at=now, updated_at=now) for _, values in creates]
+            new_ids = db.session.execute(
+                insert(LedgerEntry).returning(LedgerEntry.id, sort_by_parameter_order=True),
+                rows
+            ).scalars().all()
+            for (index, _), row, entry_id in zip(creates, rows, new_ids):
+                results[index]['id'] = entry_id
+                new = {field: row.get(field) for field in LEDGER_FIELDS}
+                new['id'] = entry_id
+                changes.append(LedgerChange('create', entry_id, None, new))
+        
+        # 修改：按主键批量 UPDATE
+        updates = [(entry_id, values) for _, (op, entry_id, values) in planned if op == 'update']
+        if updates:
+            db.session.execute(
+                update(LedgerEntry),
+                [dict(values, id=entry_id, updated_at=now) for entry_id, values in updates]
+            )
+            for entry_id, values in updates:
+                old = existing[entry_id]
+                changes.append(LedgerChange('update', entry_id, old, dict(old, **values)))
+        
+        # 删除
+        delete_ids = [entry_id for _, (op, entry_id, _) in planned if op == 'delete']
+        if delete_ids:
+            db.session.execute(delete(LedgerEntry).where(LedgerEntry.id.in_(delete_ids)))
+            for entry_id in delete_ids:
+                changes.append(LedgerChange('delete', entry_id, existing[entry_id], None))
+        
+        # Core 批量语句不经过 ORM flush，手动分发变更（全文索引、统计、数据版本等）
+        dispatch_ledger_changes(db.session, changes)
+        db.session.commit()
+        
+        summary = f'{len(creates)} created, {len(updates)} updated, {len(delete_ids)} deleted'
+        log_activity('INFO', f'Batch ledger operations: {summary}', user_id=user_id)
         
         return jsonify({
             'code': 0,
-            'message': 'success',
-            'data': province_list
+            'message': 'Batch completed successfully',
+            'data': {
+                'results': results,
+                'created': len(creates),
+                'updated': len(updates),
+                'deleted': len(delete_ids)
+            }
         }), 200
-        
     except Exception as e:
-        current_app.logger.error(f'Get provinces error: {str(e)}')
+        current_app.logger.error(f'Batch ledger entries error: {str(e)}')
+        db.session.rollback()
         return jsonify({
             'code': 500,
-            'message': 'Failed to get provinces',
+            'message': 'Failed to execute batch',
             'data': None
         }), 500
 
-@ledger_bp.route('/nature-options', methods=['GET'])
+def _is_entry_id(value):
+    # bool 是 int 的子类，True/False 不能当作主键
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _plan_batch_operation(op, existing, seen_ids, user_id, user_role):
+    """校验单个批量操作，返回 ((op, entry_id, values), None) 或 (None, (code, message))"""
+    if not isinstance(op, dict) or op.get('op') not in ('create', 'update', 'delete'):
+        return None, (400, 'Field "op" must be one of create, update, delete')
+    kind = op['op']
+    if kind == 'create':
+        values, error = parse_entry_fields(op.get('data'))
+        if error:
+            return None, (400, error)
+        return (kind, None, values), None
+    
+    entry_id = op.get('id')
+    if not _is_entry_id(entry_id):
+        return None, (400, 'Field "id" must be an integer')
+    if entry_id in seen_ids:
+        return None, (400, 'Duplicate entry id in batch')
+    seen_ids.add(entry_id)
+    entry = existing.get(entry_id)
+    if entry is None:
+        return None, (404, 'Entry not found')
+    # 与单条修改/删除相同：普通用户只能操作自己录入的台账
+    if user_role == 'user' and entry['user_id'] != user_id:
+        return None, (403, 'Access denied')
+    if kind == 'delete':
+        return (kind, entry_id, None), None
+    values, error = parse_entry_fields(op.get('data'), partial=True)
+    if error:
+        return None, (400, error)
+    return (kind, entry_id, values), None
+
+# ========== 新增的路由 ==========
+
+@ledger_bp.route('/provinces', methods=['GET'])
 @jwt_required()
-def get_nature_options():
-    """获取性质选项列表"""
+def get_provinces():
+    """获取省份列表"""
     try:
-        nature_options = [
-            '会议纪要',
-            '工作安排',
-            '问题反馈',
-            '质量管理',
-            '临时任务',
-            '研讨交流',
-            '资料交接',
-            '人员对接',
-            '常规项目工作',
-            '其他'
-        ]
+        etag, province_list = get_province_list()
+        if etag_matches(etag):
+            return not_modified(etag)
         
-        return jsonify({
+        response = jsonify({
             'code': 0,
             'message': 'success',
-            'data': nature_options
-        }), 200
+            'data': province_list
+        })
+        return with_etag(response, etag), 200
         
     except Exception as e:
-        current_app.logger.error(f'Get nature options error: {str(e)}')
+        current_app.logger.error(f'Get provinces error: {str(e)}')
         return jsonify({
             'code': 500,
-            'message': 'Failed to get nature options',
+            'message': 'Failed to get provinces',
             'data': None
         }), 500
 
-@ledger_bp.route('/suggestions/project_items', methods=['GET'])
+@ledger_bp.route('/nature-options', methods=['GET'])
 @jwt_required()
-def get_project_suggestions():
-    """获取项目名称搜索建议"""
+def get_nature_options():
+    """获取性质选项列表"""
     try:
-        query_text = request.args.get('query', '').strip()
-        
-        if not query_text:
-            return jsonify({
-                'code': 0,
-                'message': 'success',
-                'data': []
-            }), 200
-        
-        # 搜索模式
-        search_pattern = f'%{query_text}%'
-        
-        # 查询匹配的条目
-        suggestions = LedgerEntry.query.filter(
-            or_(
-                LedgerEntry.province.ilike(search_pattern),
-                LedgerEntry.project_name.ilike(search_pattern),
-                LedgerEntry.specific_matters.ilike(search_pattern)
-            )
-        ).limit(20).all()
-        
-        # 提取唯一的建议值
-        result_values = set()
-        for entry in suggestions:
-            if entry.province and query_text.lower() in entry.province.lower():
-                result_values.add(entry.province)
-            if entry.project_name and query_text.lower() in entry.project_name.lower():
-                result_values.add(entry.project_name)
+        if etag_matches(NATURE_OPTIONS_ETAG):
+            return not_modified(NATURE_OPTIONS_ETAG)
         
-        # 格式化为前端期望的格式
-        formatted_suggestions = [{"value": value} for value in result_values]
-        
-        return jsonify({
+        response = jsonify({
             'code': 0,
             'message': 'success',
-            'data': formatted_suggestions
-        }), 200
+            'data': NATURE_OPTIONS
+        })
+        return with_etag(response, NATURE_OPTIONS_ETAG), 200
         
     except Exception as e:
-        current_app.logger.error(f'Get project suggestions error: {str(e)}')
+        current_app.logger.error(f'Get nature options error: {str(e)}')
         return jsonify({
             'code': 500,
-            'message': 'Failed to get suggestions',
+            'message': 'Failed to get nature options',
             'data': None
         }), 500
\ No newline at end of file
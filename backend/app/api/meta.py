@@ -1,10 +1,31 @@
-from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+import re
+
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context, send_file, url_for
+from flask_jwt_extended import jwt_required, get_jwt_identity
 from sqlalchemy import or_, distinct
 from datetime import datetime, timedelta
 from collections import Counter
 
-from app.models import db, Province, LedgerEntry, User
+from app.models import db, LedgerEntry, User, LedgerDailyUserStat
+from app.utils.ledger_query import parse_ledger_filters
+from app.utils.ledger_export import (
+    ledger_export_select, ledger_export_row, write_ledger_export, LEDGER_EXPORT_HEADERS, EXPORT_FORMATS
+)
+from app.utils.exporters import iter_csv, iter_file, file_size, EXPORT_BATCH_SIZE
+from app.utils.metrics import count_export_rows
+from app.utils.export_cache import ExportCache, export_cache_key
+from app.utils.data_version import get_data_version
+from app.utils.http_cache import etag_matches, not_modified, with_etag
+from app.utils.user_cache import current_user_role
+from app.utils.lookups import get_province_list, NATURE_OPTIONS, NATURE_OPTIONS_ETAG
+from app.utils.rollups import rollup_start_day
+from app.utils.export_jobs import (
+    submit_export_job, read_status, expire_jobs, artifact_path, ExportQueueFull, DONE
+)
+from app.utils.suggestions import get_suggestion_index, PROJECT, LOCATION, SENTENCE
+from app.utils.ledger_import import import_ledger, detect_import_format, ImportFileError
+from app.utils.decorators import role_required
+from app.auth import log_activity
 
 meta_bp = Blueprint('meta', __name__)
 
@@ -13,19 +34,16 @@ meta_bp = Blueprint('meta', __name__)
 def get_provinces():
     """获取省份列表"""
     try:
-        # 从数据库获取省份
-        provinces = Province.query.order_by(Province.name).all()
-        province_list = [p.name for p in provinces]
-        
-        # 如果数据库为空，使用配置中的默认列表
-        if not province_list:
-            province_list = current_app.config.get('PROVINCES', [])
+        etag, province_list = get_province_list()
+        if etag_matches(etag):
+            return not_modified(etag)
         
-        return jsonify({
+        response = jsonify({
             'code': 0,
             'message': 'success',
             'data': province_list
-        }), 200
+        })
+        return with_etag(response, etag), 200
         
     except Exception as e:
         current_app.logger.error(f'Get provinces error: {str(e)}')
@@ -41,69 +59,73 @@ def get_project_suggestions():
     """获取项目名称搜索建议，支持省份过滤和频率排序"""
     try:
         user_id = get_jwt_identity()
-        user_role = get_jwt().get('role', 'user')
+        user_role = current_user_role()
         query_text = request.args.get('query', '').strip()
         province = request.args.get('province', '').strip()
         if not query_text:
             return jsonify({'code': 0, 'message': 'success', 'data': []}), 200
-        search_pattern = f'%{query_text}%'
-        query = LedgerEntry.query
-        if user_role == 'user':
-            query = query.filter_by(user_id=user_id)
-        if province:
-            query = query.filter(LedgerEntry.province == province)
-        # 统计建议项出现频率
-        suggestions = query.filter(
-            or_(
-                LedgerEntry.project_name.ilike(search_pattern),
-                LedgerEntry.location.ilike(search_pattern),
-                LedgerEntry.specific_matters.ilike(search_pattern)
+        index = get_suggestion_index()
+        if index is not None:
+            suggestions = index.lookup(
+                (PROJECT, LOCATION, SENTENCE), query_text,
+                province=province or None,
+                user_id=user_id if user_role == 'user' else None
             )
-        ).all()
-        counter = Counter()
-        for entry in suggestions:
-            if entry.project_name and query_text.lower() in entry.project_name.lower():
-                counter[entry.project_name] += 1
-            if entry.location and query_text.lower() in entry.location.lower():
-                counter[entry.location] += 1
-            if entry.specific_matters and query_text.lower() in entry.specific_matters.lower():
-                sentences = entry.specific_matters.split('。')
-                for sentence in sentences:
-                    if query_text.lower() in sentence.lower() and len(sentence) < 100:
-                        counter[sentence.strip()] += 1
+        else:
+            # 索引尚未构建完成时回退到数据库查询
+            suggestions = _query_project_suggestions(query_text, province, user_id, user_role)
         formatted_suggestions = [
             {"value": value, "count": count}
-            for value, count in counter.most_common(20)
+            for value, count in suggestions
         ]
         return jsonify({'code': 0, 'message': 'success', 'data': formatted_suggestions}), 200
     except Exception as e:
         current_app.logger.error(f'Get project suggestions error: {str(e)}')
         return jsonify({'code': 500, 'message': 'Failed to get suggestions', 'data': None}), 500
 
+def _query_project_suggestions(query_text, province, user_id, user_role):
+    """从数据库统计项目建议（全表扫描）"""
+    search_pattern = f'%{query_text}%'
+    query = LedgerEntry.query
+    if user_role == 'user':
+        query = query.filter_by(user_id=user_id)
+    if province:
+        query = query.filter(LedgerEntry.province == province)
+    # 统计建议项出现频率
+    suggestions = query.filter(
+        or_(
+            LedgerEntry.project_name.ilike(search_pattern),
+            LedgerEntry.location.ilike(search_pattern),
+            LedgerEntry.specific_matters.ilike(search_pattern)
+        )
+    ).all()
+    counter = Counter()
+    for entry in suggestions:
+        if entry.project_name and query_text.lower() in entry.project_name.lower():
+            counter[entry.project_name] += 1
+        if entry.location and query_text.lower() in entry.location.lower():
+            counter[entry.location] += 1
+        if entry.specific_matters and query_text.lower() in entry.specific_matters.lower():
+            sentences = entry.specific_matters.split('。')
+            for sentence in sentences:
+                if query_text.lower() in sentence.lower() and len(sentence) < 100:
+                    counter[sentence.strip()] += 1
+    return counter.most_common(20)
+
 @meta_bp.route('/nature-options', methods=['GET'])
 @jwt_required()
 def get_nature_options():
     """获取性质选项列表"""
     try:
-        # 预定义的性质选项
-        nature_options = [
-            '会议纪要',
-            '工作安排',
-            '问题反馈',
-            '质量管理',
-            '临时任务',
-            '研讨交流',
-            '资料交接',
-            '人员对接',
-            '常规项目工作',
-            '其他'
-        ]
+        if etag_matches(NATURE_OPTIONS_ETAG):
+            return not_modified(NATURE_OPTIONS_ETAG)
         
-        return jsonify({
+        response = jsonify({
             'code': 0,
             'message': 'success',
-            'data': nature_options
-        }), 200
+            'data': NATURE_OPTIONS
+        })
+        return with_etag(response, NATURE_OPTIONS_ETAG), 200
         
     except Exception as e:
         current_app.logger.error(f'Get nature options error: {str(e)}')
@@ -118,153 +140,49 @@ def get_nature_options():
 def export_ledger():
     """导出台账数据（支持CSV、Excel、Word格式，支持搜索过滤）"""
     try:
-        import csv
-        import io
-        from flask import Response
-        from openpyxl import Workbook
-        from docx import Document
-        from docx.shared import Inches
         user_id = get_jwt_identity()
-        user_role = get_jwt().get('role', 'user')
+        user_role = current_user_role()
         if user_role not in ['admin', 'power_user', 'user']:
             return jsonify({'code': 403, 'message': 'Insufficient permissions', 'data': None}), 403
         # 获取搜索参数
-        project_name = request.args.get('project_name', '').strip()
-        location = request.args.get('location', '').strip()
-        province = request.args.get('province', '').strip()
-        recorder = request.args.get('recorder', '').strip()
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        # 构建查询
-        query = LedgerEntry.query
-        if user_role == 'user':
-            query = query.filter_by(user_id=user_id)
-        if project_name:
-            project_pattern = f'%{project_name}%'
-            query = query.filter(LedgerEntry.project_name.ilike(project_pattern))
-        if location:
-            location_pattern = f'%{location}%'
-            query = query.filter(LedgerEntry.location.ilike(location_pattern))
-        if province:
-            query = query.filter_by(province=province)
-        if recorder:
-            query = query.join(User).filter(User.username == recorder)
-        if start_date:
-            try:
-                start = datetime.strptime(start_date, '%Y-%m-%d').date()
-                query = query.filter(LedgerEntry.date >= start)
-            except ValueError:
-                pass
-        if end_date:
-            try:
-                end = datetime.strptime(end_date, '%Y-%m-%d').date()
-                query = query.filter(LedgerEntry.date <= end)
-            except ValueError:
-                pass
-        entries = query.order_by(LedgerEntry.created_at.desc()).all()
-        current_app.logger.info(f'导出参数: project_name={project_name}, location={location}, province={province}, recorder={recorder}, start_date={start_date}, end_date={end_date}, role={user_role}, user_id={user_id}')
-        current_app.logger.info(f'导出结果数量: {len(entries)}')
+        filters = parse_ledger_filters(request.args)
+        # 构建查询（普通用户只能导出自己的台账）
+        scope_user_id = user_id if user_role == 'user' else None
+        stmt = ledger_export_select(filters, scope_user_id)
+        current_app.logger.info(f'导出参数: {filters}, role={user_role}, user_id={user_id}')
         # 导出格式
         export_format = request.args.get('format', 'csv').lower()
-        headers = [
-            'ID', '录入人员', '省份', '项目名称', '日期', '地点',
-            '涉及人员', '性质', '具体事项', '后续要点', '创建时间'
-        ]
-        rows = [
-            [
-                entry.id,
-                entry.author.username if entry.author else '',
-                entry.province,
-                entry.project_name,
-                entry.date.strftime('%Y-%m-%d') if entry.date else '',
-                entry.location,
-                entry.personnel,
-                entry.nature,
-                entry.specific_matters,
-                entry.follow_up_points or '',
-                entry.created_at.strftime('%Y-%m-%d %H:%M:%S') if entry.created_at else ''
-            ]
-            for entry in entries
-        ]
-        if export_format == 'excel':
-            wb = Workbook()
-            ws = wb.active
-            ws.append(headers)
-            # 加粗表头
-            from openpyxl.styles import Font, Alignment
-            for cell in ws[1]:
-                cell.font = Font(bold=True)
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-            for row in rows:
-                ws.append(row)
-            # 自动列宽
-            for col in ws.columns:
-                max_length = 0
-                col_letter = col[0].column_letter
-                for cell in col:
-                    try:
-                        max_length = max(max_length, len(str(cell.value)))
-                    except:
-                        pass
-                ws.column_dimensions[col_letter].width = max_length + 2
-            output = io.BytesIO()
-            wb.save(output)
-            output.seek(0)
-            return Response(
-                output.getvalue(),
-                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                headers={
-                    'Content-Disposition': 'attachment; filename=ledger_export.xlsx',
-                    'Content-Type': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                }
-            )
-        elif export_format == 'word':
-            doc = Document()
-            doc.add_heading('台账导出', 0)
-            table = doc.add_table(rows=1, cols=len(headers))
-            table.style = 'Table Grid'
-            hdr_cells = table.rows[0].cells
-            from docx.shared import Pt
-            for i, h in enumerate(headers):
-                hdr_cells[i].text = h
-                run = hdr_cells[i].paragraphs[0].runs[0]
-                run.bold = True
-                run.font.size = Pt(11)
-            for row in rows:
-                row_cells = table.add_row().cells
-                for i, val in enumerate(row):
-                    row_cells[i].text = str(val)
-            # 自动调整列宽（简单实现）
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        for run in paragraph.runs:
-                            run.font.size = Pt(10)
-            output = io.BytesIO()
-            doc.save(output)
-            output.seek(0)
+        headers = LEDGER_EXPORT_HEADERS
+        
+        def generate_rows():
+            count = 0
+            for row in db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE)):
+                count += 1
+                yield ledger_export_row(row)
+            current_app.logger.info(f'导出结果数量: {count}')
+        
+        def counted_rows():
+            return count_export_rows(generate_rows(), 'ledger', export_format)
+        
+        if export_format in ('excel', 'word'):
+            extension, mimetype = EXPORT_FORMATS[export_format]
+            if current_app.config.get('EXPORT_CACHE_ENABLED'):
+                return _cached_export_response(export_format, filters, scope_user_id, counted_rows)
+            # 写入临时文件后分块返回
+            output = write_ledger_export(export_format, counted_rows())
             return Response(
-                output.getvalue(),
-                mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+                iter_file(output),
+                mimetype=mimetype,
                 headers={
-                    'Content-Disposition': 'attachment; filename=ledger_export.docx',
-                    'Content-Type': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+                    'Content-Disposition': f'attachment; filename=ledger_export.{extension}',
+                    'Content-Type': mimetype,
+                    'Content-Length': str(file_size(output))
                 }
             )
-        else:  # 默认CSV
-            output = io.StringIO()
-            writer = csv.writer(output)
-            writer.writerow(headers)
-            for row in rows:
-                writer.writerow(row)
-            output.seek(0)
-            # 加 BOM 头防止 Excel 乱码
-            csv_content = '\ufeff' + output.getvalue()
-            if not rows:
-                # 若无数据也输出表头
-                csv_content = '\ufeff' + ','.join(headers) + '\n'
+        else:
+            # 默认CSV：边查询边输出，不在内存中保留完整结果
             return Response(
-                csv_content,
+                stream_with_context(iter_csv(headers, counted_rows())),
                 mimetype='text/csv',
                 headers={
                     'Content-Disposition': 'attachment; filename=ledger_export.csv',
@@ -279,82 +197,223 @@ def export_ledger():
             'data': None
         }), 500
 
+def _cached_export_response(export_format, filters, scope_user_id, generate_rows):
+    """从导出缓存返回文件，未命中时生成并写入缓存"""
+    extension, mimetype = EXPORT_FORMATS[export_format]
+    cache = ExportCache(current_app.config['EXPORT_CACHE_DIR'], current_app.config['EXPORT_CACHE_MAX_BYTES'])
+    key = export_cache_key(export_format, filters, scope_user_id, get_data_version(LedgerEntry.__tablename__))
+    path = cache.get(key, export_format)
+    cache_status = 'HIT'
+    if path is None:
+        cache_status = 'MISS'
+        path = cache.put(key, export_format, lambda f: write_ledger_export(export_format, generate_rows(), f))
+    response = send_file(path, mimetype=mimetype, as_attachment=True, download_name=f'ledger_export.{extension}')
+    response.headers['X-Export-Cache'] = cache_status
+    return response
+
+@meta_bp.route('/export/jobs', methods=['POST'])
+@jwt_required()
+def create_export_job():
+    """提交异步导出任务"""
+    try:
+        user_id = get_jwt_identity()
+        user_role = current_user_role()
+        data = request.get_json(silent=True) or {}
+        export_format = (data.get('format') or 'csv').lower()
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'code': 400, 'message': 'Invalid export format', 'data': None}), 400
+        filters = parse_ledger_filters(data)
+        try:
+            job = submit_export_job(
+                current_app._get_current_object(),
+                export_format,
+                filters,
+                user_id,
+                scope_user_id=user_id if user_role == 'user' else None
+            )
+        except ExportQueueFull:
+            return jsonify({'code': 429, 'message': 'Too many export jobs, please retry later', 'data': None}), 429
+        current_app.logger.info(f'导出任务 {job["id"]}: format={export_format}, {filters}, role={user_role}, user_id={user_id}')
+        return jsonify({'code': 0, 'message': 'Export job accepted', 'data': _job_response(job)}), 202
+    except Exception as e:
+        current_app.logger.error(f'Create export job error: {str(e)}')
+        return jsonify({'code': 500, 'message': 'Failed to create export job', 'data': None}), 500
+
+@meta_bp.route('/export/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_export_job(job_id):
+    """查询导出任务状态和进度"""
+    job = _get_own_job(job_id)
+    if job is None:
+        return jsonify({'code': 404, 'message': 'Export job not found', 'data': None}), 404
+    return jsonify({'code': 0, 'message': 'success', 'data': _job_response(job)}), 200
+
+@meta_bp.route('/export/jobs/<job_id>/file', methods=['GET'])
+@jwt_required()
+def download_export_job(job_id):
+    """下载已完成的导出文件"""
+    job = _get_own_job(job_id)
+    if job is None:
+        return jsonify({'code': 404, 'message': 'Export job not found', 'data': None}), 404
+    if job['status'] != DONE:
+        return jsonify({'code': 409, 'message': f'Export job is {job["status"]}', 'data': None}), 409
+    extension, mimetype = EXPORT_FORMATS[job['format']]
+    return send_file(
+        artifact_path(current_app.config['EXPORT_JOB_DIR'], job_id, job['format']),
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=f'ledger_export.{extension}'
+    )
+
+def _get_own_job(job_id):
+    """读取当前用户可见的导出任务（管理员可查看所有任务）"""
+    if not re.fullmatch(r'[0-9a-f]{32}', job_id):
+        return None
+    expire_jobs(current_app)
+    job = read_status(current_app.config['EXPORT_JOB_DIR'], job_id)
+    if job is None:
+        return None
+    if current_user_role() != 'admin' and job['user_id'] != str(get_jwt_identity()):
+        return None
+    return job
+
+def _job_response(job):
+    data = dict(job)
+    data['status_url'] = url_for('meta.get_export_job', job_id=job['id'])
+    if job['status'] == DONE:
+        data['file_url'] = url_for('meta.download_export_job', job_id=job['id'])
+    return data
+
+@meta_bp.route('/import/ledger', methods=['POST'])
+@jwt_required()
+@role_required(['admin', 'power_user'])
+def import_ledger_file():
+    """导入台账（CSV / Excel，列与导出文件一致）
+
+    表单字段 file 为上传文件；dry_run=1 时只校验不写入。录入人员为空的行归属当前用户。
+    """
+    try:
+        user_id = get_jwt_identity()
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({'code': 400, 'message': 'Field "file" is required', 'data': None}), 400
+        import_format = detect_import_format(upload.filename)
+        if import_format is None:
+            return jsonify({'code': 400, 'message': 'Unsupported file type, use .csv or .xlsx', 'data': None}), 400
+        dry_run = request.form.get('dry_run', '').lower() in ('1', 'true')
+        try:
+            result = import_ledger(
+                upload.stream,
+                import_format,
+                default_user_id=user_id,
+                chunk_size=current_app.config['LEDGER_IMPORT_CHUNK_SIZE'],
+                dry_run=dry_run,
+                max_errors=current_app.config['LEDGER_IMPORT_MAX_ERRORS']
+            )
+        except ImportFileError as e:
+            return jsonify({'code': 400, 'message': str(e), 'data': None}), 400
+        if not dry_run:
+            log_activity(
+                'INFO',
+                f'Imported ledger file {upload.filename}: {result.imported} imported, {result.failed} failed',
+                user_id=user_id
+            )
+        return jsonify({
+            'code': 0,
+            'message': 'Import validated' if dry_run else 'Import completed',
+            'data': {
+                'total': result.total,
+                'imported': result.imported,
+                'failed': result.failed,
+                'dry_run': dry_run,
+                'errors': [{'row': error.row, 'message': error.message} for error in result.errors]
+            }
+        }), 200
+    except Exception as e:
+        current_app.logger.error(f'Import ledger error: {str(e)}')
+        return jsonify({'code': 500, 'message': 'Failed to import ledger', 'data': None}), 500
+
 @meta_bp.route('/suggestions/locations', methods=['GET'])
 @jwt_required()
 def get_location_suggestions():
     """获取地点搜索建议，支持省份过滤和频率排序"""
     try:
         user_id = get_jwt_identity()
-        user_role = get_jwt().get('role', 'user')
+        user_role = current_user_role()
         query_text = request.args.get('query', '').strip()
         province = request.args.get('province', '').strip()
         if not query_text:
             return jsonify({'code': 0, 'message': 'success', 'data': []}), 200
-        search_pattern = f'%{query_text}%'
-        query = LedgerEntry.query
-        if user_role == 'user':
-            query = query.filter_by(user_id=user_id)
-        if province:
-            query = query.filter(LedgerEntry.province == province)
-        suggestions = query.filter(LedgerEntry.location.ilike(search_pattern)).all()
-        counter = Counter()
-        for entry in suggestions:
-            if entry.location and query_text.lower() in entry.location.lower():
-                counter[entry.location] += 1
+        index = get_suggestion_index()
+        if index is not None:
+            suggestions = index.lookup(
+                (LOCATION,), query_text,
+                province=province or None,
+                user_id=user_id if user_role == 'user' else None
+            )
+        else:
+            suggestions = _query_location_suggestions(query_text, province, user_id, user_role)
         formatted_suggestions = [
             {"value": value, "count": count}
-            for value, count in counter.most_common(20)
+            for value, count in suggestions
         ]
         return jsonify({'code': 0, 'message': 'success', 'data': formatted_suggestions}), 200
     except Exception as e:
         current_app.logger.error(f'Get location suggestions error: {str(e)}')
         return jsonify({'code': 500, 'message': 'Failed to get suggestions', 'data': None}), 500
 
+def _query_location_suggestions(query_text, province, user_id, user_role):
+    """从数据库统计地点建议（全表扫描）"""
+    search_pattern = f'%{query_text}%'
+    query = LedgerEntry.query
+    if user_role == 'user':
+        query = query.filter_by(user_id=user_id)
+    if province:
+        query = query.filter(LedgerEntry.province == province)
+    suggestions = query.filter(LedgerEntry.location.ilike(search_pattern)).all()
+    counter = Counter()
+    for entry in suggestions:
+        if entry.location and query_text.lower() in entry.location.lower():
+            counter[entry.location] += 1
+    return counter.most_common(20)
+
 @meta_bp.route('/stats/ledger_by_user', methods=['GET'])
 @jwt_required()
 def get_ledger_stats_by_user():
     """获取各用户台账统计"""
     try:
         days = request.args.get('days', default=30, type=int)
-        start_date = datetime.now() - timedelta(days=days)
+        start_day = rollup_start_day(days)
 
-        # 查询每个用户的台账数量
-        stats = db.session.query(
+        # 从每日汇总表读取，查询量只与天数和用户数有关
+        daily_stats = db.session.query(
             User.username,
-            db.func.count(LedgerEntry.id).label('count')
+            LedgerDailyUserStat.day,
+            LedgerDailyUserStat.count
         ).join(
-            LedgerEntry, User.id == LedgerEntry.user_id
+            User, User.id == LedgerDailyUserStat.user_id
         ).filter(
-            LedgerEntry.created_at >= start_date
-        ).group_by(
-            User.username
-        ).all()
-
-        # 查询每个用户的月度趋势
-        monthly_stats = db.session.query(
-            User.username,
-            db.func.strftime('%Y-%m', LedgerEntry.created_at).label('month'),
-            db.func.count(LedgerEntry.id).label('count')
-        ).join(
-            LedgerEntry, User.id == LedgerEntry.user_id
-        ).filter(
-            LedgerEntry.created_at >= start_date
-        ).group_by(
-            User.username,
-            db.func.strftime('%Y-%m', LedgerEntry.created_at)
+            LedgerDailyUserStat.day >= start_day,
+            LedgerDailyUserStat.count > 0
         ).order_by(
-            db.func.strftime('%Y-%m', LedgerEntry.created_at)
+            LedgerDailyUserStat.day
         ).all()
 
-        # 处理月度趋势数据
+        # 汇总每个用户的总数和月度趋势
+        totals = Counter()
         trend_data = {}
-        for username, month, count in monthly_stats:
-            if username not in trend_data:
-                trend_data[username] = []
-            trend_data[username].append({
-                'month': month,
-                'count': count
-            })
+        for username, day, count in daily_stats:
+            totals[username] += count
+            month = day.strftime('%Y-%m')
+            records = trend_data.setdefault(username, [])
+            if records and records[-1]['month'] == month:
+                records[-1]['count'] += count
+            else:
+                records.append({
+                    'month': month,
+                    'count': count
+                })
+        stats = totals.items()
 
         return jsonify({
             'success': True,
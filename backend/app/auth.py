@@ -1,8 +1,13 @@
-from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash
+from datetime import datetime
+from flask import Blueprint, request, jsonify, current_app, has_request_context
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 
-from app.models import db, User, ActivityLog
+from app.models import db, User, ActivityLog, RefreshToken
+from app.utils.user_cache import current_user_record
+from app.utils.passwords import verify_password, HashPoolBusy
+from app.utils.refresh_tokens import (
+    issue_tokens, rotate_refresh_token, revoke_family, maybe_prune_refresh_tokens, ROTATED, REUSED
+)
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -95,22 +100,29 @@ def login():
         # 查找用户
         user = User.query.filter_by(username=username).first()
         
-        if not user or not user.check_password(password):
+        # 在有界线程池中校验密码，登录高峰不会占满 CPU
+        try:
+            valid = user is not None and verify_password(user, password)
+        except HashPoolBusy:
+            response = jsonify({
+                'success': False,
+                'message': 'Too many login attempts in progress, please retry'
+            })
+            response.headers['Retry-After'] = '1'
+            return response, 503
+        
+        if not valid:
             # 记录失败登录
-            log_activity('WARNING', f'Failed login attempt for username: {username}')
+            log_activity('WARNING', f'Failed login attempt for username: {username}', sync=True)
             return jsonify({
                 'success': False,
                 'message': 'Invalid username or password'
             }), 401
         
-        # 创建JWT token
-        access_token = create_access_token(
-            identity=str(user.id),  # 一定要转成字符串
-            additional_claims={
-                'role': user.role,
-                'username': user.username
-            }
-        )
+        # 创建JWT token（identity 为字符串）；刷新令牌记录与更新后的哈希一起提交
+        access_token, refresh_token = issue_tokens(user)
+        db.session.commit()
+        maybe_prune_refresh_tokens()
         
         # 记录成功登录
         log_activity('INFO', f'User logged in: {username}', user_id=user.id)
@@ -119,6 +131,7 @@ def login():
             'success': True,
             'message': 'Login successful',
             'access_token': access_token,
+            'refresh_token': refresh_token,
             'user_id': user.id,
             'username': user.username,
             'role': user.role
@@ -126,19 +139,80 @@ def login():
         
     except Exception as e:
         current_app.logger.error(f'Login error: {str(e)}')
+        db.session.rollback()
         return jsonify({
             'success': False,
             'message': 'Login failed',
             'error': str(e) if current_app.debug else 'Internal error'
         }), 500
 
+@auth_bp.route('/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh():
+    """用刷新令牌换取新的访问令牌和刷新令牌（旧刷新令牌作废），不校验密码"""
+    try:
+        user_id = get_jwt_identity()
+        result, token = rotate_refresh_token(get_jwt()['jti'])
+        if result != ROTATED:
+            db.session.commit()
+            if result == REUSED:
+                log_activity('WARNING', 'Refresh token reuse detected, session revoked', user_id=user_id, sync=True)
+            return jsonify({
+                'success': False,
+                'message': 'Refresh token has been revoked',
+                'error': 'Token revoked'
+            }), 401
+        
+        user = db.session.get(User, int(user_id))
+        access_token, refresh_token = issue_tokens(user, family=token.family)
+        db.session.commit()
+        maybe_prune_refresh_tokens()
+        
+        return jsonify({
+            'success': True,
+            'access_token': access_token,
+            'refresh_token': refresh_token
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f'Refresh token error: {str(e)}')
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'Failed to refresh token',
+            'error': str(e) if current_app.debug else 'Internal error'
+        }), 500
+
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required(refresh=True)
+def logout():
+    """退出登录：撤销本次登录的刷新令牌（请求需携带刷新令牌）"""
+    try:
+        token = RefreshToken.query.filter_by(jti=get_jwt()['jti']).first()
+        if token is not None:
+            revoke_family(token.family)
+            db.session.commit()
+        return jsonify({
+            'success': True,
+            'message': 'Logged out'
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f'Logout error: {str(e)}')
+        db.session.rollback()
+        return jsonify({
+            'success': False,
+            'message': 'Failed to logout',
+            'error': str(e) if current_app.debug else 'Internal error'
+        }), 500
+
 @auth_bp.route('/me', methods=['GET'])
 @jwt_required()
 def get_current_user():
     """获取当前用户信息"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        # 令牌校验时已加载到用户缓存，这里不再查询数据库
+        user = current_user_record()
         
         if not user:
             return jsonify({
@@ -197,12 +271,13 @@ def change_password():
                 'message': 'New password must be at least 6 characters long'
             }), 400
         
-        # 更新密码
+        # 更新密码，之前签发的令牌全部失效
         user.set_password(new_password)
+        user.token_generation += 1
         db.session.commit()
         
         # 记录日志
-        log_activity('INFO', f'Password changed for user: {user.username}', user_id=user_id)
+        log_activity('INFO', f'Password changed for user: {user.username}', user_id=user_id, sync=True)
         
         return jsonify({
             'success': True,
@@ -218,17 +293,26 @@ def change_password():
             'error': str(e) if current_app.debug else 'Internal error'
         }), 500
 
-def log_activity(level, message, user_id=None):
-    """记录活动日志"""
+def log_activity(level, message, user_id=None, sync=False):
+    """记录活动日志
+
+    默认放入批量写入队列，不占用当前请求的事务；sync=True 时立即写入数据库，
+    用于登录失败、权限变更等安全相关事件。
+    """
     try:
-        log = ActivityLog(
-            level=level,
-            message=message,
-            user_id=user_id,
-            ip_address=request.remote_addr,
-            user_agent=request.headers.get('User-Agent', '')[:500]
-        )
+        record = {
+            'timestamp': datetime.utcnow(),
+            'level': level,
+            'message': message,
+            'user_id': int(user_id) if user_id is not None else None,
+            'ip_address': request.remote_addr if has_request_context() else None,
+            'user_agent': request.headers.get('User-Agent', '')[:500] if has_request_context() else ''
+        }
+        audit_queue = current_app.extensions.get('audit_queue')
+        if not sync and audit_queue is not None and audit_queue.put(record):
+            return
+        log = ActivityLog(**record)
         db.session.add(log)
         db.session.commit()
     except Exception as e:
-        current_app.logger.error(f'Failed to log activity: {str(e)}')
\ No newline at end of file
+        current_app.logger.error(f'Failed to log activity: {str(e)}')
@@ -0,0 +1,153 @@
+import click
+
+
+def register_commands(app):
+    """注册应用级 CLI 命令"""
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """创建表、执行迁移并写入初始数据（生产环境部署时在启动 worker 前执行）"""
+        from app import setup_database
+
+        click.echo('Initializing database...')
+        setup_database(app)
+        click.echo('Database initialized.')
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index_command():
+        """重建台账全文索引"""
+        from app.utils.search import rebuild_search_index, search_enabled
+
+        if not search_enabled():
+            click.echo('Error: Full-text search is not available for this database.')
+            return
+        count = rebuild_search_index()
+        app.logger.info(f'Search index rebuilt: {count} entries')
+        click.echo(f'Search index rebuilt: {count} entries.')
+
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups_command():
+        """根据台账表重建每日统计汇总表"""
+        from app.utils.rollups import rebuild_rollups
+
+        count = rebuild_rollups()
+        app.logger.info(f'Statistics rollups rebuilt: {count} entries')
+        click.echo(f'Statistics rollups rebuilt: {count} entries.')
+
+    @app.cli.command('repair-entry-counts')
+    def repair_entry_counts_command():
+        """根据台账表重新计算用户台账数量"""
+        from app.utils.rollups import repair_entry_counts
+
+        count = repair_entry_counts()
+        app.logger.info(f'Entry counts repaired for {count} users')
+        click.echo(f'Entry counts repaired for {count} users.')
+
+    @app.cli.command('prune-refresh-tokens')
+    def prune_refresh_tokens_command():
+        """删除已过期的刷新令牌记录"""
+        from app.utils.refresh_tokens import prune_refresh_tokens
+
+        count = prune_refresh_tokens()
+        app.logger.info(f'Pruned {count} expired refresh tokens')
+        click.echo(f'Pruned {count} expired refresh tokens.')
+
+    @app.cli.command('db-upgrade')
+    def db_upgrade_command():
+        """为已有数据库执行未应用的结构迁移（新增列、索引）"""
+        from app.models import db
+        from app.utils.migrations import run_migrations, get_schema_version
+
+        applied = run_migrations(app)
+        for item in applied:
+            click.echo(f'Applied migration {item.version}: {item.description}')
+        with db.engine.connect() as conn:
+            click.echo(f'Schema version: {get_schema_version(conn)}')
+
+    @app.cli.command('db-advise')
+    @click.option('--verbose', is_flag=True, help='同时输出没有问题的查询计划')
+    @click.option('--strict', is_flag=True, help='发现问题时以非零状态退出')
+    def db_advise_command(verbose, strict):
+        """对各接口的查询运行 EXPLAIN QUERY PLAN，标出全表扫描和临时排序"""
+        from app.models import db
+        from app.utils.db_advisor import advise
+
+        if db.engine.dialect.name != 'sqlite':
+            click.echo('Error: db-advise only supports SQLite.')
+            return
+        try:
+            results = advise(app)
+        except RuntimeError as e:
+            click.echo(f'Error: {e}')
+            raise SystemExit(1)
+        issue_count = 0
+        for result in results:
+            click.echo(f"[{result['name']}] GET {result['path']} -> {result['status']}")
+            for statement in result['statements']:
+                if not statement['issues'] and not verbose:
+                    continue
+                issue_count += len(statement['issues'])
+                sql = statement['sql']
+                click.echo(f'  {sql[:160]}{"..." if len(sql) > 160 else ""}')
+                for line in statement['plan']:
+                    click.echo(f'    {line}')
+                for issue in statement['issues']:
+                    click.echo(f'    ! {issue}')
+        click.echo(f'{issue_count} potential issue(s) found.')
+        if strict and issue_count:
+            raise SystemExit(1)
+
+    @app.cli.command('import-ledger')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--user', 'username', help='录入人员为空的行归属的用户名')
+    @click.option('--errors', 'errors_path', type=click.Path(dir_okay=False),
+                  help='错误报告路径（默认为 <文件>.errors.csv）')
+    @click.option('--chunk-size', type=int, default=None, help='每个事务插入的行数')
+    @click.option('--dry-run', is_flag=True, help='只校验不写入')
+    def import_ledger_command(path, username, errors_path, chunk_size, dry_run):
+        """从 CSV / Excel 文件流式导入台账（列与导出文件一致）"""
+        import csv
+        import os
+        import time
+        from app.models import db, User
+        from app.utils.ledger_import import import_ledger, detect_import_format, ImportFileError
+
+        import_format = detect_import_format(path)
+        if import_format is None:
+            click.echo('Error: Unsupported file type, use .csv or .xlsx.')
+            raise SystemExit(1)
+        default_user_id = None
+        if username:
+            user = db.session.execute(db.select(User).filter_by(username=username)).scalar()
+            if user is None:
+                click.echo(f'Error: User {username} not found.')
+                raise SystemExit(1)
+            default_user_id = user.id
+
+        errors_path = errors_path or f'{path}.errors.csv'
+        started = time.monotonic()
+        # 错误行边导入边写入报告，不在内存中累积
+        with open(path, 'rb') as source, open(errors_path, 'w', encoding='utf-8-sig', newline='') as report:
+            writer = csv.writer(report)
+            writer.writerow(['行号', '错误'])
+            try:
+                result = import_ledger(
+                    source,
+                    import_format,
+                    default_user_id=default_user_id,
+                    chunk_size=chunk_size or app.config['LEDGER_IMPORT_CHUNK_SIZE'],
+                    dry_run=dry_run,
+                    on_error=lambda error: writer.writerow([error.row, error.message]),
+                    max_errors=0
+                )
+            except ImportFileError as e:
+                click.echo(f'Error: {str(e)}')
+                raise SystemExit(1)
+        elapsed = time.monotonic() - started
+        verb = 'validated' if dry_run else 'imported'
+        app.logger.info(f'Ledger import from {path}: {result.imported} {verb}, {result.failed} failed')
+        click.echo(f'{result.total} rows read, {result.imported} {verb}, {result.failed} failed in {elapsed:.1f}s.')
+        if result.failed:
+            click.echo(f'Error report: {errors_path}')
+        else:
+            os.remove(errors_path)
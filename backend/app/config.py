@@ -1,23 +1,134 @@
 import os
 from datetime import timedelta
 
+
+def sqlite_pragmas(defaults):
+    """SQLite PRAGMA 配置，可用环境变量 SQLITE_PRAGMAS 覆盖（如 "cache_size=-131072,mmap_size=0"）"""
+    pragmas = dict(defaults)
+    for item in os.environ.get('SQLITE_PRAGMAS', '').split(','):
+        if '=' in item:
+            name, value = item.split('=', 1)
+            pragmas[name.strip()] = value.strip()
+    return pragmas
+
+
 class Config:
     """基础配置"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-change-in-production'
-    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
     JWT_ALGORITHM = 'HS256'
     
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///ledger.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # SQLite 连接参数，每个新连接建立时执行（非 SQLite 数据库忽略）
+    SQLITE_PRAGMAS = sqlite_pragmas({
+        'busy_timeout': 5000,
+    })
+    
+    # 读写分离：GET 请求读只读引擎（SQLite WAL 下为同一文件的 query_only 连接，
+    # 或 READ_DATABASE_URL 指定的副本），写操作及带 X-Read-Your-Writes 头的请求读主库
+    READ_ROUTING_ENABLED = os.environ.get('READ_ROUTING_ENABLED', 'false').lower() == 'true'
+    SQLALCHEMY_READ_DATABASE_URI = os.environ.get('READ_DATABASE_URL')
+    
+    # 默认省份列表（初始化数据库时写入 provinces 表）
+    PROVINCES = ['上海', '江苏', '浙江', '安徽', '福建', '江西', '山东', '其他', '另外']
+    
+    # 省份等下拉选项的进程内缓存时间；本进程修改省份时立即失效
+    LOOKUP_CACHE_TTL_SECONDS = int(os.environ.get('LOOKUP_CACHE_TTL_SECONDS', 300))
+    
     # 分页配置
     DEFAULT_PAGE_SIZE = 10
     MAX_PAGE_SIZE = 100
+    
+    # 批量台账接口单次最多操作数
+    LEDGER_BATCH_MAX_OPERATIONS = int(os.environ.get('LEDGER_BATCH_MAX_OPERATIONS', 200))
+    
+    # 懒加载台账录入人员时抛出异常（用于在测试中发现 N+1 查询）
+    STRICT_AUTHOR_LOADING = False
+    
+    # 全文检索配置（SQLite FTS5）
+    SEARCH_ENABLED = os.environ.get('SEARCH_ENABLED', 'true').lower() == 'true'
+    
+    # 自动补全建议索引（进程内，启动时后台构建，定期重建以同步其他进程的写入）
+    SUGGESTION_INDEX_ENABLED = os.environ.get('SUGGESTION_INDEX_ENABLED', 'true').lower() == 'true'
+    SUGGESTION_INDEX_REFRESH_SECONDS = int(os.environ.get('SUGGESTION_INDEX_REFRESH_SECONDS', 600))
 
-     # JWT配置
-    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
-    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    # 密码哈希：werkzeug 格式的算法与参数（如 pbkdf2:sha256:600000、scrypt:32768:8:1），
+    # 登录成功时旧参数的哈希自动按当前配置重新生成
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    # 每个进程同时计算哈希的线程数、允许排队的登录数及排队等待秒数（超过时返回 503）
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 32))
+    PASSWORD_HASH_WAIT_SECONDS = float(os.environ.get('PASSWORD_HASH_WAIT_SECONDS', 5))
+    # 整台主机（所有 worker 进程）同时计算哈希的上限，名额用尽时最多等待 PASSWORD_HASH_WAIT_SECONDS 后返回 503；0 表示不限制。
+    # gunicorn sync worker 每个进程同时只处理一个请求，进程内的线程池限制不起作用，需依靠该上限
+    PASSWORD_HASH_HOST_SLOTS = int(os.environ.get('PASSWORD_HASH_HOST_SLOTS', os.cpu_count() or 1))
+    PASSWORD_HASH_SLOT_DIR = os.environ.get('PASSWORD_HASH_SLOT_DIR')  # 默认为 instance/hash_slots
+    
+    # 鉴权用户记录缓存（进程内 LRU；本进程的修改立即失效，其他进程的修改最迟 TTL 后生效）
+    USER_CACHE_TTL_SECONDS = int(os.environ.get('USER_CACHE_TTL_SECONDS', 30))
+    USER_CACHE_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE', 1024))
+
+    # JWT配置：访问令牌短期有效，过期后用刷新令牌（/api/refresh）换取，无需重新输入密码
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=int(os.environ.get('JWT_ACCESS_TOKEN_MINUTES', 30)))
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=int(os.environ.get('JWT_REFRESH_TOKEN_DAYS', 30)))
+    # 已作废的刷新令牌在该时间内被再次使用视为多个页面并发刷新，不按盗用处理
+    REFRESH_TOKEN_REUSE_GRACE_SECONDS = int(os.environ.get('REFRESH_TOKEN_REUSE_GRACE_SECONDS', 30))
+    # 过期刷新令牌记录的清理间隔（登录和刷新时按需执行）
+    REFRESH_TOKEN_PRUNE_INTERVAL_SECONDS = int(os.environ.get('REFRESH_TOKEN_PRUNE_INTERVAL_SECONDS', 3600))
+    
+    # 异步导出任务配置
+    EXPORT_JOB_DIR = os.path.abspath(os.environ.get('EXPORT_JOB_DIR', 'exports'))
+    EXPORT_JOB_WORKERS = int(os.environ.get('EXPORT_JOB_WORKERS', 2))
+    EXPORT_JOB_MAX_PENDING = int(os.environ.get('EXPORT_JOB_MAX_PENDING', 20))
+    EXPORT_JOB_TTL_SECONDS = int(os.environ.get('EXPORT_JOB_TTL_SECONDS', 3600))
+    # 排队中或运行中的任务超过该时间没有更新（如 worker 重启）时标记为失败，不再占用排队名额
+    EXPORT_JOB_STALE_SECONDS = int(os.environ.get('EXPORT_JOB_STALE_SECONDS', 1800))
+    
+    # 台账导入：每个事务插入的行数，接口响应中最多返回的错误行数
+    LEDGER_IMPORT_CHUNK_SIZE = int(os.environ.get('LEDGER_IMPORT_CHUNK_SIZE', 2000))
+    LEDGER_IMPORT_MAX_ERRORS = int(os.environ.get('LEDGER_IMPORT_MAX_ERRORS', 100))
+    
+    # 导出文件缓存（Excel/Word），按过滤条件、数据范围和台账数据版本命中
+    EXPORT_CACHE_ENABLED = os.environ.get('EXPORT_CACHE_ENABLED', 'true').lower() == 'true'
+    EXPORT_CACHE_DIR = os.path.abspath(os.environ.get('EXPORT_CACHE_DIR', 'export_cache'))
+    EXPORT_CACHE_MAX_BYTES = int(os.environ.get('EXPORT_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+    
+    # 活动日志批量写入（AUDIT_ASYNC 关闭时每条日志单独提交）
+    AUDIT_ASYNC = os.environ.get('AUDIT_ASYNC', 'true').lower() == 'true'
+    AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0))
+    AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 200))
+    AUDIT_MAX_QUEUE = int(os.environ.get('AUDIT_MAX_QUEUE', 10000))
+    
+    # JSON 序列化：auto 在安装了 orjson 时使用 orjson，stdlib 使用标准库 json
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'auto')
+    
+    # 响应压缩（gzip；安装 brotli 包后支持 br）
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 500))
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_BR_LEVEL = int(os.environ.get('COMPRESS_BR_LEVEL', 4))
+    
+    # 运行指标（/metrics，Prometheus 文本格式）；设置 METRICS_TOKEN 后抓取时需带 Authorization: Bearer <token>
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # gunicorn 多 worker 时各进程每 METRICS_FLUSH_SECONDS 秒把指标写入 METRICS_MULTIPROCESS_DIR
+    # （默认为系统临时目录下的 ledger-metrics），/metrics 汇总所有 worker 的数据
+    METRICS_MULTIPROCESS = os.environ.get('METRICS_MULTIPROCESS', 'true').lower() == 'true'
+    METRICS_MULTIPROCESS_DIR = os.environ.get('METRICS_MULTIPROCESS_DIR')
+    METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+    
+    # 慢查询日志：超过阈值的 SQL 连同参数、接口和 EXPLAIN QUERY PLAN 记入环形缓冲区（/api/admin/slow-queries）
+    # 和按大小轮转的 JSONL 文件；SLOW_QUERY_REDACT_PARAMS 开启后参数一律记为 ***
+    SLOW_QUERY_LOG_ENABLED = os.environ.get('SLOW_QUERY_LOG_ENABLED', 'true').lower() == 'true'
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
+    SLOW_QUERY_BUFFER_SIZE = int(os.environ.get('SLOW_QUERY_BUFFER_SIZE', 500))
+    SLOW_QUERY_LOG_PATH = os.environ.get('SLOW_QUERY_LOG_PATH', 'logs/slow_queries.jsonl')
+    SLOW_QUERY_LOG_MAX_BYTES = int(os.environ.get('SLOW_QUERY_LOG_MAX_BYTES', 10 * 1024 * 1024))
+    SLOW_QUERY_LOG_BACKUP_COUNT = int(os.environ.get('SLOW_QUERY_LOG_BACKUP_COUNT', 5))
+    SLOW_QUERY_REDACT_PARAMS = os.environ.get('SLOW_QUERY_REDACT_PARAMS', 'false').lower() == 'true'
+    SLOW_QUERY_EXPLAIN = os.environ.get('SLOW_QUERY_EXPLAIN', 'true').lower() == 'true'
     
     # 日志配置
     LOG_TO_STDOUT = os.environ.get('LOG_TO_STDOUT')
@@ -27,6 +138,9 @@ class Config:
     LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 10))
 
     
+    # 启动时自动建表、迁移并写入初始数据（生产环境关闭，改为部署时执行 flask init-db）
+    AUTO_INIT_DB = os.environ.get('AUTO_INIT_DB', 'true').lower() == 'true'
+    
     # CORS配置（如果需要）
     CORS_ORIGINS = ['http://localhost:3000', 'http://localhost:8080']
 
@@ -38,11 +152,34 @@ class DevelopmentConfig(Config):
 class ProductionConfig(Config):
     """生产环境配置"""
     DEBUG = False
+    
+    # WAL 允许读写并发；synchronous=NORMAL 在 WAL 下仍保证数据库一致
+    SQLITE_PRAGMAS = sqlite_pragmas({
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -65536,       # 64MB 页缓存（负数表示 KB）
+        'mmap_size': 268435456,     # 256MB 内存映射
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,       # 毫秒
+        'foreign_keys': 'ON',
+    })
+    READ_ROUTING_ENABLED = os.environ.get('READ_ROUTING_ENABLED', 'true').lower() == 'true'
+    AUTO_INIT_DB = os.environ.get('AUTO_INIT_DB', 'false').lower() == 'true'
+    # 慢查询参数中含人员、事项等台账内容，生产环境默认不写入日志
+    SLOW_QUERY_REDACT_PARAMS = os.environ.get('SLOW_QUERY_REDACT_PARAMS', 'true').lower() == 'true'
 
 class TestingConfig(Config):
     """测试环境配置"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///test.db'
+    STRICT_AUTHOR_LOADING = True
+    # 测试中使用低成本哈希
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+    PASSWORD_HASH_HOST_SLOTS = 0
+    SUGGESTION_INDEX_ENABLED = False
+    EXPORT_CACHE_ENABLED = False
+    AUDIT_ASYNC = False
+    METRICS_MULTIPROCESS = False
 
 config = {
     'development': DevelopmentConfig,
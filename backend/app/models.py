@@ -1,8 +1,15 @@
 from datetime import datetime
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.orm import Session
+from werkzeug.security import check_password_hash
 
-db = SQLAlchemy()
+from app.utils.db_routing import RoutingSession
+from app.utils.passwords import hash_password
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     """用户模型"""
@@ -12,6 +19,10 @@ class User(db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(50), default='user', nullable=False)
+    # 台账数量，随台账新增/删除在同一事务中维护
+    entry_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # 令牌代数，写入 JWT 的 gen 声明；修改密码时加一，之前签发的令牌随之失效
+    token_generation = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -19,13 +30,15 @@ class User(db.Model):
     entries = db.relationship('LedgerEntry', backref='author', lazy='dynamic', 
                             cascade='all, delete-orphan')
     activity_logs = db.relationship('ActivityLog', backref='user', lazy='dynamic')
+    refresh_tokens = db.relationship('RefreshToken', backref='user', lazy='dynamic',
+                                     cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<User {self.username}>'
     
     def set_password(self, password):
-        """设置密码"""
-        self.password_hash = generate_password_hash(password)
+        """设置密码（算法和参数取自 PASSWORD_HASH_METHOD）"""
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
         """验证密码"""
@@ -43,15 +56,21 @@ class User(db.Model):
 class LedgerEntry(db.Model):
     """台账条目模型"""
     __tablename__ = 'ledger_entries'
+    # 已有数据库中的索引通过 app/utils/migrations.py 补建；
+    # (user_id, created_at) 的前缀同时满足按 user_id 过滤
+    __table_args__ = (
+        db.Index('ix_ledger_entries_province_created_at', 'province', db.text('created_at DESC')),
+        db.Index('ix_ledger_entries_user_id_created_at', 'user_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     province = db.Column(db.String(100), nullable=False, index=True)
     project_name = db.Column(db.String(200), nullable=False, index=True)
-    date = db.Column(db.Date, nullable=False)
+    date = db.Column(db.Date, nullable=False, index=True)
     location = db.Column(db.String(200), nullable=False)
     personnel = db.Column(db.String(500), nullable=False)
-    nature = db.Column(db.String(100), nullable=False)
+    nature = db.Column(db.String(100), nullable=False, index=True)
     specific_matters = db.Column(db.Text, nullable=False)
     follow_up_points = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
@@ -85,6 +104,10 @@ class LedgerEntry(db.Model):
 class ActivityLog(db.Model):
     """活动日志模型"""
     __tablename__ = 'activity_logs'
+    __table_args__ = (
+        db.Index('ix_activity_logs_user_id_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_activity_logs_level_timestamp', 'level', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
@@ -111,6 +134,26 @@ class ActivityLog(db.Model):
             'ip_address': self.ip_address
         }
 
+class RefreshToken(db.Model):
+    """已签发的刷新令牌，用于轮换和服务端撤销
+
+    每次刷新作废旧令牌（同时记录 rotated_at）并在同一 family 中签发新令牌；已作废的令牌被再次使用时
+    整个 family 一并撤销。退出登录或撤销 family 只设置 revoked_at。过期的记录定期清理。
+    """
+    __tablename__ = 'refresh_tokens'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), unique=True, nullable=False)
+    family = db.Column(db.String(36), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    revoked_at = db.Column(db.DateTime)
+    rotated_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<RefreshToken {self.jti}>'
+
 class Province(db.Model):
     """省份模型"""
     __tablename__ = 'provinces'
@@ -120,4 +163,53 @@ class Province(db.Model):
     code = db.Column(db.String(10), unique=True)
     
     def __repr__(self):
-        return f'<Province {self.name}>'
\ No newline at end of file
+        return f'<Province {self.name}>'
+
+class DataVersion(db.Model):
+    """数据版本计数器，对应表每次写入时递增（用于缓存失效）"""
+    __tablename__ = 'data_versions'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<DataVersion {self.name}={self.version}>'
+
+class LedgerDailyUserStat(db.Model):
+    """每日各用户台账数量（按 created_at 的日期汇总）"""
+    __tablename__ = 'ledger_daily_user_stats'
+    
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class LedgerDailyProvinceStat(db.Model):
+    """每日各省份台账数量"""
+    __tablename__ = 'ledger_daily_province_stats'
+    
+    day = db.Column(db.Date, primary_key=True)
+    province = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class LedgerDailyNatureStat(db.Model):
+    """每日各性质台账数量"""
+    __tablename__ = 'ledger_daily_nature_stats'
+    
+    day = db.Column(db.Date, primary_key=True)
+    nature = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _guard_author_lazyload(orm_execute_state):
+    """STRICT_AUTHOR_LOADING 开启时，禁止逐行懒加载台账的录入人员"""
+    if not orm_execute_state.is_relationship_load:
+        return
+    parent = orm_execute_state.lazy_loaded_from
+    if parent is None or parent.class_ is not LedgerEntry:
+        return
+    if has_app_context() and current_app.config.get('STRICT_AUTHOR_LOADING'):
+        raise InvalidRequestError(
+            f'Lazy load of LedgerEntry.author for entry {parent.identity}; '
+            'use app.utils.ledger_query.load_author() to fetch recorders in the same query'
+        )
+
@@ -0,0 +1,113 @@
+import atexit
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy import insert
+
+from app.models import db, ActivityLog
+
+
+class AuditQueue:
+    """进程内活动日志队列
+
+    日志记录先放入内存队列，由后台线程按时间间隔或数量阈值批量插入，
+    进程退出时写完剩余记录。
+    """
+
+    def __init__(self, app, flush_interval=1.0, batch_size=200, max_size=10000):
+        self.app = app
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.close)
+
+    def put(self, record):
+        """加入一条日志记录（dict），队列已满时返回 False"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            return False
+
+    def _ensure_started(self):
+        # gunicorn fork 之后线程不会被复制，需要在当前进程中重新启动
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._stop.clear()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                self._write(batch)
+        # 进程退出前写完剩余记录
+        self.drain()
+
+    def _collect(self):
+        """等待第一条记录，然后在 flush_interval 内最多收集 batch_size 条"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def drain(self):
+        """同步写入队列中的所有记录"""
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            self._write(batch)
+
+    def _write(self, batch):
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as conn:
+                    conn.execute(insert(ActivityLog), batch)
+        except Exception as e:
+            self.app.logger.error(f'Failed to write {len(batch)} activity logs: {str(e)}')
+
+    def close(self):
+        """停止后台线程并写完剩余记录"""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.drain()
+
+
+def init_audit_queue(app):
+    """创建活动日志批量写入队列"""
+    audit_queue = AuditQueue(
+        app,
+        flush_interval=app.config['AUDIT_FLUSH_INTERVAL'],
+        batch_size=app.config['AUDIT_BATCH_SIZE'],
+        max_size=app.config['AUDIT_MAX_QUEUE']
+    )
+    app.extensions['audit_queue'] = audit_queue
+    return audit_queue
@@ -0,0 +1,133 @@
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # 可选依赖，未安装时只使用 gzip
+    brotli = None
+
+# 默认压缩的响应类型；xlsx/docx 本身是 zip 压缩包，再压缩几乎没有收益
+DEFAULT_COMPRESS_MIMETYPES = (
+    'application/json',
+    'text/csv',
+    'text/plain',
+    'text/html',
+    'text/css',
+    'application/javascript',
+)
+
+
+class _GzipEncoder:
+    name = 'gzip'
+
+    def __init__(self, level):
+        # wbits=31 输出带 gzip 头的数据
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        # 同步刷新，当前数据块可以立即被客户端解压
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliEncoder:
+    name = 'br'
+
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def choose_encoding(accept_encodings):
+    """根据 Accept-Encoding 选择编码：安装了 brotli 时优先 br，其次 gzip"""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def _make_encoder(encoding, config):
+    if encoding == 'br':
+        return _BrotliEncoder(config['COMPRESS_BR_LEVEL'])
+    return _GzipEncoder(config['COMPRESS_LEVEL'])
+
+
+def compress_stream(chunks, encoder):
+    """逐块压缩响应体，每块输出后刷新，保持流式传输"""
+    try:
+        for chunk in chunks:
+            data = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+            if not data:
+                continue
+            out = encoder.compress(data) + encoder.flush()
+            if out:
+                yield out
+        yield encoder.finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def compress_response(response, config):
+    """按请求的 Accept-Encoding 压缩响应，不满足条件时原样返回"""
+    if response.status_code != 200 or request.method == 'HEAD':
+        return response
+    if response.mimetype not in config['COMPRESS_MIMETYPES']:
+        return response
+    response.vary.add('Accept-Encoding')
+    if 'Content-Encoding' in response.headers:
+        return response
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    min_size = config['COMPRESS_MIN_SIZE']
+    if response.content_length is not None and response.content_length < min_size:
+        return response
+    encoder = _make_encoder(encoding, config)
+
+    if response.is_streamed:
+        # 生成器或文件响应：包装为逐块压缩的生成器，长度未知
+        chunks = response.response
+        response.direct_passthrough = False
+        response.response = compress_stream(chunks, encoder)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(encoder.compress(data) + encoder.finish())
+
+    response.headers['Content-Encoding'] = encoder.name
+    # 压缩后字节不同，强 ETag 改为弱 ETag
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        response.headers['ETag'] = f'W/{etag}'
+    return response
+
+
+def init_compression(app):
+    """注册响应压缩（gzip，安装 brotli 时支持 br）"""
+    config = app.config
+    config.setdefault('COMPRESS_MIMETYPES', DEFAULT_COMPRESS_MIMETYPES)
+
+    @app.after_request
+    def _compress(response):
+        return compress_response(response, config)
+
+    app.logger.info(f"Response compression enabled: {'br, gzip' if brotli is not None else 'gzip'}")
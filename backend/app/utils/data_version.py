@@ -0,0 +1,46 @@
+from sqlalchemy import event, insert, inspect, select, update
+from sqlalchemy.orm import Session
+
+from app.models import db, DataVersion, LedgerEntry, User
+from app.utils.ledger_events import on_ledger_flush
+
+
+def bump_data_version(conn, name):
+    """在当前事务中递增数据版本"""
+    result = conn.execute(
+        update(DataVersion).where(DataVersion.name == name).values(version=DataVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        conn.execute(insert(DataVersion).values(name=name, version=1))
+
+
+def get_data_version(name):
+    """读取数据版本，从未写入过时为 0"""
+    version = db.session.execute(
+        select(DataVersion.version).where(DataVersion.name == name)
+    ).scalar()
+    return version or 0
+
+
+def get_data_versions(*names):
+    """在一次查询中读取多个数据版本，按参数顺序返回"""
+    versions = dict(db.session.execute(
+        select(DataVersion.name, DataVersion.version).where(DataVersion.name.in_(names))
+    ).all())
+    return tuple(versions.get(name) or 0 for name in names)
+
+
+@on_ledger_flush
+def _bump_ledger_version(session, changes):
+    bump_data_version(session.connection(), LedgerEntry.__tablename__)
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_user_version(session, flush_context):
+    # 台账详情中包含录入人员用户名，用户名变化或用户删除时使缓存的详情失效
+    changed = any(isinstance(obj, User) for obj in session.deleted) or any(
+        isinstance(obj, User) and inspect(obj).attrs.username.history.has_changes()
+        for obj in session.dirty
+    )
+    if changed:
+        bump_data_version(session.connection(), User.__tablename__)
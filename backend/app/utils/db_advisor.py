@@ -0,0 +1,123 @@
+import re
+from urllib.parse import urlencode
+
+from sqlalchemy import event
+
+from app.models import db, User, LedgerEntry
+from app.utils.refresh_tokens import create_user_access_token
+
+# 需要检查的接口请求 (名称, 路径, 查询参数)；{province} 等占位符用库中的样例数据替换
+ADVISE_REQUESTS = (
+    ('ledger list', '/api/ledger', {}),
+    ('ledger list by province', '/api/ledger', {'province': '{province}'}),
+    ('ledger list by date', '/api/ledger', {'start_date': '{date}', 'end_date': '{date}'}),
+    ('ledger list by recorder', '/api/ledger', {'recorder': '{username}'}),
+    ('ledger cursor page', '/api/ledger', {'cursor': '', 'province': '{province}'}),
+    ('ledger detail', '/api/ledger/{entry_id}', {}),
+    ('project suggestions', '/api/meta/suggestions/project_items', {'query': '{keyword}', 'province': '{province}'}),
+    ('location suggestions', '/api/meta/suggestions/locations', {'query': '{keyword}'}),
+    ('ledger export', '/api/meta/export/ledger', {'format': 'csv', 'province': '{province}'}),
+    ('ledger stats by user', '/api/meta/stats/ledger_by_user', {}),
+    ('activity logs', '/api/admin/logs', {}),
+    ('activity logs by level', '/api/admin/logs', {'level': 'WARNING'}),
+    ('activity logs by user', '/api/admin/logs', {'user_id': '{user_id}'}),
+    ('user list by entry count', '/api/admin/users', {'sort': 'entry_count'}),
+    ('admin statistics', '/api/admin/statistics', {}),
+)
+
+_FULL_SCAN = re.compile(r'SCAN (\w+)(?: AS \w+)?')
+
+
+def _sample_values():
+    """从库中取一条台账作为请求参数样例"""
+    entry = LedgerEntry.query.order_by(LedgerEntry.id.desc()).first()
+    if entry is None:
+        return {'province': '北京', 'date': '2024-01-01', 'username': 'admin',
+                'entry_id': 1, 'user_id': 1, 'keyword': '项目'}
+    return {
+        'province': entry.province,
+        'date': entry.date.isoformat(),
+        'username': db.session.get(User, entry.user_id).username,
+        'entry_id': entry.id,
+        'user_id': entry.user_id,
+        'keyword': entry.project_name[:2],
+    }
+
+
+def plan_issues(plan):
+    """从 EXPLAIN QUERY PLAN 结果中找出全表扫描和临时 B-tree 排序"""
+    tables = set(db.metadata.tables)
+    issues = []
+    for detail in plan:
+        match = _FULL_SCAN.fullmatch(detail)
+        if match and match.group(1) in tables:
+            issues.append(f'full scan of {match.group(1)}')
+        elif 'USE TEMP B-TREE' in detail:
+            issues.append(detail.lower())
+    return issues
+
+
+def _capture_statements(client, path, headers, engines):
+    """发起请求并记录其执行的 SELECT 语句及参数（读写分离时 GET 请求的查询走只读引擎）"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and (statement, parameters) not in statements:
+            statements.append((statement, parameters))
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(path, headers=headers, buffered=False)
+        # 流式响应只需读取前几个数据块即可触发查询
+        for _, _chunk in zip(range(2), response.response):
+            pass
+        response.close()
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', record)
+    return response.status_code, statements
+
+
+def advise(app):
+    """对各接口实际执行的查询运行 EXPLAIN QUERY PLAN，返回检查结果列表"""
+    admin = User.query.filter_by(role='admin').order_by(User.id).first()
+    if admin is None:
+        raise RuntimeError('No admin user found')
+    token = create_user_access_token(admin)
+    headers = {'Authorization': f'Bearer {token}'}
+    values = _sample_values()
+
+    # 绕过进程内建议索引，检查其回退查询
+    suggestion_index = app.extensions.pop('suggestion_index', None)
+    client = app.test_client()
+    engines = [db.engine]
+    if app.extensions.get('read_engine') is not None:
+        engines.append(app.extensions['read_engine'])
+    results = []
+    try:
+        for name, path, params in ADVISE_REQUESTS:
+            path = path.format(**values)
+            query = {key: value.format(**values) for key, value in params.items()}
+            if query:
+                path = f'{path}?{urlencode(query)}'
+            status, statements = _capture_statements(client, path, headers, engines)
+            if not 200 <= status < 300:
+                # 请求失败时没有执行业务查询，不能当作“没有问题”
+                raise RuntimeError(f'{name}: GET {path} returned {status}')
+            explained = []
+            with db.engine.connect() as conn:
+                for statement, parameters in statements:
+                    rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+                    plan = [row[3] for row in rows]
+                    explained.append({
+                        'sql': ' '.join(statement.split()),
+                        'plan': plan,
+                        'issues': plan_issues(plan),
+                    })
+            results.append({'name': name, 'path': path, 'status': status, 'statements': explained})
+    finally:
+        if suggestion_index is not None:
+            app.extensions['suggestion_index'] = suggestion_index
+        db.session.remove()
+    return results
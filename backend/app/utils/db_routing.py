@@ -0,0 +1,96 @@
+from flask import has_app_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+# 请求头存在时 GET 请求也读主库（客户端在刚提交写操作后发送，保证读到自己的写入）
+READ_YOUR_WRITES_HEADER = 'X-Read-Your-Writes'
+
+# session.info 中保存只读引擎的键；存在时查询路由到该引擎
+_READ_ENGINE_KEY = 'read_engine'
+
+
+class RoutingSession(Session):
+    """支持读写分离的 Session
+
+    session.info 中设置了只读引擎时，查询发往只读引擎；flush、DML 和文本语句始终使用主库。
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        read_engine = self.info.get(_READ_ENGINE_KEY)
+        if (
+            read_engine is not None
+            and bind is None
+            and not self._flushing
+            and not isinstance(clause, (UpdateBase, TextClause))
+        ):
+            return read_engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _stick_to_primary(session, flush_context, instances):
+    # 本次请求写入后，后续查询改读主库，避免读不到刚写入的数据
+    session.info.pop(_READ_ENGINE_KEY, None)
+
+
+def use_primary(session):
+    """之后的查询都读主库"""
+    session.info.pop(_READ_ENGINE_KEY, None)
+
+
+def create_read_engine(app, primary):
+    """创建只读引擎：配置了 SQLALCHEMY_READ_DATABASE_URI 时连接副本，否则 SQLite 使用同一文件的只读连接"""
+    from app.utils.sqlite_pragmas import apply_pragmas
+
+    uri = app.config.get('SQLALCHEMY_READ_DATABASE_URI')
+    if uri:
+        engine = create_engine(uri)
+    elif primary.dialect.name == 'sqlite':
+        # 按配置判断而不是查询数据库，worker 启动时不建立连接
+        journal_mode = str((app.config.get('SQLITE_PRAGMAS') or {}).get('journal_mode', 'delete')).lower()
+        if journal_mode != 'wal':
+            # 非 WAL 模式下读连接会阻塞写入，读写分离没有意义
+            app.logger.warning(f'Read routing disabled: SQLite journal_mode is {journal_mode}, not wal')
+            return None
+        engine = create_engine(primary.url)
+    else:
+        app.logger.warning('Read routing disabled: SQLALCHEMY_READ_DATABASE_URI is not set')
+        return None
+
+    if engine.dialect.name == 'sqlite':
+        pragmas = dict(app.config.get('SQLITE_PRAGMAS') or {})
+        pragmas.pop('journal_mode', None)
+        pragmas['query_only'] = 'ON'
+
+        @event.listens_for(engine, 'connect')
+        def _set_read_pragmas(dbapi_connection, connection_record):
+            apply_pragmas(dbapi_connection, pragmas)
+
+    return engine
+
+
+def init_read_routing(app, db):
+    """GET/HEAD 请求的查询发往只读引擎，其余请求和写操作使用主库"""
+    with app.app_context():
+        engine = create_read_engine(app, db.engine)
+    if engine is None:
+        return None
+    app.extensions['read_engine'] = engine
+
+    @app.before_request
+    def _route_reads():
+        if request.method in ('GET', 'HEAD') and not request.headers.get(READ_YOUR_WRITES_HEADER):
+            db.session.info[_READ_ENGINE_KEY] = engine
+        else:
+            use_primary(db.session)
+
+    @app.teardown_request
+    def _reset_routing(exc):
+        # 应用上下文可能在请求结束后继续使用（如测试、命令行），恢复为读主库
+        if has_app_context() and db.session.registry.has():
+            use_primary(db.session)
+
+    app.logger.info(f'Read routing enabled: {engine.url.render_as_string(hide_password=True)}')
+    return engine
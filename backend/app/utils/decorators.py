@@ -1,6 +1,6 @@
 from functools import wraps
 from flask import jsonify, request
-from flask_jwt_extended import verify_jwt_in_request, get_jwt
+from flask_jwt_extended import verify_jwt_in_request
 
 def role_required(allowed_roles):
     """角色权限检查装饰器"""
@@ -10,8 +10,9 @@ def role_required(allowed_roles):
             if request.method == 'OPTIONS':
                 return '', 204
             verify_jwt_in_request()
-            claims = get_jwt()
-            user_role = claims.get('role', 'user')
+            # 角色取自用户缓存，角色变更后立即生效（app.models 导入本包，这里延迟导入避免循环）
+            from app.utils.user_cache import current_user_role
+            user_role = current_user_role()
             
             if user_role not in allowed_roles:
                 return jsonify({
@@ -0,0 +1,77 @@
+import hashlib
+import json
+import os
+import uuid
+
+from app.utils.ledger_export import EXPORT_FORMATS
+
+
+def export_cache_key(export_format, filters, scope_user_id, data_version):
+    """根据导出格式、规范化的过滤条件、数据范围和数据版本生成缓存键"""
+    payload = json.dumps({
+        'format': export_format,
+        'filters': {k: str(v) for k, v in sorted(filters.items())},
+        'scope': 'all' if scope_user_id is None else str(scope_user_id),
+        'version': data_version
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ExportCache:
+    """磁盘导出文件缓存，按最近使用时间淘汰，总大小不超过 max_bytes"""
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def path(self, key, export_format):
+        return os.path.join(self.cache_dir, f'{key}.{EXPORT_FORMATS[export_format][0]}')
+
+    def get(self, key, export_format):
+        """命中时返回文件路径并刷新其使用时间"""
+        path = self.path(key, export_format)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, export_format, write):
+        """调用 write(fileobj) 生成文件并放入缓存，返回文件路径"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.path(key, export_format)
+        tmp_path = os.path.join(self.cache_dir, f'.{uuid.uuid4().hex}.tmp')
+        try:
+            with open(tmp_path, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep=None):
+        """删除最久未使用的文件，直到总大小不超过上限"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if name.startswith('.'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,249 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from app.utils.ledger_export import EXPORT_FORMATS
+
+try:
+    import fcntl
+except ImportError:  # Windows 上没有 fcntl，状态文件更新不加锁
+    fcntl = None
+
+# 任务状态
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# 子进程每处理这么多行更新一次进度
+PROGRESS_INTERVAL = 1000
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+class ExportQueueFull(Exception):
+    """排队中的导出任务过多"""
+
+
+def _get_executor(max_workers):
+    """获取本进程的导出进程池（gunicorn fork 后在各 worker 中重新创建）"""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            # spawn 避免在 fork 时复制 web 进程中的线程与数据库连接
+            _executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _status_path(job_dir, job_id):
+    return os.path.join(job_dir, f'{job_id}.json')
+
+
+def artifact_path(job_dir, job_id, export_format):
+    extension = EXPORT_FORMATS[export_format][0]
+    return os.path.join(job_dir, f'{job_id}.{extension}')
+
+
+@contextmanager
+def _status_lock(job_dir, job_id):
+    """任务状态文件的排他锁（导出子进程与 web 进程都会更新状态，读-改-写期间互斥）"""
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(os.path.join(job_dir, f'{job_id}.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _replace_status(job_dir, job_id, status):
+    # 先写临时文件再替换，读取方不会看到半个文件
+    path = _status_path(job_dir, job_id)
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(status, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def write_status(job_dir, job_id, **fields):
+    """更新任务状态文件中的指定字段，其余字段保持不变"""
+    with _status_lock(job_dir, job_id):
+        status = read_status(job_dir, job_id) or {}
+        status.update(fields)
+        status['updated_at'] = datetime.utcnow().isoformat()
+        _replace_status(job_dir, job_id, status)
+    return status
+
+
+def fail_unfinished(job_dir, job_id, error, updated_before=None):
+    """任务仍在排队或运行时标记为失败，返回是否修改了状态
+
+    updated_before 不为空时只处理最后更新时间早于该时刻（UTC）的任务。
+    """
+    with _status_lock(job_dir, job_id):
+        status = read_status(job_dir, job_id)
+        if status is None or status.get('status') not in (PENDING, RUNNING):
+            return False
+        if updated_before is not None and status.get('updated_at', '') >= updated_before.isoformat():
+            return False
+        status.update(status=FAILED, error=error, updated_at=datetime.utcnow().isoformat())
+        _replace_status(job_dir, job_id, status)
+    return True
+
+
+def read_status(job_dir, job_id):
+    """读取任务状态，任务不存在时返回 None"""
+    try:
+        with open(_status_path(job_dir, job_id), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def cleanup_expired(job_dir, ttl_seconds):
+    """删除超过保留时间的任务状态和导出文件"""
+    if not os.path.isdir(job_dir):
+        return 0
+    removed = 0
+    deadline = time.time() - ttl_seconds
+    for name in os.listdir(job_dir):
+        path = os.path.join(job_dir, name)
+        try:
+            if os.path.getmtime(path) < deadline:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def fail_stale_jobs(job_dir, stale_seconds):
+    """长时间没有更新的排队中或运行中任务（如 worker 重启后丢失的任务）标记为失败"""
+    if not os.path.isdir(job_dir):
+        return 0
+    updated_before = datetime.utcnow() - timedelta(seconds=stale_seconds)
+    failed = 0
+    for name in os.listdir(job_dir):
+        if name.endswith('.json'):
+            job_id = name[:-len('.json')]
+            status = read_status(job_dir, job_id)
+            if status and status.get('status') in (PENDING, RUNNING):
+                failed += fail_unfinished(
+                    job_dir, job_id, 'Export job was interrupted', updated_before=updated_before
+                )
+    return failed
+
+
+def expire_jobs(app):
+    """清理过期的任务文件，并将停滞的任务标记为失败"""
+    job_dir = app.config['EXPORT_JOB_DIR']
+    cleanup_expired(job_dir, app.config['EXPORT_JOB_TTL_SECONDS'])
+    fail_stale_jobs(job_dir, app.config['EXPORT_JOB_STALE_SECONDS'])
+
+
+def count_active(job_dir):
+    """统计排队中和运行中的任务数"""
+    if not os.path.isdir(job_dir):
+        return 0
+    active = 0
+    for name in os.listdir(job_dir):
+        if name.endswith('.json'):
+            status = read_status(job_dir, name[:-len('.json')])
+            if status and status.get('status') in (PENDING, RUNNING):
+                active += 1
+    return active
+
+
+def submit_export_job(app, export_format, filters, user_id, scope_user_id=None):
+    """提交台账导出任务，返回任务状态"""
+    job_dir = app.config['EXPORT_JOB_DIR']
+    os.makedirs(job_dir, exist_ok=True)
+    expire_jobs(app)
+    if count_active(job_dir) >= app.config['EXPORT_JOB_MAX_PENDING']:
+        raise ExportQueueFull()
+
+    job_id = uuid.uuid4().hex
+    status = write_status(
+        job_dir, job_id,
+        id=job_id,
+        status=PENDING,
+        format=export_format,
+        user_id=str(user_id),
+        progress=0,
+        total=None,
+        error=None,
+        created_at=datetime.utcnow().isoformat()
+    )
+    from app.models import db
+    database_uri = db.engine.url.render_as_string(hide_password=False)
+    executor = _get_executor(app.config['EXPORT_JOB_WORKERS'])
+    future = executor.submit(
+        run_export_job, database_uri, job_dir, job_id, export_format, filters, scope_user_id
+    )
+
+    metrics = app.extensions.get('metrics')
+
+    def on_done(fut):
+        # 子进程异常退出（如被终止）时记录失败状态；子进程自己已写入结果时不覆盖
+        error = fut.exception()
+        if error is not None:
+            fail_unfinished(job_dir, job_id, str(error))
+        elif metrics is not None:
+            # 导出在子进程中执行，完成后按状态文件中的总行数计入本进程指标
+            done = read_status(job_dir, job_id) or {}
+            metrics.export_rows.inc(done.get('progress') or 0, ('ledger_job', export_format))
+
+    future.add_done_callback(on_done)
+    return status
+
+
+def run_export_job(database_uri, job_dir, job_id, export_format, filters, scope_user_id):
+    """在导出进程中执行：查询台账并生成导出文件"""
+    from sqlalchemy import create_engine, func, select
+    from sqlalchemy.pool import NullPool
+
+    from app.utils.exporters import EXPORT_BATCH_SIZE
+    from app.utils.ledger_export import ledger_export_row, ledger_export_select, write_ledger_export
+
+    engine = create_engine(database_uri, poolclass=NullPool)
+    path = artifact_path(job_dir, job_id, export_format)
+    tmp_path = f'{path}.tmp'
+    try:
+        stmt = ledger_export_select(filters, scope_user_id)
+        with engine.connect() as conn:
+            total = conn.execute(select(func.count()).select_from(stmt.order_by(None).subquery())).scalar()
+            write_status(job_dir, job_id, status=RUNNING, total=total)
+
+            def generate_rows():
+                done = 0
+                for row in conn.execution_options(yield_per=EXPORT_BATCH_SIZE).execute(stmt):
+                    yield ledger_export_row(row)
+                    done += 1
+                    if done % PROGRESS_INTERVAL == 0:
+                        write_status(job_dir, job_id, progress=done)
+
+            with open(tmp_path, 'wb') as output:
+                write_ledger_export(export_format, generate_rows(), output)
+        os.replace(tmp_path, path)
+        write_status(job_dir, job_id, status=DONE, progress=total)
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        write_status(job_dir, job_id, status=FAILED, error=str(e))
+        raise
+    finally:
+        engine.dispose()
@@ -0,0 +1,152 @@
+import csv
+import io
+import tempfile
+
+# 流式导出时每次从数据库取回的行数
+EXPORT_BATCH_SIZE = 1000
+
+# 缓冲区超过该大小时输出一个数据块
+CSV_CHUNK_SIZE = 64 * 1024
+
+
+def iter_csv(headers, rows, chunk_size=CSV_CHUNK_SIZE):
+    """逐块生成 CSV 内容，先输出 BOM 与表头，内存占用与总行数无关"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # 加 BOM 头防止 Excel 乱码
+    buffer.write('\ufeff')
+    writer.writerow(headers)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= chunk_size:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# 超过该大小的导出文件写入磁盘临时文件
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+# 用于计算列宽的前置样本行数；write-only 模式必须在写入第一行前确定列宽
+WIDTH_SAMPLE_ROWS = 1000
+
+# Excel 允许的最大列宽
+MAX_COLUMN_WIDTH = 255
+
+
+def write_xlsx(headers, rows, output=None, sample_rows=WIDTH_SAMPLE_ROWS):
+    """以 openpyxl write-only 模式流式写出工作簿
+
+    rows 可以是任意迭代器，写入过程中不会在内存中保留单元格对象。
+    未指定 output 时写入临时文件，返回定位到开头的文件对象。
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Font
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+
+    # 先缓存少量行，边读边累计每列最大宽度
+    rows = iter(rows)
+    widths = [len(str(h)) for h in headers]
+    sample = []
+    for row in rows:
+        sample.append(row)
+        for i, value in enumerate(row):
+            widths[i] = max(widths[i], len(str(value)))
+        if len(sample) >= sample_rows:
+            break
+    for i, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = min(width + 2, MAX_COLUMN_WIDTH)
+
+    # 加粗表头
+    header_cells = []
+    for h in headers:
+        cell = WriteOnlyCell(ws, value=h)
+        cell.font = Font(bold=True)
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+        header_cells.append(cell)
+    ws.append(header_cells)
+    for row in sample:
+        ws.append(row)
+    for row in rows:
+        ws.append(row)
+
+    if output is None:
+        output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    wb.save(output)
+    if hasattr(output, 'seek'):
+        output.seek(0)
+    return output
+
+
+DOCX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+
+def write_docx(title, headers, rows, output=None):
+    """生成带表格的 Word 文档（python-docx 需要在内存中构建整个文档）"""
+    from docx import Document
+    from docx.shared import Pt
+
+    doc = Document()
+    doc.add_heading(title, 0)
+    table = doc.add_table(rows=1, cols=len(headers))
+    table.style = 'Table Grid'
+    hdr_cells = table.rows[0].cells
+    for i, h in enumerate(headers):
+        hdr_cells[i].text = h
+        run = hdr_cells[i].paragraphs[0].runs[0]
+        run.bold = True
+        run.font.size = Pt(11)
+    for row in rows:
+        row_cells = table.add_row().cells
+        for i, val in enumerate(row):
+            row_cells[i].text = str(val)
+    # 自动调整列宽（简单实现）
+    for row in table.rows:
+        for cell in row.cells:
+            for paragraph in cell.paragraphs:
+                for run in paragraph.runs:
+                    run.font.size = Pt(10)
+    if output is None:
+        output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    doc.save(output)
+    if hasattr(output, 'seek'):
+        output.seek(0)
+    return output
+
+
+def write_csv(headers, rows, output):
+    """将 CSV（UTF-8 带 BOM）写入二进制文件对象"""
+    for chunk in iter_csv(headers, rows):
+        output.write(chunk.encode('utf-8'))
+    return output
+
+
+def iter_file(fileobj, chunk_size=CSV_CHUNK_SIZE):
+    """分块读取文件用于响应体，读完后关闭文件"""
+    try:
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def file_size(fileobj):
+    """获取已定位到开头的文件对象的大小"""
+    fileobj.seek(0, io.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    return size
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request
+
+
+class TTLCache:
+    """进程内带过期时间的缓存，可按键显式失效；指定 max_size 时按最近使用淘汰"""
+
+    def __init__(self, ttl_seconds, max_size=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._items.move_to_end(key)
+            if self.max_size is not None:
+                while len(self._items) > self.max_size:
+                    self._items.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        """命中时返回缓存值，否则调用 loader() 并缓存结果"""
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            self.set(key, value)
+        return value
+
+    def invalidate(self, key=None):
+        """使指定键（未指定时全部）失效"""
+        with self._lock:
+            if key is None:
+                self._items.clear()
+            else:
+                self._items.pop(key, None)
+
+
+def make_etag(*parts):
+    """根据数据版本等组成部分生成强 ETag"""
+    return '"' + '-'.join(str(part) for part in parts) + '"'
+
+
+def content_etag(data):
+    """根据 JSON 内容生成 ETag"""
+    payload = json.dumps(data, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return make_etag(hashlib.sha1(payload).hexdigest()[:16])
+
+
+def etag_matches(etag):
+    """请求的 If-None-Match 是否包含该 ETag"""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    candidates = {value.strip().removeprefix('W/') for value in header.split(',')}
+    return etag in candidates
+
+
+def not_modified(etag):
+    """304 响应（无响应体）"""
+    return '', 304, {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+
+
+def with_etag(response, etag):
+    """为响应设置 ETag，并要求客户端每次使用前重新验证"""
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,59 @@
+import dataclasses
+import decimal
+import uuid
+from datetime import date, datetime
+
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时使用标准库 json
+    orjson = None
+
+
+def _default(o):
+    """标准库和 orjson 都无法直接序列化的类型；日期时间统一输出 ISO 8601"""
+    if isinstance(o, (date, datetime)):
+        return o.isoformat()
+    if isinstance(o, (decimal.Decimal, uuid.UUID)):
+        return str(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+class IsoJSONProvider(DefaultJSONProvider):
+    """标准库 json，日期时间输出为 ISO 8601（与 orjson 输出一致）"""
+
+    default = staticmethod(_default)
+
+
+class OrjsonProvider(JSONProvider):
+    """基于 orjson 的 JSON 序列化，直接生成 UTF-8 字节作为响应体"""
+
+    def _dumps_bytes(self, obj):
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+    def dumps(self, obj, **kwargs):
+        return self._dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumps_bytes(obj), mimetype='application/json')
+
+
+def init_json_provider(app):
+    """按 JSON_PROVIDER 配置（auto / orjson / stdlib）设置应用的 JSON 序列化实现"""
+    name = app.config.get('JSON_PROVIDER', 'auto')
+    if name == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_PROVIDER is orjson but orjson is not installed')
+    if orjson is not None and name in ('auto', 'orjson'):
+        app.json = OrjsonProvider(app)
+    else:
+        app.json = IsoJSONProvider(app)
+    return app.json
@@ -0,0 +1,115 @@
+from collections import namedtuple
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from app.models import LedgerEntry
+
+# 变更快照中包含的字段
+LEDGER_FIELDS = (
+    'id', 'user_id', 'province', 'project_name', 'date', 'location', 'personnel',
+    'nature', 'specific_matters', 'follow_up_points', 'created_at'
+)
+
+# op: create / update / delete；old、new 为字段快照（dict），不存在时为 None
+LedgerChange = namedtuple('LedgerChange', ['op', 'entry_id', 'old', 'new'])
+
+_flush_handlers = []
+_commit_handlers = []
+
+
+def on_ledger_flush(fn):
+    """注册在 flush 时（同一事务内）执行的处理函数 fn(session, changes)"""
+    _flush_handlers.append(fn)
+    return fn
+
+
+def on_ledger_commit(fn):
+    """注册在事务提交后执行的处理函数 fn(changes)"""
+    _commit_handlers.append(fn)
+    return fn
+
+
+def snapshot(entry):
+    """获取台账条目当前字段值"""
+    return {field: getattr(entry, field) for field in LEDGER_FIELDS}
+
+
+def dispatch_ledger_changes(session, changes):
+    """分发台账变更：立即执行 flush 处理函数，提交后再执行 commit 处理函数
+
+    通过 Core 批量 insert/update/delete 绕过 ORM flush 的代码路径需要手动调用。
+    """
+    if not changes:
+        return
+    for handler in _flush_handlers:
+        handler(session, changes)
+    session.info.setdefault('ledger_changes', []).extend(changes)
+
+
+def _previous_values(session, entry):
+    """根据属性历史还原修改前的字段值，无法还原时从数据库读取"""
+    state = inspect(entry)
+    values = {}
+    missing = False
+    for field in LEDGER_FIELDS:
+        history = state.attrs[field].history
+        if history.deleted:
+            values[field] = history.deleted[0]
+        elif history.unchanged:
+            values[field] = history.unchanged[0]
+        elif not history.added:
+            values[field] = getattr(entry, field)
+        else:
+            missing = True
+    if missing:
+        # 属性在修改前未加载，旧值不在内存中
+        columns = [getattr(LedgerEntry, field) for field in LEDGER_FIELDS]
+        row = session.connection().execute(
+            select(*columns).where(LedgerEntry.id == state.identity[0])
+        ).one()
+        values = dict(row._mapping)
+    return values
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_previous_values(session, flush_context, instances):
+    previous = session.info.setdefault('ledger_previous', {})
+    for entry in session.dirty:
+        if isinstance(entry, LedgerEntry) and session.is_modified(entry):
+            previous[id(entry)] = _previous_values(session, entry)
+    for entry in session.deleted:
+        if isinstance(entry, LedgerEntry):
+            previous[id(entry)] = snapshot(entry)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    previous = session.info.pop('ledger_previous', {})
+    changes = []
+    for entry in session.new:
+        if isinstance(entry, LedgerEntry):
+            changes.append(LedgerChange('create', entry.id, None, snapshot(entry)))
+    for entry in session.dirty:
+        if isinstance(entry, LedgerEntry) and id(entry) in previous:
+            changes.append(LedgerChange('update', entry.id, previous[id(entry)], snapshot(entry)))
+    for entry in session.deleted:
+        if isinstance(entry, LedgerEntry) and id(entry) in previous:
+            old = previous[id(entry)]
+            changes.append(LedgerChange('delete', old['id'], old, None))
+    dispatch_ledger_changes(session, changes)
+
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_committed(session):
+    changes = session.info.pop('ledger_changes', None)
+    if not changes:
+        return
+    for handler in _commit_handlers:
+        handler(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('ledger_changes', None)
+    session.info.pop('ledger_previous', None)
@@ -0,0 +1,67 @@
+from sqlalchemy import select
+
+from app.models import LedgerEntry, User
+from app.utils.exporters import write_csv, write_docx, write_xlsx, XLSX_MIMETYPE, DOCX_MIMETYPE
+from app.utils.ledger_query import apply_ledger_filters
+
+LEDGER_EXPORT_HEADERS = [
+    'ID', '录入人员', '省份', '项目名称', '日期', '地点',
+    '涉及人员', '性质', '具体事项', '后续要点', '创建时间'
+]
+
+# 导出格式 -> (文件扩展名, MIME 类型)
+EXPORT_FORMATS = {
+    'csv': ('csv', 'text/csv'),
+    'excel': ('xlsx', XLSX_MIMETYPE),
+    'word': ('docx', DOCX_MIMETYPE),
+}
+
+
+def ledger_export_select(filters, user_id=None):
+    """构造导出用的 Core 查询，录入人员在同一条语句中取回
+
+    user_id 不为空时只导出该用户录入的台账（普通用户）。
+    """
+    stmt = select(
+        LedgerEntry.id,
+        User.username.label('recorder'),
+        LedgerEntry.province,
+        LedgerEntry.project_name,
+        LedgerEntry.date,
+        LedgerEntry.location,
+        LedgerEntry.personnel,
+        LedgerEntry.nature,
+        LedgerEntry.specific_matters,
+        LedgerEntry.follow_up_points,
+        LedgerEntry.created_at
+    ).join(User, User.id == LedgerEntry.user_id)
+    if user_id is not None:
+        stmt = stmt.where(LedgerEntry.user_id == user_id)
+    stmt = apply_ledger_filters(stmt, filters, users_joined=True)
+    return stmt.order_by(LedgerEntry.created_at.desc())
+
+
+def ledger_export_row(row):
+    """台账导出行"""
+    return [
+        row.id,
+        row.recorder or '',
+        row.province,
+        row.project_name,
+        row.date.strftime('%Y-%m-%d') if row.date else '',
+        row.location,
+        row.personnel,
+        row.nature,
+        row.specific_matters,
+        row.follow_up_points or '',
+        row.created_at.strftime('%Y-%m-%d %H:%M:%S') if row.created_at else ''
+    ]
+
+
+def write_ledger_export(export_format, rows, output=None):
+    """按格式写出台账导出文件，rows 为导出行迭代器"""
+    if export_format == 'excel':
+        return write_xlsx(LEDGER_EXPORT_HEADERS, rows, output)
+    if export_format == 'word':
+        return write_docx('台账导出', LEDGER_EXPORT_HEADERS, rows, output)
+    return write_csv(LEDGER_EXPORT_HEADERS, rows, output)
@@ -0,0 +1,204 @@
+import csv
+import io
+import os
+from collections import namedtuple
+from datetime import date, datetime
+
+from sqlalchemy import insert, select
+
+from app.models import db, LedgerEntry, User
+from app.utils.ledger_events import LEDGER_FIELDS, LedgerChange, dispatch_ledger_changes
+from app.utils.ledger_query import parse_entry_fields
+
+# 导入文件的列与导出文件一致（ID 列忽略，导入后重新分配）
+RECORDER_HEADER = '录入人员'
+CREATED_AT_HEADER = '创建时间'
+ENTRY_HEADERS = {
+    '省份': 'province',
+    '项目名称': 'project_name',
+    '日期': 'date',
+    '地点': 'location',
+    '涉及人员': 'personnel',
+    '性质': 'nature',
+    '具体事项': 'specific_matters',
+    '后续要点': 'follow_up_points',
+}
+REQUIRED_HEADERS = [header for header, field in ENTRY_HEADERS.items() if field != 'follow_up_points']
+
+# 文件扩展名 -> 导入格式
+IMPORT_FORMATS = {'.csv': 'csv', '.xlsx': 'excel'}
+
+# 每个事务插入的行数
+IMPORT_CHUNK_SIZE = 2000
+
+ImportRowError = namedtuple('ImportRowError', ['row', 'message'])
+ImportResult = namedtuple('ImportResult', ['total', 'imported', 'failed', 'errors'])
+
+
+class ImportFileError(Exception):
+    """导入文件无法读取（格式不支持、缺少必需列等）"""
+
+
+def detect_import_format(filename):
+    """根据文件名判断导入格式，不支持时返回 None"""
+    return IMPORT_FORMATS.get(os.path.splitext(filename or '')[1].lower())
+
+
+def _iter_csv(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text)
+    finally:
+        # 不随包装对象一起关闭调用方的文件
+        text.detach()
+
+
+def _iter_xlsx(fileobj):
+    from openpyxl import load_workbook
+
+    # read_only 模式按需解析工作表 XML，不在内存中保留整个工作簿
+    wb = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def iter_import_rows(fileobj, import_format):
+    """逐行读取导入文件（二进制文件对象），生成 (行号, {表头: 单元格值})，跳过空行"""
+    rows = _iter_xlsx(fileobj) if import_format == 'excel' else _iter_csv(fileobj)
+    try:
+        header = next(rows, None)
+    except Exception as e:
+        raise ImportFileError(f'Failed to read import file: {str(e)}')
+    if header is None:
+        raise ImportFileError('Import file is empty')
+    header = [str(h).strip() if h is not None else '' for h in header]
+    missing = [h for h in REQUIRED_HEADERS if h not in header]
+    if missing:
+        raise ImportFileError(f'Missing columns: {", ".join(missing)}')
+    for line, row in enumerate(rows, start=2):
+        if any(value not in (None, '') for value in row):
+            yield line, dict(zip(header, row))
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        # Excel 日期单元格读出为零点的 datetime
+        if value.time() == datetime.min.time():
+            return value.strftime('%Y-%m-%d')
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    return str(value).strip()
+
+
+def _parse_created_at(value):
+    if value in (None, ''):
+        return None, None
+    if isinstance(value, datetime):
+        return value, None
+    text = _cell_text(value)
+    try:
+        # 比 strptime 快得多，导出文件中的 YYYY-MM-DD HH:MM:SS 与 YYYY-MM-DD 均可解析
+        return datetime.fromisoformat(text), None
+    except ValueError:
+        return None, f'Invalid {CREATED_AT_HEADER} "{text}", use YYYY-MM-DD HH:MM:SS'
+
+
+class RecorderLookup:
+    """录入人员用户名 -> users.id 的缓存，每个用户名只查询一次数据库"""
+
+    def __init__(self, session):
+        self.session = session
+        self._ids = {}
+
+    def get(self, username):
+        if username not in self._ids:
+            self._ids[username] = self.session.execute(
+                select(User.id).where(User.username == username)
+            ).scalar()
+        return self._ids[username]
+
+
+def parse_import_row(values, recorders, default_user_id=None):
+    """按新建台账的规则校验导入行，返回 (插入参数, error)
+
+    录入人员为空时归属 default_user_id；创建时间为空时使用导入时间。
+    """
+    data = {field: _cell_text(values.get(header)) for header, field in ENTRY_HEADERS.items()}
+    params, error = parse_entry_fields(data)
+    if error:
+        return None, error
+    recorder = _cell_text(values.get(RECORDER_HEADER))
+    if recorder:
+        user_id = recorders.get(recorder)
+        if user_id is None:
+            return None, f'Unknown recorder "{recorder}"'
+    elif default_user_id is not None:
+        user_id = default_user_id
+    else:
+        return None, f'Field "{RECORDER_HEADER}" is required'
+    created_at, error = _parse_created_at(values.get(CREATED_AT_HEADER))
+    if error:
+        return None, error
+    now = datetime.utcnow()
+    params.update(user_id=int(user_id), created_at=created_at or now, updated_at=now)
+    return params, None
+
+
+def _insert_chunk(session, rows):
+    """在一个事务中插入一批台账，并同步全文索引、统计汇总等派生数据
+
+    RETURNING 直接取回变更快照需要的字段，无需按参数顺序对应主键，
+    SQLite 上可以多行合并为一条 INSERT 语句执行。
+    """
+    columns = [getattr(LedgerEntry, field) for field in LEDGER_FIELDS]
+    result = session.execute(insert(LedgerEntry).returning(*columns), rows)
+    changes = [LedgerChange('create', row.id, None, dict(row._mapping)) for row in result]
+    dispatch_ledger_changes(session, changes)
+    session.commit()
+
+
+def import_ledger(fileobj, import_format, default_user_id=None, chunk_size=IMPORT_CHUNK_SIZE,
+                  dry_run=False, on_error=None, max_errors=100):
+    """流式导入台账文件，返回 ImportResult
+
+    有效行每 chunk_size 行提交一次，内存占用与文件大小无关；无效行跳过，
+    逐条传给 on_error(ImportRowError)，结果中最多保留 max_errors 条。
+    dry_run 为 True 时只校验不写入。
+    """
+    session = db.session
+    recorders = RecorderLookup(session)
+    total = imported = failed = 0
+    errors = []
+    chunk = []
+    try:
+        for line, values in iter_import_rows(fileobj, import_format):
+            total += 1
+            params, error = parse_import_row(values, recorders, default_user_id)
+            if error:
+                failed += 1
+                row_error = ImportRowError(line, error)
+                if len(errors) < max_errors:
+                    errors.append(row_error)
+                if on_error is not None:
+                    on_error(row_error)
+                continue
+            chunk.append(params)
+            if len(chunk) >= chunk_size:
+                if not dry_run:
+                    _insert_chunk(session, chunk)
+                imported += len(chunk)
+                chunk = []
+        if chunk:
+            if not dry_run:
+                _insert_chunk(session, chunk)
+            imported += len(chunk)
+    except Exception:
+        session.rollback()
+        raise
+    return ImportResult(total, imported, failed, errors)
+
@@ -0,0 +1,112 @@
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.orm import contains_eager, joinedload
+
+from app.models import LedgerEntry, User
+
+
+def parse_ledger_filters(args):
+    """从请求参数中解析台账过滤条件，无效日期会被忽略"""
+    filters = {}
+    for field in ('project_name', 'location', 'province', 'recorder'):
+        value = (args.get(field) or '').strip()
+        if value:
+            filters[field] = value
+    for field in ('start_date', 'end_date'):
+        value = args.get(field)
+        if not value:
+            continue
+        try:
+            filters[field] = datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            pass
+    return filters
+
+
+# 创建台账时必填的字段
+ENTRY_REQUIRED_FIELDS = ['province', 'project_name', 'date', 'location',
+                         'personnel', 'nature', 'specific_matters']
+
+# 允许修改的字段
+ENTRY_UPDATE_FIELDS = ENTRY_REQUIRED_FIELDS + ['follow_up_points']
+
+
+def parse_entry_fields(data, partial=False):
+    """校验并转换台账字段，返回 (values, error)
+
+    partial 为 False 时（新建）检查必填字段；为 True 时（更新）只处理提交了的字段，
+    但提交了的必填字段同样不能为空，所有字段都必须是字符串。
+    """
+    if not isinstance(data, dict):
+        return None, 'Invalid request data'
+    for field in ENTRY_REQUIRED_FIELDS:
+        if partial and field not in data:
+            continue
+        value = data.get(field)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            return None, f'Field "{field}" is required'
+        if not isinstance(value, str):
+            return None, f'Field "{field}" must be a string'
+    if data.get('follow_up_points') is not None and not isinstance(data['follow_up_points'], str):
+        return None, 'Field "follow_up_points" must be a string'
+    values = {field: data[field] for field in ENTRY_UPDATE_FIELDS if field in data}
+    if 'date' in values:
+        try:
+            values['date'] = datetime.strptime(values['date'], '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            return None, 'Invalid date format, use YYYY-MM-DD'
+    if not partial:
+        values.setdefault('follow_up_points', '')
+    return values, None
+
+
+def apply_ledger_filters(query, filters, users_joined=False):
+    """将过滤条件应用到台账查询上（Query 与 Select 均可）
+
+    users_joined 为 True 表示查询已经 join 了 users 表。
+    """
+    if filters.get('project_name'):
+        query = query.filter(LedgerEntry.project_name.ilike(f"%{filters['project_name']}%"))
+    if filters.get('location'):
+        query = query.filter(LedgerEntry.location.ilike(f"%{filters['location']}%"))
+    if filters.get('province'):
+        query = query.filter(LedgerEntry.province == filters['province'])
+    if filters.get('recorder'):
+        # 需要join User表来过滤录入人员
+        if not users_joined:
+            query = query.join(User, User.id == LedgerEntry.user_id)
+        query = query.filter(User.username == filters['recorder'])
+    if filters.get('start_date'):
+        query = query.filter(LedgerEntry.date >= filters['start_date'])
+    if filters.get('end_date'):
+        query = query.filter(LedgerEntry.date <= filters['end_date'])
+    return query
+
+
+def load_author(query, filters=None):
+    """在同一条语句中加载录入人员，避免逐行查询 users 表"""
+    if filters and filters.get('recorder'):
+        # 按录入人员过滤时已经 join 了 users 表，直接复用
+        return query.options(contains_eager(LedgerEntry.author))
+    return query.options(joinedload(LedgerEntry.author, innerjoin=True))
+
+
+# 台账列表返回的字段，与 LedgerEntry.to_dict() 一致
+LEDGER_LIST_COLUMNS = (
+    LedgerEntry.id, LedgerEntry.user_id, LedgerEntry.province, LedgerEntry.project_name,
+    LedgerEntry.date, LedgerEntry.location, LedgerEntry.personnel, LedgerEntry.nature,
+    LedgerEntry.specific_matters, LedgerEntry.follow_up_points,
+    LedgerEntry.created_at, LedgerEntry.updated_at,
+)
+
+
+def ledger_list_select(filters):
+    """台账列表的列投影查询：只取需要的列并 join 录入人员，不构造 ORM 对象
+
+    结果行用 rows_to_dicts() 转换，日期时间由 JSON provider 输出为 ISO 8601。
+    """
+    stmt = select(*LEDGER_LIST_COLUMNS, User.username.label('recorder')).join(
+        User, User.id == LedgerEntry.user_id
+    )
+    return apply_ledger_filters(stmt, filters, users_joined=True)
@@ -0,0 +1,70 @@
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.models import db, Province
+from app.utils.data_version import bump_data_version, get_data_version
+from app.utils.http_cache import TTLCache, content_etag
+
+# 台账性质选项
+NATURE_OPTIONS = [
+    '会议纪要',
+    '工作安排',
+    '问题反馈',
+    '质量管理',
+    '临时任务',
+    '研讨交流',
+    '资料交接',
+    '人员对接',
+    '常规项目工作',
+    '其他'
+]
+NATURE_OPTIONS_ETAG = content_etag(NATURE_OPTIONS)
+
+PROVINCES_KEY = Province.__tablename__
+
+
+def get_lookup_cache():
+    """当前应用的下拉选项缓存"""
+    cache = current_app.extensions.get('lookup_cache')
+    if cache is None:
+        cache = current_app.extensions['lookup_cache'] = TTLCache(
+            current_app.config.get('LOOKUP_CACHE_TTL_SECONDS', 300)
+        )
+    return cache
+
+
+def _load_provinces():
+    names = db.session.execute(select(Province.name).order_by(Province.name)).scalars().all()
+    if not names:
+        # 数据库中没有省份数据时使用默认列表（由 init_database 写入，这里不写库）
+        names = list(current_app.config.get('PROVINCES', []))
+    version = get_data_version(PROVINCES_KEY)
+    return content_etag({'version': version, 'data': names}), names
+
+
+def get_province_list():
+    """返回 (etag, 省份列表)；缓存在进程内，省份变更提交后失效，其他进程最迟 TTL 后更新"""
+    return get_lookup_cache().get_or_load(PROVINCES_KEY, _load_provinces)
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_province_version(session, flush_context):
+    changed = any(
+        isinstance(obj, Province)
+        for obj in (*session.new, *session.dirty, *session.deleted)
+    )
+    if changed:
+        bump_data_version(session.connection(), PROVINCES_KEY)
+        session.info['provinces_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_provinces(session):
+    if session.info.pop('provinces_changed', False) and has_app_context():
+        get_lookup_cache().invalidate(PROVINCES_KEY)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_province_changes(session):
+    session.info.pop('provinces_changed', None)
@@ -0,0 +1,444 @@
+import atexit
+import hmac
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+
+# 请求耗时分桶（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# 响应体大小分桶（字节）
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+# 单个请求执行的 SQL 语句数分桶
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# 单条 SQL 语句耗时分桶（秒）
+QUERY_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+METRICS_MIMETYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 未匹配到路由的请求（404 等）统一记为该端点，避免任意 URL 产生大量标签
+UNMATCHED_ENDPOINT = 'unmatched'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if value == float('inf'):
+            return '+Inf'
+        return repr(value)
+    return str(value)
+
+
+class _Metric:
+    type_name = None
+    # 已退出的 worker 进程的数值是否仍计入合计：累计值保留，当前值丢弃
+    cumulative = True
+
+    def __init__(self, lock, name, documentation, labelnames=()):
+        self._lock = lock
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def values(self):
+        """当前各标签组合数值的副本"""
+        with self._lock:
+            return {labels: list(value) if isinstance(value, list) else value
+                    for labels, value in self._values.items()}
+
+    def merge(self, values, samples):
+        """把其他进程的样本 [(labels, value)] 累加到 values 中"""
+        for labels, value in samples:
+            labels = tuple(labels)
+            current = values.get(labels)
+            values[labels] = value if current is None else self._add(current, value)
+
+    def _add(self, a, b):
+        return a + b
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        if values is None:
+            values = self.values()
+        lines.extend(self._render_samples(sorted(values.items())))
+        return lines
+
+    def _render_samples(self, items):
+        return [f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+                for labels, value in items]
+
+
+class Counter(_Metric):
+    """只增不减的计数"""
+    type_name = 'counter'
+
+    def inc(self, amount=1, labels=()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """可增可减的当前值"""
+    type_name = 'gauge'
+    cumulative = False
+
+    def inc(self, amount=1, labels=()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, amount=1, labels=()):
+        self.inc(-amount, labels)
+
+    def set(self, value, labels=()):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """分桶计数；每个标签组合保存各桶计数、总和与总数"""
+    type_name = 'histogram'
+
+    def __init__(self, lock, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(lock, name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # [各桶计数..., +Inf 桶计数, 总和]
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def _add(self, a, b):
+        return [x + y for x, y in zip(a, b)]
+
+    def _render_samples(self, items):
+        lines = []
+        for labels, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), state):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, [('le', _format_value(float(bound)))])
+                lines.append(f'{self.name}_bucket{le} {cumulative}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {_format_value(state[-1])}')
+            lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+class Metrics:
+    """应用的运行指标（进程内统计，Prometheus 文本格式输出）
+
+    所有指标共用一把锁，每次记录只做字典查找和加法，开销远小于一次数据库查询。
+    gunicorn 多 worker 时由 MetricsFiles 汇总各 worker 的数据。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+        request_labels = ('endpoint', 'method', 'status')
+        self.request_duration = self._add(Histogram(
+            self._lock, 'http_request_duration_seconds', 'HTTP request latency in seconds.',
+            request_labels, LATENCY_BUCKETS))
+        self.response_size = self._add(Histogram(
+            self._lock, 'http_response_size_bytes', 'HTTP response body size in bytes.',
+            request_labels, SIZE_BUCKETS))
+        self.in_flight = self._add(Gauge(
+            self._lock, 'http_requests_in_flight', 'HTTP requests currently being processed.'))
+        self.request_queries = self._add(Histogram(
+            self._lock, 'http_request_db_queries', 'SQL statements executed per HTTP request.',
+            ('endpoint',), QUERY_COUNT_BUCKETS))
+        self.request_db_seconds = self._add(Histogram(
+            self._lock, 'http_request_db_seconds', 'Time spent executing SQL per HTTP request in seconds.',
+            ('endpoint',), LATENCY_BUCKETS))
+        self.query_duration = self._add(Histogram(
+            self._lock, 'db_query_duration_seconds', 'SQL statement execution time in seconds.',
+            (), QUERY_LATENCY_BUCKETS))
+        self.export_rows = self._add(Counter(
+            self._lock, 'export_rows_total', 'Rows written to export files.', ('dataset', 'format')))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def snapshot(self):
+        """各指标数值的快照，可 JSON 序列化"""
+        return {
+            metric.name: [[list(labels), value] for labels, value in metric.values().items()]
+            for metric in self._metrics
+        }
+
+    def render(self, others=()):
+        """输出文本格式；others 为其他 worker 进程的 [(快照, 进程是否存活)]，与本进程数值合并"""
+        lines = []
+        for metric in self._metrics:
+            values = metric.values()
+            for snapshot, alive in others:
+                if alive or metric.cumulative:
+                    metric.merge(values, snapshot.get(metric.name, ()))
+            lines.extend(metric.render(values))
+        return '\n'.join(lines) + '\n'
+
+
+def _process_alive(pid):
+    if os.name == 'nt':
+        # Windows 上 os.kill(pid, 0) 会发送控制台中断，不做检测
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsFiles:
+    """多个 worker 进程共享指标
+
+    每个 worker 定期把本进程的累计值写入目录下的 <父进程 pid>-<pid>.json，抓取 /metrics 时合并同一父进程
+    （gunicorn master）下其他 worker 的文件，无论请求落到哪个 worker 数值都一致且单调递增。
+    已退出 worker 的累计值继续计入，当前值（并发请求数）丢弃；父进程已退出的旧文件在抓取时删除。
+    """
+
+    def __init__(self, directory, flush_seconds):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _path(self):
+        return os.path.join(self.directory, f'{os.getppid()}-{os.getpid()}.json')
+
+    def write(self, metrics):
+        """写入本进程的快照（先写临时文件再替换，读取方不会读到写了一半的文件）"""
+        path = self._path()
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(metrics.snapshot(), f)
+        os.replace(temp_path, path)
+
+    def start(self, metrics):
+        """在当前进程启动定期写入线程；gunicorn fork 出的每个 worker 在首次处理请求时各启动一次"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+
+        def flush():
+            try:
+                self.write(metrics)
+            except OSError as e:
+                logging.getLogger(__name__).warning(f'Failed to write metrics snapshot: {e}')
+
+        def run():
+            while True:
+                time.sleep(self.flush_seconds)
+                flush()
+
+        threading.Thread(target=run, name='metrics-flush', daemon=True).start()
+        atexit.register(flush)
+
+    def read_others(self):
+        """读取同一父进程下其他 worker 的快照，返回 [(快照, 进程是否存活)]"""
+        ppid, pid = os.getppid(), os.getpid()
+        others = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                owner, worker = (int(part) for part in name[:-len('.json')].split('-'))
+            except ValueError:
+                continue
+            path = os.path.join(self.directory, name)
+            if owner != ppid:
+                # 服务重启前留下的文件不计入，父进程已退出时删除
+                if not _process_alive(owner):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                continue
+            if worker == pid:
+                continue
+            try:
+                with open(path, encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            others.append((snapshot, _process_alive(worker)))
+        return others
+
+
+def get_metrics(app=None):
+    """获取应用的指标对象，未启用时返回 None"""
+    return (app or current_app).extensions.get('metrics')
+
+
+def count_export_rows(rows, dataset, export_format):
+    """包装导出行迭代器，迭代结束（或中途关闭）时累计导出行数"""
+    metrics = get_metrics()
+    if metrics is None:
+        return rows
+
+    def counted():
+        count = 0
+        try:
+            for row in rows:
+                count += 1
+                yield row
+        finally:
+            metrics.export_rows.inc(count, (dataset, export_format))
+
+    return counted()
+
+
+class _RequestStats:
+    """单个请求的计时和 SQL 统计；流式响应结束前由响应体保留引用"""
+
+    __slots__ = ('start', 'queries', 'db_seconds', 'finished')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.finished = False
+
+
+class _MeteredBody:
+    """流式响应体：统计输出字节数，响应结束（包括客户端断开）时记录耗时和大小"""
+
+    def __init__(self, chunks, on_close):
+        self._chunks = chunks
+        self._on_close = on_close
+        self.size = 0
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            self.size += len(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            if hasattr(self._chunks, 'close'):
+                self._chunks.close()
+        finally:
+            on_close, self._on_close = self._on_close, None
+            if on_close is not None:
+                on_close(self.size)
+
+
+def _instrument_engine(metrics, engine):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _end_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()
+        metrics.query_duration.observe(elapsed)
+        stats = g.get('metrics_request') if has_request_context() else None
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+
+    @event.listens_for(engine, 'handle_error')
+    def _failed_query(exception_context):
+        # 执行失败时不会触发 after_cursor_execute，丢弃对应的开始时间
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('metrics_query_start'):
+            conn.info['metrics_query_start'].pop()
+
+
+def init_metrics(app, db):
+    """记录请求耗时、响应大小、并发请求数和每个请求的 SQL 次数与耗时，并注册 /metrics
+
+    需在响应压缩之前注册：after_request 按注册的逆序执行，这样记录的是压缩后的大小。
+    METRICS_MULTIPROCESS 开启时各 worker 通过 METRICS_MULTIPROCESS_DIR 中的文件汇总。
+    """
+    config = app.config
+    metrics = app.extensions['metrics'] = Metrics()
+    with app.app_context():
+        _instrument_engine(metrics, db.engine)
+    read_engine = app.extensions.get('read_engine')
+    if read_engine is not None:
+        _instrument_engine(metrics, read_engine)
+    files = None
+    if config.get('METRICS_MULTIPROCESS'):
+        directory = config.get('METRICS_MULTIPROCESS_DIR') or os.path.join(tempfile.gettempdir(), 'ledger-metrics')
+        files = app.extensions['metrics_files'] = MetricsFiles(directory, config['METRICS_FLUSH_SECONDS'])
+
+    def record(stats, endpoint, labels, size):
+        metrics.request_queries.observe(stats.queries, (endpoint,))
+        metrics.request_db_seconds.observe(stats.db_seconds, (endpoint,))
+        metrics.request_duration.observe(time.perf_counter() - stats.start, labels)
+        if size is not None:
+            metrics.response_size.observe(size, labels)
+        metrics.in_flight.dec()
+
+    @app.before_request
+    def _start_request():
+        if files is not None:
+            files.start(metrics)
+        metrics.in_flight.inc()
+        g.metrics_request = _RequestStats()
+
+    @app.after_request
+    def _record_request(response):
+        stats = g.get('metrics_request')
+        if stats is None or stats.finished:
+            return response
+        stats.finished = True
+        endpoint = request.endpoint or UNMATCHED_ENDPOINT
+        labels = (endpoint, request.method, str(response.status_code))
+        if response.is_streamed and response.content_length is None:
+            # 生成器响应（如流式导出）：主要的查询在输出响应体时执行，耗时、大小和 SQL 统计都在输出完毕时记录
+            response.response = _MeteredBody(
+                response.response, lambda size: record(stats, endpoint, labels, size))
+            response.direct_passthrough = False
+        else:
+            record(stats, endpoint, labels, response.content_length)
+        return response
+
+    @app.teardown_request
+    def _abort_request(exc):
+        # 异常导致 after_request 未执行时也要减少并发计数（测试客户端保留的请求上下文可能晚于应用上下文弹出）
+        stats = g.get('metrics_request') if has_app_context() else None
+        if stats is not None and not stats.finished:
+            stats.finished = True
+            metrics.in_flight.dec()
+
+    token = config.get('METRICS_TOKEN')
+
+    def metrics_view():
+        if token:
+            supplied = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+                return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        others = files.read_others() if files is not None else ()
+        return Response(metrics.render(others), content_type=METRICS_MIMETYPE)
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view, methods=['GET'])
+    return metrics
@@ -0,0 +1,101 @@
+from collections import namedtuple
+
+from sqlalchemy import inspect, insert, select, text, update
+
+from app.models import db, DataVersion, LedgerEntry, ActivityLog, RefreshToken
+from app.utils.rollups import repair_entry_counts
+
+# 当前库结构版本记录在 data_versions 表的该行中
+SCHEMA_VERSION_KEY = 'schema'
+
+Migration = namedtuple('Migration', ['version', 'description', 'upgrade'])
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """注册结构迁移 upgrade(conn)；迁移需可重复执行（新库由 create_all 建好后同样会运行）"""
+    def decorator(fn):
+        MIGRATIONS.append(Migration(version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return fn
+    return decorator
+
+
+def _get_index(table, name):
+    return next(index for index in table.indexes if index.name == name)
+
+
+@migration(1, 'add users.entry_count')
+def _add_user_entry_count(conn):
+    columns = {column['name'] for column in inspect(conn).get_columns('users')}
+    if 'entry_count' not in columns:
+        conn.execute(text('ALTER TABLE users ADD COLUMN entry_count INTEGER NOT NULL DEFAULT 0'))
+        repair_entry_counts(conn)
+
+
+@migration(2, 'add indexes for ledger and activity log queries')
+def _add_query_indexes(conn):
+    indexes = [
+        _get_index(LedgerEntry.__table__, 'ix_ledger_entries_date'),
+        _get_index(LedgerEntry.__table__, 'ix_ledger_entries_nature'),
+        _get_index(LedgerEntry.__table__, 'ix_ledger_entries_province_created_at'),
+        _get_index(LedgerEntry.__table__, 'ix_ledger_entries_user_id_created_at'),
+        _get_index(ActivityLog.__table__, 'ix_activity_logs_user_id_timestamp'),
+        _get_index(ActivityLog.__table__, 'ix_activity_logs_level_timestamp'),
+    ]
+    for index in indexes:
+        index.create(conn, checkfirst=True)
+    if conn.dialect.name == 'sqlite':
+        # 更新统计信息，让查询规划器使用新索引
+        conn.exec_driver_sql('ANALYZE')
+
+
+@migration(3, 'add users.token_generation')
+def _add_user_token_generation(conn):
+    columns = {column['name'] for column in inspect(conn).get_columns('users')}
+    if 'token_generation' not in columns:
+        conn.execute(text('ALTER TABLE users ADD COLUMN token_generation INTEGER NOT NULL DEFAULT 0'))
+
+
+@migration(4, 'add refresh_tokens table')
+def _add_refresh_tokens(conn):
+    RefreshToken.__table__.create(conn, checkfirst=True)
+
+
+@migration(5, 'add refresh_tokens.rotated_at')
+def _add_refresh_token_rotated_at(conn):
+    columns = {column['name'] for column in inspect(conn).get_columns('refresh_tokens')}
+    if 'rotated_at' not in columns:
+        conn.execute(text('ALTER TABLE refresh_tokens ADD COLUMN rotated_at DATETIME'))
+
+
+def get_schema_version(conn):
+    version = conn.execute(
+        select(DataVersion.version).where(DataVersion.name == SCHEMA_VERSION_KEY)
+    ).scalar()
+    return version or 0
+
+
+def _set_schema_version(conn, version):
+    result = conn.execute(
+        update(DataVersion).where(DataVersion.name == SCHEMA_VERSION_KEY).values(version=version)
+    )
+    if result.rowcount == 0:
+        conn.execute(insert(DataVersion).values(name=SCHEMA_VERSION_KEY, version=version))
+
+
+def run_migrations(app):
+    """依次执行未应用的迁移，每个迁移与版本号更新在同一事务中，返回已执行的迁移"""
+    with db.engine.connect() as conn:
+        current = get_schema_version(conn)
+    applied = []
+    for item in MIGRATIONS:
+        if item.version <= current:
+            continue
+        with db.engine.begin() as conn:
+            item.upgrade(conn)
+            _set_schema_version(conn, item.version)
+        app.logger.info(f'Applied migration {item.version}: {item.description}')
+        applied.append(item)
+    return applied
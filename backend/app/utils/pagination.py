@@ -0,0 +1,112 @@
+import base64
+import json
+from datetime import datetime
+
+from collections import namedtuple
+
+from sqlalchemy import and_, func, or_, select
+
+# 游标方向：next 向后翻页（更早的记录），prev 向前翻页（更新的记录）
+CURSOR_NEXT = 'n'
+CURSOR_PREV = 'p'
+
+
+class CursorError(ValueError):
+    """无效的分页游标"""
+
+
+def encode_cursor(created_at, item_id, direction=CURSOR_NEXT):
+    """将 (created_at, id) 编码为不透明的游标字符串"""
+    payload = json.dumps(
+        [created_at.isoformat() if created_at else None, item_id, direction],
+        separators=(',', ':')
+    )
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """解码游标，返回 (created_at, id, direction)；空游标返回 None"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        created_at, item_id, direction = json.loads(base64.urlsafe_b64decode(padded))
+        if direction not in (CURSOR_NEXT, CURSOR_PREV):
+            raise ValueError(direction)
+        return datetime.fromisoformat(created_at), int(item_id), direction
+    except (ValueError, TypeError) as e:
+        raise CursorError(f'Invalid cursor: {token}') from e
+
+
+def keyset_filter(created_col, id_col, created_at, item_id, direction):
+    """构造 (created_at, id) 上的 keyset 条件，排序方向为 created_at DESC, id DESC"""
+    if direction == CURSOR_PREV:
+        return or_(
+            created_col > created_at,
+            and_(created_col == created_at, id_col > item_id)
+        )
+    return or_(
+        created_col < created_at,
+        and_(created_col == created_at, id_col < item_id)
+    )
+
+
+def keyset_paginate(query, created_col, id_col, cursor_token, page_size, fetch=None):
+    """按 (created_at DESC, id DESC) 执行游标分页
+
+    返回 (items, next_cursor, prev_cursor)。每页只取 page_size + 1 行，
+    不使用 OFFSET，因此任意深度的页面代价与第一页相同。
+    query 为 Core Select 时需传入 fetch(stmt) 执行查询并返回行列表。
+    """
+    cursor = decode_cursor(cursor_token)
+    direction = cursor[2] if cursor else CURSOR_NEXT
+
+    if cursor:
+        query = query.filter(keyset_filter(created_col, id_col, *cursor))
+    if direction == CURSOR_PREV:
+        query = query.order_by(created_col.asc(), id_col.asc())
+    else:
+        query = query.order_by(created_col.desc(), id_col.desc())
+
+    query = query.limit(page_size + 1)
+    rows = list(fetch(query)) if fetch is not None else query.all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if direction == CURSOR_PREV:
+        rows.reverse()
+
+    if not rows:
+        return rows, None, None
+
+    first, last = rows[0], rows[-1]
+    if direction == CURSOR_PREV:
+        next_cursor = encode_cursor(last.created_at, last.id, CURSOR_NEXT)
+        prev_cursor = encode_cursor(first.created_at, first.id, CURSOR_PREV) if has_more else None
+    else:
+        next_cursor = encode_cursor(last.created_at, last.id, CURSOR_NEXT) if has_more else None
+        prev_cursor = encode_cursor(first.created_at, first.id, CURSOR_PREV) if cursor else None
+    return rows, next_cursor, prev_cursor
+
+
+# items 为行元组；字段含义与 Flask-SQLAlchemy 的 Pagination 相同
+SelectPage = namedtuple('SelectPage', ['items', 'total', 'page', 'per_page', 'pages'])
+
+
+def paginate_select(session, stmt, page, per_page):
+    """对 Core Select 做 LIMIT/OFFSET 分页，返回 SelectPage（页码小于 1 时按第 1 页处理）"""
+    page = max(page, 1)
+    per_page = max(per_page, 1)
+    total = session.execute(
+        select(func.count()).select_from(stmt.order_by(None).subquery())
+    ).scalar()
+    items = session.execute(stmt.limit(per_page).offset((page - 1) * per_page)).all()
+    pages = (total + per_page - 1) // per_page
+    return SelectPage(items, total, page, per_page, pages)
+
+
+def rows_to_dicts(rows):
+    """将 Core 查询结果行转换为字典列表（字段名只取一次，比逐行 _asdict() 快）"""
+    if not rows:
+        return []
+    keys = rows[0]._fields
+    return [dict(zip(keys, row)) for row in rows]
@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+try:
+    import fcntl
+except ImportError:  # Windows 上没有 fcntl，只限制进程内的并发
+    fcntl = None
+
+_pool_lock = threading.Lock()
+
+# 等待主机名额时的轮询间隔（秒）
+SLOT_POLL_SECONDS = 0.01
+
+
+class HashPoolBusy(Exception):
+    """等待中的密码哈希任务过多"""
+
+
+class HostSlots:
+    """同一主机上所有进程共享的哈希并发上限
+
+    每个名额对应一个文件，用非阻塞的 flock 占用；进程退出时锁自动释放。
+    flock 按打开的文件生效，同一进程内的线程另用线程锁区分。
+    """
+
+    def __init__(self, directory, count):
+        os.makedirs(directory, exist_ok=True)
+        self._slots = [
+            (threading.Lock(), os.open(os.path.join(directory, f'slot-{i}.lock'), os.O_RDWR | os.O_CREAT, 0o600))
+            for i in range(count)
+        ]
+
+    def try_acquire(self):
+        """占用一个空闲名额并返回，没有空闲名额时立即返回 None"""
+        for slot in self._slots:
+            lock, fd = slot
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return slot
+            except BlockingIOError:
+                lock.release()
+        return None
+
+    def acquire(self, timeout):
+        """等待空闲名额，最多等待 timeout 秒，超时返回 None"""
+        deadline = time.monotonic() + timeout
+        while True:
+            slot = self.try_acquire()
+            if slot is not None or time.monotonic() >= deadline:
+                return slot
+            time.sleep(SLOT_POLL_SECONDS)
+
+    def release(self, slot):
+        lock, fd = slot
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        lock.release()
+
+
+class HashPool:
+    """密码哈希线程池
+
+    hashlib 的 pbkdf2/scrypt 计算时释放 GIL，限制同时计算的数量即可限制登录高峰占用的 CPU，
+    其余请求线程仍可调度；登录高峰时请求最多排队 wait_seconds，仍未轮到才拒绝，而不是让请求无限堆积。
+    线程池只能限制本进程（gthread 等多线程 worker）；gunicorn sync worker 每个进程同时只处理一个请求，
+    由 host_slots 限制整台主机同时计算的哈希数，排队时间计入同一个 wait_seconds。
+    """
+
+    def __init__(self, workers, max_pending, wait_seconds, host_slots=None):
+        self.wait_seconds = wait_seconds
+        self.pid = os.getpid()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._host_slots = host_slots
+
+    def run(self, fn, *args):
+        deadline = time.monotonic() + self.wait_seconds
+        if not self._slots.acquire(timeout=self.wait_seconds):
+            raise HashPoolBusy()
+        try:
+            if self._host_slots is None:
+                return self._executor.submit(fn, *args).result()
+            host_slot = self._host_slots.acquire(max(deadline - time.monotonic(), 0))
+            if host_slot is None:
+                raise HashPoolBusy()
+            try:
+                return self._executor.submit(fn, *args).result()
+            finally:
+                self._host_slots.release(host_slot)
+        finally:
+            self._slots.release()
+
+
+def get_hash_pool():
+    """获取当前应用在本进程的哈希线程池（gunicorn fork 后在各 worker 中重新创建）"""
+    with _pool_lock:
+        pool = current_app.extensions.get('hash_pool')
+        if pool is None or pool.pid != os.getpid():
+            config = current_app.config
+            host_slots = None
+            if config['PASSWORD_HASH_HOST_SLOTS'] and fcntl is not None:
+                slot_dir = config['PASSWORD_HASH_SLOT_DIR'] or os.path.join(current_app.instance_path, 'hash_slots')
+                host_slots = HostSlots(slot_dir, config['PASSWORD_HASH_HOST_SLOTS'])
+            pool = current_app.extensions['hash_pool'] = HashPool(
+                config['PASSWORD_HASH_WORKERS'],
+                config['PASSWORD_HASH_MAX_PENDING'],
+                config['PASSWORD_HASH_WAIT_SECONDS'],
+                host_slots
+            )
+        return pool
+
+
+def hash_password(password):
+    """按 PASSWORD_HASH_METHOD 生成密码哈希"""
+    return generate_password_hash(password, method=current_app.config['PASSWORD_HASH_METHOD'])
+
+
+@lru_cache(maxsize=8)
+def _method_prefix(method):
+    # 'pbkdf2:sha256' 等省略参数的写法由 werkzeug 补全默认值，生成一次哈希取得完整前缀
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+def needs_rehash(pwhash):
+    """已有哈希的算法或参数与当前配置不同时返回 True"""
+    return pwhash.split('$', 1)[0] != _method_prefix(current_app.config['PASSWORD_HASH_METHOD'])
+
+
+def _check_and_rehash(pwhash, password, rehash_method):
+    """校验密码，成功且 rehash_method 不为空时一并生成新哈希，返回 (是否正确, 新哈希)"""
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if rehash_method:
+        return True, generate_password_hash(password, method=rehash_method)
+    return True, None
+
+
+def verify_password(user, password):
+    """在哈希线程池中校验密码；成功且哈希参数过期时按当前配置重新生成（调用方负责提交）
+
+    校验和重新生成在同一个任务中完成，密码已校验通过的登录不会再因排队而被拒绝。
+    """
+    # 线程池中没有应用上下文，显式传入哈希方法
+    rehash_method = current_app.config['PASSWORD_HASH_METHOD'] if needs_rehash(user.password_hash) else None
+    valid, new_hash = get_hash_pool().run(_check_and_rehash, user.password_hash, password, rehash_method)
+    if new_hash:
+        user.password_hash = new_hash
+    return valid
@@ -0,0 +1,114 @@
+import time
+import uuid
+from datetime import datetime
+
+from flask import current_app
+from flask_jwt_extended import create_access_token, create_refresh_token, decode_token
+from sqlalchemy import delete, select, update
+
+from app.models import db, RefreshToken
+
+# rotate_refresh_token 的结果
+ROTATED = 'rotated'
+REVOKED = 'revoked'
+REUSED = 'reused'
+
+
+def create_user_access_token(user):
+    """签发访问令牌；gen 与用户的 token_generation 不一致时令牌视为已撤销"""
+    return create_access_token(
+        identity=str(user.id),
+        additional_claims={'role': user.role, 'username': user.username, 'gen': user.token_generation}
+    )
+
+
+def issue_tokens(user, family=None):
+    """签发访问令牌和刷新令牌，刷新令牌记录在当前事务中写入（调用方负责提交）"""
+    access_token = create_user_access_token(user)
+    refresh_token = create_refresh_token(identity=str(user.id), additional_claims={'gen': user.token_generation})
+    payload = decode_token(refresh_token)
+    db.session.add(RefreshToken(
+        jti=payload['jti'],
+        family=family or uuid.uuid4().hex,
+        user_id=user.id,
+        expires_at=datetime.utcfromtimestamp(payload['exp'])
+    ))
+    return access_token, refresh_token
+
+
+def rotate_refresh_token(jti):
+    """作废刷新令牌，返回 (结果, 令牌记录)
+
+    ROTATED：令牌有效，已作废，调用方应在同一 family 中签发新令牌；
+    REVOKED：令牌不存在、已过期，或因退出登录、盗用检测被撤销；
+    REUSED：已轮换的令牌被再次使用（可能被盗用），整个 family 已撤销。
+    """
+    now = datetime.utcnow()
+    token = RefreshToken.query.filter_by(jti=jti).first()
+    if token is None or token.expires_at < now:
+        return REVOKED, token
+    # 条件更新保证同一令牌只能被轮换一次
+    rotated = db.session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == token.id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now, rotated_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if rotated:
+        return ROTATED, token
+    db.session.refresh(token)
+    if token.rotated_at is None:
+        # 退出登录或整个 family 被撤销，始终拒绝
+        return REVOKED, token
+    grace = current_app.config['REFRESH_TOKEN_REUSE_GRACE_SECONDS']
+    if (now - token.rotated_at).total_seconds() <= grace and _family_active(token.family):
+        # 多个页面同时用同一个令牌刷新
+        return ROTATED, token
+    revoke_family(token.family)
+    return REUSED, token
+
+
+def _family_active(family):
+    """family 中仍有未作废的令牌（未退出登录、未检测到盗用）"""
+    return db.session.execute(
+        select(RefreshToken.id)
+        .where(RefreshToken.family == family, RefreshToken.revoked_at.is_(None))
+        .limit(1)
+    ).first() is not None
+
+
+def revoke_family(family):
+    """撤销同一次登录派生出的所有刷新令牌"""
+    db.session.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family == family, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def prune_refresh_tokens():
+    """删除已过期的刷新令牌记录，返回删除的数量"""
+    result = db.session.execute(
+        delete(RefreshToken)
+        .where(RefreshToken.expires_at < datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount
+
+
+def maybe_prune_refresh_tokens():
+    """距上次清理超过 REFRESH_TOKEN_PRUNE_INTERVAL_SECONDS 时清理过期记录（按进程计时）"""
+    interval = current_app.config['REFRESH_TOKEN_PRUNE_INTERVAL_SECONDS']
+    now = time.monotonic()
+    last = current_app.extensions.get('refresh_tokens_pruned_at')
+    if last is not None and now - last < interval:
+        return 0
+    current_app.extensions['refresh_tokens_pruned_at'] = now
+    try:
+        return prune_refresh_tokens()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Failed to prune refresh tokens: {str(e)}')
+        return 0
@@ -0,0 +1,127 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select, update
+
+from app.models import (
+    db, User, LedgerEntry, LedgerDailyUserStat, LedgerDailyProvinceStat, LedgerDailyNatureStat
+)
+from app.utils.ledger_events import on_ledger_flush
+
+# 汇总表 -> (维度字段, 台账字段)
+ROLLUPS = (
+    (LedgerDailyUserStat, 'user_id'),
+    (LedgerDailyProvinceStat, 'province'),
+    (LedgerDailyNatureStat, 'nature'),
+)
+
+
+def _entry_day(values):
+    created_at = values.get('created_at') or datetime.utcnow()
+    return created_at.date()
+
+
+def rollup_deltas(changes):
+    """将台账变更折算为各汇总表的计数增量 {model: Counter{(day, key): delta}}"""
+    deltas = {model: Counter() for model, _ in ROLLUPS}
+    for change in changes:
+        for values, sign in ((change.old, -1), (change.new, 1)):
+            if not values:
+                continue
+            day = _entry_day(values)
+            for model, field in ROLLUPS:
+                key = values[field]
+                if field == 'user_id':
+                    key = int(key)
+                deltas[model][(day, key)] += sign
+    return deltas
+
+
+def apply_rollup_deltas(conn, deltas):
+    """在当前事务中更新汇总表"""
+    for model, field in ROLLUPS:
+        key_column = getattr(model, field)
+        for (day, key), delta in deltas[model].items():
+            if not delta:
+                continue
+            result = conn.execute(
+                update(model)
+                .where(model.day == day, key_column == key)
+                .values(count=model.count + delta)
+            )
+            if result.rowcount == 0:
+                conn.execute(insert(model).values({'day': day, field: key, 'count': delta}))
+
+
+def rebuild_rollups():
+    """根据台账表重新生成全部汇总数据，返回台账总数"""
+    day = func.date(LedgerEntry.created_at)
+    with db.engine.begin() as conn:
+        for model, field in ROLLUPS:
+            source = getattr(LedgerEntry, field)
+            conn.execute(delete(model))
+            conn.execute(
+                insert(model).from_select(
+                    ['day', field, 'count'],
+                    select(day, source, func.count()).group_by(day, source)
+                )
+            )
+        return conn.execute(select(func.count()).select_from(LedgerEntry)).scalar()
+
+
+def entry_count_deltas(changes):
+    """将台账变更折算为各用户台账数量的增量 Counter{user_id: delta}"""
+    deltas = Counter()
+    for change in changes:
+        if change.old:
+            deltas[int(change.old['user_id'])] -= 1
+        if change.new:
+            deltas[int(change.new['user_id'])] += 1
+    return deltas
+
+
+def apply_entry_count_deltas(conn, deltas):
+    """在当前事务中更新 users.entry_count"""
+    for user_id, delta in deltas.items():
+        if delta:
+            conn.execute(
+                update(User).where(User.id == user_id).values(entry_count=User.entry_count + delta)
+            )
+
+
+def repair_entry_counts(conn=None):
+    """根据台账表重新计算所有用户的 entry_count，返回被修正的用户数
+
+    传入 conn 时在该连接的事务中执行，否则单独开启事务。
+    """
+    actual = (
+        select(func.count(LedgerEntry.id))
+        .where(LedgerEntry.user_id == User.id)
+        .scalar_subquery()
+    )
+    stmt = update(User).where(User.entry_count != actual).values(entry_count=actual)
+    if conn is not None:
+        return conn.execute(stmt).rowcount
+    with db.engine.begin() as conn:
+        return conn.execute(stmt).rowcount
+
+
+def init_rollups(app):
+    """汇总表为空而台账表有数据时（如升级后首次启动）自动回填"""
+    has_rollups = db.session.execute(select(LedgerDailyProvinceStat.day).limit(1)).first()
+    has_entries = db.session.execute(select(LedgerEntry.id).limit(1)).first()
+    if has_entries and not has_rollups:
+        count = rebuild_rollups()
+        app.logger.info(f'Statistics rollups backfilled from {count} entries')
+
+
+def rollup_start_day(days):
+    """包括今天在内最近 days 天的起始日期（汇总表按 UTC 日期统计，起始日当天全部计入）"""
+    return (datetime.utcnow() - timedelta(days=max(days, 1) - 1)).date()
+
+
+@on_ledger_flush
+def _update_rollups(session, changes):
+    conn = session.connection()
+    apply_rollup_deltas(conn, rollup_deltas(changes))
+    apply_entry_count_deltas(conn, entry_count_deltas(changes))
@@ -0,0 +1,187 @@
+import re
+
+from flask import current_app, has_app_context
+from sqlalchemy import DDL, Integer, column, event, false, func, literal_column, or_, select, table, text
+
+from app.models import db, LedgerEntry
+from app.utils.ledger_events import on_ledger_flush
+
+# 全文索引覆盖的字段及其 bm25 权重
+SEARCH_FIELDS = ('project_name', 'location', 'specific_matters')
+SEARCH_WEIGHTS = (10.0, 5.0, 1.0)
+
+ledger_fts = table(
+    'ledger_fts',
+    column('rowid', Integer),
+    *(column(field) for field in SEARCH_FIELDS)
+)
+
+# 中日韩文字连续片段 / 其他字母数字单词
+_CJK = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+_TOKEN_RE = re.compile(rf'([{_CJK}]+)|([^\W_{_CJK}]+)')
+
+_CREATE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS ledger_fts USING fts5({', '.join(SEARCH_FIELDS)}, "
+    "tokenize = 'unicode61')"
+)
+
+_INSERT_SQL = text(
+    f"INSERT INTO ledger_fts (rowid, {', '.join(SEARCH_FIELDS)}) "
+    f"VALUES (:rowid, {', '.join(':' + field for field in SEARCH_FIELDS)})"
+)
+
+
+def tokenize(text):
+    """将文本切分为索引词元
+
+    中文片段切分为二元组（bigram），并额外保留片段最后一个字，
+    这样任意单字都能通过前缀查询命中；其他单词原样保留（小写）。
+    """
+    tokens = []
+    for cjk, word in _TOKEN_RE.findall(text or ''):
+        if word:
+            tokens.append(word.lower())
+            continue
+        tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        tokens.append(cjk[-1])
+    return ' '.join(tokens)
+
+
+def build_match_query(query_text):
+    """将用户输入转换为 FTS5 MATCH 表达式，无有效词元时返回 None"""
+    terms = []
+    for cjk, word in _TOKEN_RE.findall(query_text or ''):
+        if word:
+            terms.append(f'"{word.lower()}"*')
+        elif len(cjk) == 1:
+            terms.append(f'"{cjk}"*')
+        else:
+            # 相邻二元组组成短语，等价于子串匹配
+            terms.append('"' + ' '.join(cjk[i:i + 2] for i in range(len(cjk) - 1)) + '"')
+    return ' AND '.join(terms) or None
+
+
+def search_enabled():
+    """当前应用是否启用了全文索引（启动时未执行 init_search 的进程在首次使用时检测）"""
+    if not has_app_context():
+        return False
+    enabled = current_app.extensions.get('ledger_search')
+    if enabled is None:
+        enabled = _detect_search(current_app)
+    return enabled
+
+
+def _fts5_available(conn):
+    options = {row[0] for row in conn.exec_driver_sql('PRAGMA compile_options')}
+    return 'ENABLE_FTS5' in options
+
+
+def _fts_table_exists(conn):
+    return conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ledger_fts'")
+    ).first() is not None
+
+
+def _detect_search(app):
+    """检测全文索引是否可用，不执行 DDL
+
+    索引表尚未创建（flask init-db 之前）时不缓存结果，建表后无需重启即可生效。
+    """
+    if not app.config.get('SEARCH_ENABLED', True) or db.engine.dialect.name != 'sqlite':
+        app.extensions['ledger_search'] = False
+        return False
+    with db.engine.connect() as conn:
+        if not _fts5_available(conn):
+            app.logger.warning('SQLite is built without FTS5, full-text search disabled')
+            app.extensions['ledger_search'] = False
+            return False
+        exists = _fts_table_exists(conn)
+    if exists:
+        app.extensions['ledger_search'] = True
+    return exists
+
+
+def _should_create_fts(ddl, target, bind, **kw):
+    if bind.dialect.name != 'sqlite' or not _fts5_available(bind):
+        return False
+    return not has_app_context() or current_app.config.get('SEARCH_ENABLED', True)
+
+
+# 全文索引表随台账表一起创建和删除（create_all / drop_all）
+event.listen(LedgerEntry.__table__, 'after_create', DDL(_CREATE_SQL).execute_if(callable_=_should_create_fts))
+event.listen(LedgerEntry.__table__, 'before_drop', DDL('DROP TABLE IF EXISTS ledger_fts').execute_if(dialect='sqlite'))
+
+
+def init_search(app):
+    """启用全文索引（仅 SQLite）：缺少索引表时创建，索引条目数与台账不一致时重建"""
+    app.extensions['ledger_search'] = False
+    if not app.config.get('SEARCH_ENABLED', True) or db.engine.dialect.name != 'sqlite':
+        return
+    with db.engine.begin() as conn:
+        if not _fts5_available(conn):
+            app.logger.warning('SQLite is built without FTS5, full-text search disabled')
+            return
+        exists = _fts_table_exists(conn)
+        if exists:
+            # 之前的进程可能未同步索引就写入了台账
+            indexed = conn.execute(text('SELECT count(*) FROM ledger_fts')).scalar()
+            stale = indexed != conn.execute(select(func.count()).select_from(LedgerEntry)).scalar()
+        else:
+            conn.execute(text(_CREATE_SQL))
+            stale = True
+    app.extensions['ledger_search'] = True
+    if stale:
+        count = rebuild_search_index()
+        app.logger.info(f'Built ledger search index: {count} entries')
+
+
+def rebuild_search_index(batch_size=2000):
+    """批量重建全文索引，返回索引的条目数"""
+    columns = [LedgerEntry.id] + [getattr(LedgerEntry, field) for field in SEARCH_FIELDS]
+    count = 0
+    with db.engine.begin() as conn:
+        conn.execute(text('DELETE FROM ledger_fts'))
+        result = conn.execution_options(yield_per=batch_size).execute(select(*columns))
+        for rows in result.partitions():
+            conn.execute(_INSERT_SQL, [_index_params(row._mapping) for row in rows])
+            count += len(rows)
+    return count
+
+
+def _index_params(values):
+    params = {'rowid': values['id']}
+    for field in SEARCH_FIELDS:
+        params[field] = tokenize(values[field])
+    return params
+
+
+@on_ledger_flush
+def _sync_search_index(session, changes):
+    """在写入台账的同一事务中同步全文索引"""
+    if not search_enabled():
+        return
+    conn = session.connection()
+    stale = [{'rowid': c.entry_id} for c in changes if c.op in ('update', 'delete')]
+    fresh = [_index_params(c.new) for c in changes if c.op in ('create', 'update')]
+    if stale:
+        conn.execute(text('DELETE FROM ledger_fts WHERE rowid = :rowid'), stale)
+    if fresh:
+        conn.execute(_INSERT_SQL, fresh)
+
+
+def apply_search(query, query_text):
+    """按关键字过滤台账查询，返回 (query, rank)
+
+    rank 为 bm25 相关度（越小越相关），未启用全文索引时退化为 LIKE 查询且 rank 为 None。
+    """
+    if not search_enabled():
+        pattern = f'%{query_text}%'
+        return query.filter(or_(*(getattr(LedgerEntry, f).ilike(pattern) for f in SEARCH_FIELDS))), None
+    match = build_match_query(query_text)
+    if not match:
+        return query.filter(false()), None
+    hits = select(
+        ledger_fts.c.rowid.label('entry_id'),
+        func.bm25(literal_column('ledger_fts'), *SEARCH_WEIGHTS).label('rank')
+    ).where(literal_column('ledger_fts').op('MATCH')(match)).subquery()
+    return query.join(hits, hits.c.entry_id == LedgerEntry.id), hits.c.rank
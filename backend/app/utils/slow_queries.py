@@ -0,0 +1,217 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+
+from app.utils.db_advisor import plan_issues
+
+# 可以查看执行计划的语句
+EXPLAIN_PREFIXES = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+# 语句涉及这些列时参数一律脱敏
+SENSITIVE_COLUMNS = ('password_hash', 'jti')
+
+REDACTED = '***'
+
+# 单个字符串参数最多记录的字符数
+MAX_PARAM_LENGTH = 200
+
+
+def _format_param(value):
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return f'<{len(value)} bytes>'
+    if isinstance(value, str) and len(value) > MAX_PARAM_LENGTH:
+        return value[:MAX_PARAM_LENGTH] + '...'
+    return value
+
+
+def format_parameters(statement, parameters, redact=False):
+    """整理绑定参数用于记录；redact 为 True 或语句涉及敏感列时替换为 ***"""
+    if redact or any(column in statement for column in SENSITIVE_COLUMNS):
+        if isinstance(parameters, dict):
+            return {key: REDACTED for key in parameters}
+        return [REDACTED] * len(parameters or ())
+    if isinstance(parameters, dict):
+        return {key: _format_param(value) for key, value in parameters.items()}
+    return [_format_param(value) for value in parameters or ()]
+
+
+def explain_query_plan(dbapi_connection, statement, parameters):
+    """在同一连接上用新游标执行 EXPLAIN QUERY PLAN（仅 SQLite），返回计划各行的说明"""
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)
+        return [row[3] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+class SlowQueryLog:
+    """慢查询记录：最近的记录保存在环形缓冲区，同时追加写入按大小轮转的 JSONL 文件"""
+
+    def __init__(self, threshold_ms, buffer_size=500, path=None, max_bytes=10 * 1024 * 1024,
+                 backup_count=5, redact=False, explain=True):
+        self.threshold = threshold_ms / 1000
+        self.redact = redact
+        self.explain = explain
+        self._records = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._handler = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._handler = RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True
+            )
+            self._handler.setFormatter(logging.Formatter('%(message)s'))
+
+    def record(self, entry):
+        with self._lock:
+            self._records.append(entry)
+        if self._handler is not None:
+            line = json.dumps(entry, ensure_ascii=False, default=str)
+            self._handler.handle(logging.makeLogRecord({'msg': line, 'levelno': logging.WARNING}))
+
+    def recent(self):
+        with self._lock:
+            return list(self._records)
+
+    def shared_records(self):
+        """所有 worker 进程最近写入 JSONL 文件的记录（含已轮转的文件，最多 buffer_size 条，按写入顺序）
+
+        未配置文件时返回本进程缓冲区中的记录。
+        """
+        if self._handler is None:
+            return self.recent()
+        base, limit = self._handler.baseFilename, self._records.maxlen
+        paths = [base] + [f'{base}.{i}' for i in range(1, self._handler.backupCount + 1)]
+        # 从最新的文件往前读，够数即停
+        chunks = []
+        remaining = limit
+        for path in paths:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    lines = deque(f, maxlen=remaining)
+            except FileNotFoundError:
+                continue
+            chunks.append(lines)
+            remaining -= len(lines)
+            if remaining <= 0:
+                break
+        records = []
+        for lines in reversed(chunks):
+            for line in lines:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # 其他进程正在写入的半行
+                    continue
+        return records
+
+    def top(self, limit=20, records=None):
+        """按总耗时汇总慢查询（同一 SQL 合并），返回耗时最多的 limit 条；records 默认为本进程缓冲区"""
+        groups = {}
+        for entry in self.recent() if records is None else records:
+            group = groups.get(entry['sql'])
+            if group is None:
+                group = groups[entry['sql']] = {
+                    'sql': entry['sql'],
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'endpoints': [],
+                }
+            group['count'] += 1
+            group['total_ms'] += entry['duration_ms']
+            if entry['endpoint'] not in group['endpoints']:
+                group['endpoints'].append(entry['endpoint'])
+            if entry['duration_ms'] >= group['max_ms']:
+                # 保留最慢一次的参数和执行计划
+                group.update(
+                    max_ms=entry['duration_ms'],
+                    slowest_at=entry['timestamp'],
+                    parameters=entry['parameters'],
+                    plan=entry['plan'],
+                    issues=entry['issues'],
+                )
+        result = sorted(groups.values(), key=lambda g: g['total_ms'], reverse=True)[:limit]
+        for group in result:
+            group['total_ms'] = round(group['total_ms'], 3)
+            group['avg_ms'] = round(group['total_ms'] / group['count'], 3)
+        return result
+
+
+def get_slow_query_log(app=None):
+    """获取应用的慢查询记录，未启用时返回 None"""
+    return (app or current_app).extensions.get('slow_query_log')
+
+
+def _request_endpoint():
+    if has_request_context():
+        return f'{request.method} {request.endpoint or request.path}'
+    return f'thread:{threading.current_thread().name}'
+
+
+def _instrument_engine(log, engine):
+    explain = log.explain and engine.dialect.name == 'sqlite'
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _start_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('slow_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _end_query(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['slow_query_start'].pop()
+        if elapsed < log.threshold:
+            return
+        plan = None
+        if explain and not executemany and statement.lstrip()[:6].upper().startswith(EXPLAIN_PREFIXES):
+            try:
+                plan = explain_query_plan(conn.connection.dbapi_connection, statement, parameters)
+            except Exception as e:
+                plan = [f'EXPLAIN failed: {e}']
+        log.record({
+            'timestamp': datetime.utcnow().isoformat(),
+            'duration_ms': round(elapsed * 1000, 3),
+            'endpoint': _request_endpoint(),
+            'sql': ' '.join(statement.split()),
+            'parameters': None if executemany else format_parameters(statement, parameters, log.redact),
+            'executemany': executemany,
+            'plan': plan,
+            'issues': plan_issues(plan) if plan else [],
+        })
+
+    @event.listens_for(engine, 'handle_error')
+    def _failed_query(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('slow_query_start'):
+            conn.info['slow_query_start'].pop()
+
+
+def init_slow_query_log(app, db):
+    """记录执行时间超过 SLOW_QUERY_THRESHOLD_MS 的 SQL 语句、参数、所在接口和执行计划"""
+    config = app.config
+    log = app.extensions['slow_query_log'] = SlowQueryLog(
+        config['SLOW_QUERY_THRESHOLD_MS'],
+        buffer_size=config['SLOW_QUERY_BUFFER_SIZE'],
+        path=config.get('SLOW_QUERY_LOG_PATH'),
+        max_bytes=config['SLOW_QUERY_LOG_MAX_BYTES'],
+        backup_count=config['SLOW_QUERY_LOG_BACKUP_COUNT'],
+        redact=config['SLOW_QUERY_REDACT_PARAMS'],
+        explain=config['SLOW_QUERY_EXPLAIN'],
+    )
+    with app.app_context():
+        _instrument_engine(log, db.engine)
+    read_engine = app.extensions.get('read_engine')
+    if read_engine is not None:
+        _instrument_engine(log, read_engine)
+    app.logger.info(f"Slow query log enabled: threshold {config['SLOW_QUERY_THRESHOLD_MS']}ms")
+    return log
@@ -0,0 +1,55 @@
+from sqlalchemy import event
+
+# 依次执行的顺序：先设置 busy_timeout，切换 journal_mode 时才会等待其他连接释放锁
+PRAGMA_ORDER = (
+    'busy_timeout', 'journal_mode', 'synchronous', 'cache_size',
+    'mmap_size', 'temp_store', 'foreign_keys'
+)
+
+
+def _ordered(pragmas):
+    known = [name for name in PRAGMA_ORDER if name in pragmas]
+    return known + sorted(name for name in pragmas if name not in PRAGMA_ORDER)
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    """在 DBAPI 连接上执行 PRAGMA 设置"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name in _ordered(pragmas):
+            cursor.execute(f'PRAGMA {name}={pragmas[name]}')
+    finally:
+        cursor.close()
+
+
+def read_pragmas(dbapi_connection, names):
+    """读取 DBAPI 连接上实际生效的 PRAGMA 值"""
+    cursor = dbapi_connection.cursor()
+    try:
+        return {name: cursor.execute(f'PRAGMA {name}').fetchone()[0] for name in names}
+    finally:
+        cursor.close()
+
+
+def configure_sqlite(app, engine):
+    """为 SQLite 引擎的每个新连接应用 SQLITE_PRAGMAS
+
+    启动时不连接数据库；第一个连接建立时记录实际生效的值。
+    """
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+    logged = []
+
+    @event.listens_for(engine, 'connect')
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, pragmas)
+        if not logged:
+            logged.append(True)
+            effective = read_pragmas(dbapi_connection, _ordered(pragmas))
+            app.logger.info(
+                'SQLite pragmas: ' + ', '.join(f'{name}={value}' for name, value in effective.items())
+            )
+
+    # 丢弃配置前已建立的连接，确保连接池中的连接都应用了设置
+    engine.dispose()
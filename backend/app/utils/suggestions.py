@@ -0,0 +1,198 @@
+import heapq
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import current_app, has_app_context
+from sqlalchemy import select
+
+from app.models import db, LedgerEntry
+from app.utils.ledger_events import on_ledger_commit
+
+# 建议项类型
+PROJECT = 'project'
+LOCATION = 'location'
+SENTENCE = 'sentence'
+
+# 具体事项按句切分，过长的句子不作为建议项
+MAX_SENTENCE_LENGTH = 100
+
+# 建议索引用到的字段
+INDEXED_FIELDS = ('user_id', 'province', 'project_name', 'location', 'specific_matters')
+
+
+def extract_values(values):
+    """从台账字段中提取 (类型, 建议值) 列表"""
+    items = []
+    if values.get('project_name'):
+        items.append((PROJECT, values['project_name']))
+    if values.get('location'):
+        items.append((LOCATION, values['location']))
+    for sentence in (values.get('specific_matters') or '').split('。'):
+        if sentence.strip() and len(sentence) < MAX_SENTENCE_LENGTH:
+            items.append((SENTENCE, sentence.strip()))
+    return items
+
+
+def _indexed_version(values):
+    """条目在建议索引中的版本（索引字段的哈希），条目不存在时为 None"""
+    if values is None:
+        return None
+    return hash(tuple(values.get(field) for field in INDEXED_FIELDS))
+
+
+class _SuggestionStore:
+    """建议项频次及字符倒排表"""
+
+    def __init__(self):
+        # kind -> value -> Counter{(user_id, province): count}
+        self.counts = {kind: {} for kind in (PROJECT, LOCATION, SENTENCE)}
+        # kind -> 字符 -> 包含该字符的建议值集合
+        self.postings = {kind: defaultdict(set) for kind in (PROJECT, LOCATION, SENTENCE)}
+
+    def add(self, values, delta=1):
+        scope = (int(values['user_id']), values['province'])
+        for kind, value in extract_values(values):
+            scopes = self.counts[kind].get(value)
+            if scopes is None:
+                if delta < 0:
+                    continue
+                scopes = self.counts[kind][value] = Counter()
+                for char in set(value.lower()):
+                    self.postings[kind][char].add(value)
+            scopes[scope] += delta
+            if scopes[scope] <= 0:
+                del scopes[scope]
+            if not scopes:
+                del self.counts[kind][value]
+                for char in set(value.lower()):
+                    self.postings[kind][char].discard(value)
+
+    def apply(self, change):
+        if change.old:
+            self.add(change.old, -1)
+        if change.new:
+            self.add(change.new, 1)
+
+    def candidates(self, kind, text):
+        """返回包含 text 的建议值（先按最稀有的字符缩小范围，再校验子串）"""
+        postings = self.postings[kind]
+        sets = [postings.get(char) for char in set(text)]
+        if not sets or not all(sets):
+            return []
+        smallest = min(sets, key=len)
+        return [value for value in smallest if text in value.lower()]
+
+
+class SuggestionIndex:
+    """进程内自动补全索引
+
+    后台线程启动时全量构建，之后通过台账提交事件增量更新；
+    其他 worker 进程的写入依赖定期重建（SUGGESTION_INDEX_REFRESH_SECONDS）。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._store = None
+        self._pending = None
+
+    @property
+    def ready(self):
+        return self._store is not None
+
+    def rebuild(self, batch_size=2000):
+        """全量扫描台账表构建新索引，构建期间的增量变更在切换前补齐
+
+        扫描开始前后提交的变更可能已经包含在扫描结果中（提交事件晚于扫描快照到达），
+        因此记录扫描读到的每个条目的版本，只补齐旧值与该版本一致的变更，避免重复计数。
+        """
+        store = _SuggestionStore()
+        scanned = {}
+        with self._lock:
+            self._pending = []
+        try:
+            columns = [LedgerEntry.id] + [getattr(LedgerEntry, field) for field in INDEXED_FIELDS]
+            with db.engine.connect() as conn:
+                result = conn.execution_options(yield_per=batch_size).execute(select(*columns))
+                for rows in result.partitions():
+                    for row in rows:
+                        store.add(row._mapping)
+                        scanned[row.id] = _indexed_version(row._mapping)
+            with self._lock:
+                for change in self._pending:
+                    if scanned.get(change.entry_id) == _indexed_version(change.old):
+                        store.apply(change)
+                        scanned[change.entry_id] = _indexed_version(change.new)
+                self._store = store
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def apply(self, changes):
+        """应用已提交的台账变更"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.extend(changes)
+            if self._store is not None:
+                for change in changes:
+                    self._store.apply(change)
+
+    def lookup(self, kinds, text, province=None, user_id=None, limit=20):
+        """返回按频次排序的前 limit 个建议 [(value, count)]"""
+        text = text.lower()
+        user_id = int(user_id) if user_id is not None else None
+        totals = Counter()
+        with self._lock:
+            store = self._store
+            for kind in kinds:
+                for value in store.candidates(kind, text):
+                    count = sum(
+                        n for (uid, prov), n in store.counts[kind][value].items()
+                        if (user_id is None or uid == user_id) and (province is None or prov == province)
+                    )
+                    if count:
+                        totals[value] += count
+        return heapq.nlargest(limit, totals.items(), key=lambda item: item[1])
+
+
+def get_suggestion_index():
+    """获取当前应用的建议索引（未就绪时返回 None）"""
+    index = current_app.extensions.get('suggestion_index')
+    return index if index is not None and index.ready else None
+
+
+def init_suggestion_index(app, background=True):
+    """创建建议索引；background 为 True 时在后台线程中构建并定期重建"""
+    index = SuggestionIndex()
+    app.extensions['suggestion_index'] = index
+    if not background:
+        with app.app_context():
+            index.rebuild()
+        return index
+
+    refresh_seconds = app.config.get('SUGGESTION_INDEX_REFRESH_SECONDS', 0)
+
+    def run():
+        while True:
+            started = time.monotonic()
+            try:
+                with app.app_context():
+                    index.rebuild()
+                app.logger.info(f'Suggestion index built in {time.monotonic() - started:.2f}s')
+            except Exception as e:
+                app.logger.error(f'Failed to build suggestion index: {str(e)}')
+            if not refresh_seconds:
+                return
+            time.sleep(refresh_seconds)
+
+    threading.Thread(target=run, name='suggestion-index', daemon=True).start()
+    return index
+
+
+@on_ledger_commit
+def _update_suggestion_index(changes):
+    if not has_app_context():
+        return
+    index = current_app.extensions.get('suggestion_index')
+    if index is not None:
+        index.apply(changes)
@@ -0,0 +1,102 @@
+from collections import namedtuple
+
+from flask import current_app, has_app_context
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from app.models import db, User
+from app.utils.http_cache import TTLCache
+
+# 修改后需要使缓存失效的字段
+AUTH_FIELDS = ('username', 'role', 'password_hash', 'token_generation')
+
+
+class CachedUser(namedtuple('CachedUser', ['id', 'username', 'role', 'token_generation', 'created_at'])):
+    """鉴权用的用户记录（不含密码哈希）"""
+
+    def to_dict(self):
+        """与 User.to_dict() 一致"""
+        return {
+            'id': self.id,
+            'username': self.username,
+            'role': self.role,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+
+def get_user_cache():
+    """当前进程的用户记录缓存（LRU + TTL）"""
+    cache = current_app.extensions.get('user_cache')
+    if cache is None:
+        cache = current_app.extensions['user_cache'] = TTLCache(
+            current_app.config.get('USER_CACHE_TTL_SECONDS', 30),
+            max_size=current_app.config.get('USER_CACHE_MAX_SIZE', 1024)
+        )
+    return cache
+
+
+def _load_user(user_id):
+    row = db.session.execute(
+        select(User.id, User.username, User.role, User.token_generation, User.created_at)
+        .where(User.id == user_id)
+    ).first()
+    return CachedUser(*row) if row else None
+
+
+def get_cached_user(user_id):
+    """按 id 获取用户记录，用户不存在时返回 None
+
+    本进程的修改在提交后立即失效；其他进程的修改最迟 USER_CACHE_TTL_SECONDS 后生效。
+    """
+    user_id = int(user_id)
+    return get_user_cache().get_or_load(user_id, lambda: _load_user(user_id))
+
+
+def current_user_record():
+    """当前请求 JWT 对应的用户记录"""
+    return get_cached_user(get_jwt_identity())
+
+
+def current_user_role():
+    """当前用户的角色，以用户表为准，不使用令牌中可能过期的 role 声明"""
+    user = current_user_record()
+    return user.role if user else None
+
+
+def is_token_revoked(jwt_payload):
+    """用户已删除或令牌代数落后（修改过密码）时令牌失效"""
+    try:
+        user = get_cached_user(jwt_payload['sub'])
+    except (KeyError, TypeError, ValueError):
+        return True
+    return user is None or jwt_payload.get('gen', 0) != user.token_generation
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    changed = set()
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            changed.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in AUTH_FIELDS):
+                changed.add(obj.id)
+    if changed:
+        session.info.setdefault('changed_user_ids', set()).update(changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    changed = session.info.pop('changed_user_ids', None)
+    if changed and has_app_context():
+        cache = get_user_cache()
+        for user_id in changed:
+            cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('changed_user_ids', None)
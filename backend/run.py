@@ -4,40 +4,12 @@ Flask应用启动脚本
 用于开发环境运行
 """
 import os
-import logging
-from logging.handlers import RotatingFileHandler
 import click
 from app import create_app, db
 from app.models import User, Province, LedgerEntry, ActivityLog
 
 # 创建应用实例
 app = create_app()
-
-# 配置日志
-if not os.path.exists('logs'):
-    os.mkdir('logs')
-
-# 使用不同的日志文件名
-log_file = 'logs/app.log'
-if os.path.exists(log_file):
-    # 如果文件存在，尝试删除它
-    try:
-        os.remove(log_file)
-    except:
-        pass
-
-file_handler = RotatingFileHandler(
-    log_file,
-    maxBytes=10240,
-    backupCount=10,
-    delay=True  # 延迟文件创建
-)
-file_handler.setFormatter(logging.Formatter(
-    '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-))
-file_handler.setLevel(logging.INFO)
-app.logger.addHandler(file_handler)
-app.logger.setLevel(logging.INFO)
 app.logger.info('应用启动')
 
 # 打印配置信息（仅在开发环境）
@@ -55,13 +27,6 @@ def make_shell_context():
         'ActivityLog': ActivityLog
     }
 
-@app.cli.command()
-def init_db():
-    """初始化数据库"""
-    click.echo('Initializing database...')
-    db.create_all()
-    click.echo('Database initialized.')
-
 @app.cli.command()
 @click.argument('username')
 @click.argument('password')
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+登录吞吐基准测试
+对每种密码哈希配置分别测量：单次哈希校验耗时（即每核每秒可完成的登录数上限），
+以及多个线程并发调用 /api/login（经过哈希线程池）时的整体吞吐
+
+用法：python scripts/benchmark_login.py [--logins 40] [--threads 4]
+      [--method pbkdf2:sha256:600000 --method scrypt:32768:8:1 ...]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import check_password_hash, generate_password_hash  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models import User  # noqa: E402
+
+DEFAULT_METHODS = ['pbkdf2:sha256:600000', 'pbkdf2:sha256:200000', 'scrypt:32768:8:1']
+PASSWORD = 'bench-password'
+
+
+def measure_verify(method, repeat):
+    """单线程校验一次哈希的平均耗时（秒）"""
+    pwhash = generate_password_hash(PASSWORD, method)
+    check_password_hash(pwhash, PASSWORD)  # 预热
+    start = time.perf_counter()
+    for _ in range(repeat):
+        check_password_hash(pwhash, PASSWORD)
+    return (time.perf_counter() - start) / repeat
+
+
+def measure_logins(method, logins, threads, workers):
+    """并发登录的吞吐（次/秒）"""
+    app = create_app('testing')
+    app.config.update(PASSWORD_HASH_METHOD=method, PASSWORD_HASH_WORKERS=workers, AUDIT_ASYNC=False)
+    with app.app_context():
+        db.create_all()
+        try:
+            user = User(username='bench_login', role='user')
+            user.set_password(PASSWORD)
+            db.session.add(user)
+            db.session.commit()
+
+            def login(_):
+                with app.test_client() as client:
+                    response = client.post('/api/login', json={'username': 'bench_login', 'password': PASSWORD})
+                    assert response.status_code == 200, response.get_data(as_text=True)
+
+            login(None)  # 预热
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                list(executor.map(login, range(logins)))
+            return logins / (time.perf_counter() - start)
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='登录吞吐基准测试')
+    parser.add_argument('--method', action='append', dest='methods', help='werkzeug 哈希方法，可重复指定')
+    parser.add_argument('--logins', type=int, default=40, help='每种配置的并发登录次数')
+    parser.add_argument('--threads', type=int, default=4, help='并发请求线程数')
+    parser.add_argument('--workers', type=int, default=None, help='哈希线程池大小（默认等于 CPU 核数）')
+    parser.add_argument('--repeat', type=int, default=10, help='单线程校验的重复次数')
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    workers = args.workers or cores
+    print(f'CPU 核数 {cores}，哈希线程 {workers}，并发请求 {args.threads}，每种配置登录 {args.logins} 次')
+    print(f'{"哈希方法":<24}{"校验 ms":>10}{"次/秒/核":>12}{"并发 次/秒":>12}{"次/秒/核":>12}')
+    for method in args.methods or DEFAULT_METHODS:
+        verify_seconds = measure_verify(method, args.repeat)
+        throughput = measure_logins(method, args.logins, args.threads, workers)
+        print(f'{method:<24}{verify_seconds * 1000:10.1f}{1 / verify_seconds:12.1f}'
+              f'{throughput:12.1f}{throughput / min(workers, cores):12.1f}')
+
+
+if __name__ == '__main__':
+    main()
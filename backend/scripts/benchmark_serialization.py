@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+"""
+台账列表序列化基准测试
+对比 ORM 对象 + to_dict() + 标准库 json 与列投影 + orjson 生成一页（默认 100 行）响应体的耗时，
+分别给出仅序列化（已取回的对象/行 -> 响应字节）和包含查询的端到端耗时，
+以及最快方案中行转字典与 JSON 编码各自的耗时，并与目标提速倍数（默认 10 倍）比较
+
+用法：python scripts/benchmark_serialization.py [--rows 100] [--repeat 200] [--target 10]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import joinedload  # noqa: E402
+
+from app import create_app, db  # noqa: E402
+from app.models import User, LedgerEntry  # noqa: E402
+from app.utils.json_provider import IsoJSONProvider, OrjsonProvider, orjson  # noqa: E402
+from app.utils.ledger_query import ledger_list_select  # noqa: E402
+from app.utils.pagination import rows_to_dicts  # noqa: E402
+
+
+def seed(rows):
+    user = User(username='bench_user', role='user')
+    user.set_password('bench')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add_all([
+        LedgerEntry(
+            user_id=user.id,
+            province='上海',
+            project_name=f'基准测试项目{i}',
+            date=date(2024, 5, 1),
+            location='会议室',
+            personnel='张三、李四',
+            nature='会议纪要',
+            specific_matters='讨论项目进度、质量管理和后续安排。' * 20,
+            follow_up_points='跟进事项。' * 10
+        )
+        for i in range(rows)
+    ])
+    db.session.commit()
+
+
+def fetch_orm(rows):
+    return (
+        LedgerEntry.query.options(joinedload(LedgerEntry.author, innerjoin=True))
+        .order_by(LedgerEntry.created_at.desc()).limit(rows).all()
+    )
+
+
+def fetch_projection(rows):
+    stmt = ledger_list_select({}).order_by(LedgerEntry.created_at.desc()).limit(rows)
+    return db.session.execute(stmt).all()
+
+
+def serialize_orm(provider, entries):
+    return provider.response({'items': [entry.to_dict() for entry in entries]}).get_data()
+
+
+def serialize_projection(provider, rows):
+    return provider.response({'items': rows_to_dicts(rows)}).get_data()
+
+
+def measure(fn, repeat):
+    fn()  # 预热
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def run(app, rows, repeat):
+    """返回 [(名称, 序列化耗时 ms, 端到端耗时 ms)]"""
+    stdlib = IsoJSONProvider(app)
+
+    def orm_end_to_end():
+        serialize_orm(stdlib, fetch_orm(rows))
+        db.session.expunge_all()
+
+    entries = fetch_orm(rows)
+    results = [(
+        'ORM + to_dict + json',
+        measure(lambda: serialize_orm(stdlib, entries), repeat),
+        measure(orm_end_to_end, repeat),
+    )]
+    db.session.expunge_all()
+
+    projected = fetch_projection(rows)
+    providers = [('投影 + json', stdlib)]
+    if orjson is not None:
+        providers.append(('投影 + orjson', OrjsonProvider(app)))
+    for name, provider in providers:
+        results.append((
+            name,
+            measure(lambda: serialize_projection(provider, projected), repeat),
+            measure(lambda: serialize_projection(provider, fetch_projection(rows)), repeat),
+        ))
+    return results
+
+
+def breakdown(app, rows, repeat):
+    """最快方案的两个阶段：行转字典、JSON 编码生成响应体，返回 (ms, ms)"""
+    provider = OrjsonProvider(app) if orjson is not None else IsoJSONProvider(app)
+    projected = fetch_projection(rows)
+    items = rows_to_dicts(projected)
+    return (
+        measure(lambda: rows_to_dicts(projected), repeat),
+        measure(lambda: provider.response({'items': items}).get_data(), repeat),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='台账列表序列化基准测试')
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--target', type=float, default=10, help='目标提速倍数（仅序列化）')
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        try:
+            seed(args.rows)
+            results = run(app, args.rows, args.repeat)
+            base_serialize, base_total = results[0][1], results[0][2]
+            print(f'{args.rows} 行/页，重复 {args.repeat} 次')
+            print(f'{"":<20}{"序列化 ms":>12}{"倍数":>8}{"含查询 ms":>12}{"倍数":>8}')
+            for name, serialize_ms, total_ms in results:
+                print(f'{name:<20}{serialize_ms:12.3f}{base_serialize / serialize_ms:7.1f}x'
+                      f'{total_ms:12.3f}{base_total / total_ms:7.1f}x')
+            to_dicts_ms, encode_ms = breakdown(app, args.rows, args.repeat)
+            print(f'{results[-1][0]}：行转字典 {to_dicts_ms:.3f} ms，JSON 编码 {encode_ms:.3f} ms')
+            speedup = base_serialize / min(serialize_ms for _, serialize_ms, _ in results)
+            verdict = '达到' if speedup >= args.target else '未达到'
+            print(f'序列化提速 {speedup:.1f}x，目标 {args.target:g}x：{verdict}')
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,11 @@
 #!/usr/bin/env python
 """
 性能监控脚本
-监控API响应时间和系统资源使用
+监控API响应时间和系统资源使用（登录后携带令牌请求受保护的接口）
+
+服务端的请求耗时分布、SQL 次数等指标见 /metrics
 """
+import os
 import time
 import requests
 import psutil
@@ -12,11 +15,12 @@ from statistics import mean
 
 # 配置
 API_ENDPOINTS = [
-    '/api/login',
     '/api/ledger',
     '/api/provinces'
 ]
-BASE_URL = 'http://localhost:5000'
+BASE_URL = os.environ.get('MONITOR_BASE_URL', 'http://localhost:5000')
+USERNAME = os.environ.get('MONITOR_USERNAME', 'admin')
+PASSWORD = os.environ.get('MONITOR_PASSWORD', 'admin123')
 MONITOR_DURATION = 60  # 监控持续时间（秒）
 SAMPLE_INTERVAL = 5    # 采样间隔（秒）
 
@@ -28,13 +32,28 @@ class PerformanceMonitor:
             'start_time': datetime.now().isoformat(),
             'end_time': None
         }
+        self.session = requests.Session()
+    
+    def login(self):
+        """登录并在之后的请求中携带访问令牌；访问令牌过期后重新登录"""
+        response = self.session.post(
+            BASE_URL + '/api/login',
+            json={'username': USERNAME, 'password': PASSWORD},
+            timeout=10
+        )
+        response.raise_for_status()
+        self.session.headers['Authorization'] = f"Bearer {response.json()['access_token']}"
     
     def test_api_endpoint(self, endpoint):
         """测试API端点响应时间"""
         url = BASE_URL + endpoint
         try:
             start_time = time.time()
-            response = requests.get(url, timeout=10)
+            response = self.session.get(url, timeout=10)
+            if response.status_code == 401:
+                self.login()
+                start_time = time.time()
+                response = self.session.get(url, timeout=10)
             response_time = (time.time() - start_time) * 1000  # 转换为毫秒
             
             return {
@@ -79,6 +98,7 @@ class PerformanceMonitor:
     def run(self):
         """运行监控"""
         print(f"开始性能监控，持续 {MONITOR_DURATION} 秒...")
+        self.login()
         
         start_time = time.time()
         sample_count = 0
@@ -99,7 +119,7 @@ class PerformanceMonitor:
                 if result['success']:
                     print(f"  {endpoint}: {result['response_time']:.2f}ms")
                 else:
-                    print(f"  {endpoint}: 失败 - {result.get('error', 'Unknown error')}")
+                    print(f"  {endpoint}: 失败 - {result.get('error', result['status_code'])}")
             
             # 收集系统指标
             metrics = self.collect_system_metrics()
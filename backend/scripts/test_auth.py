@@ -17,4 +17,137 @@ def test_user_registration(client):
         'password': 'testpass123'
     })
     assert response.status_code == 201
-    assert response.json['success'] is True
\ No newline at end of file
+    assert response.json['success'] is True
+
+def test_login_rehashes_outdated_password_hashes(client):
+    from werkzeug.security import generate_password_hash
+
+    user = User(username='legacy', role='user', password_hash=generate_password_hash('legacy123', 'pbkdf2:sha256:2000'))
+    db.session.add(user)
+    db.session.commit()
+
+    response = client.post('/api/login', json={'username': 'legacy', 'password': 'legacy123'})
+    assert response.status_code == 200
+    # 登录成功后按当前配置的算法和参数重新生成哈希
+    method = client.application.config['PASSWORD_HASH_METHOD']
+    assert User.query.filter_by(username='legacy').one().password_hash.startswith(method + '$')
+    assert client.post('/api/login', json={'username': 'legacy', 'password': 'legacy123'}).status_code == 200
+    assert client.post('/api/login', json={'username': 'legacy', 'password': 'wrong'}).status_code == 401
+
+
+def test_login_returns_503_when_hash_capacity_is_exhausted(client, tmp_path):
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    from app.utils.passwords import HashPool, HostSlots
+
+    user = User(username='busy', role='user')
+    user.set_password('busy123')
+    db.session.add(user)
+    db.session.commit()
+
+    def login():
+        return client.post('/api/login', json={'username': 'busy', 'password': 'busy123'})
+
+    def assert_busy(response):
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+
+    # 进程内：唯一的哈希线程正在计算、且不允许排队时拒绝
+    pool = client.application.extensions['hash_pool'] = HashPool(workers=1, max_pending=0, wait_seconds=0)
+    started, release = threading.Event(), threading.Event()
+
+    def occupy():
+        started.set()
+        release.wait(5)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(pool.run, occupy)
+        assert started.wait(5)
+        assert_busy(login())
+        release.set()
+        future.result()
+    assert login().status_code == 200
+
+    # 跨进程：其他进程（这里用另一组文件句柄模拟）占满主机名额时立即拒绝
+    other_process = HostSlots(str(tmp_path), 1)
+    slot = other_process.try_acquire()
+    client.application.extensions['hash_pool'] = HashPool(
+        workers=2, max_pending=0, wait_seconds=0, host_slots=HostSlots(str(tmp_path), 1))
+    assert_busy(login())
+    other_process.release(slot)
+    assert login().status_code == 200
+
+    # 名额在等待时间内释放时登录排队后成功，而不是立即拒绝
+    slot = other_process.try_acquire()
+    client.application.extensions['hash_pool'] = HashPool(
+        workers=2, max_pending=0, wait_seconds=5, host_slots=HostSlots(str(tmp_path), 1))
+    timer = threading.Timer(0.2, other_process.release, (slot,))
+    timer.start()
+    assert login().status_code == 200
+    timer.join()
+
+
+def test_refresh_tokens_rotate_and_can_be_revoked(client):
+    from datetime import datetime, timedelta
+    from app.models import RefreshToken
+    from app.utils.refresh_tokens import prune_refresh_tokens
+
+    user = User(username='refresher', role='user')
+    user.set_password('refresh123')
+    db.session.add(user)
+    db.session.commit()
+
+    def login():
+        data = client.post('/api/login', json={'username': 'refresher', 'password': 'refresh123'}).json
+        return data['access_token'], data['refresh_token']
+
+    def refresh(token):
+        return client.post('/api/refresh', headers={'Authorization': f'Bearer {token}'})
+
+    def age_rotation(token):
+        # 模拟令牌在宽限期之前已被轮换
+        from flask_jwt_extended import decode_token
+        RefreshToken.query.filter_by(jti=decode_token(token)['jti']).update(
+            {'rotated_at': datetime.utcnow() - timedelta(minutes=5)})
+        db.session.commit()
+
+    access, first = login()
+    # 刷新令牌不能当作访问令牌使用
+    assert client.get('/api/me', headers={'Authorization': f'Bearer {first}'}).status_code == 401
+
+    response = refresh(first)
+    assert response.status_code == 200
+    second = response.json['refresh_token']
+    assert client.get('/api/me', headers={'Authorization': f"Bearer {response.json['access_token']}"}).status_code == 200
+
+    # 宽限期内同一令牌并发刷新两次都成功
+    response = refresh(first)
+    assert response.status_code == 200
+    concurrent = response.json['refresh_token']
+
+    # 超过宽限期后再次使用已轮换的令牌：拒绝并撤销整个 family，宽限期内轮换过的令牌也一并失效
+    third = refresh(second).json['refresh_token']
+    age_rotation(first)
+    assert refresh(first).status_code == 401
+    assert refresh(second).status_code == 401
+    assert refresh(third).status_code == 401
+    assert refresh(concurrent).status_code == 401
+
+    # 退出登录后立即刷新失败（包括宽限期内刚轮换过的令牌）
+    _, fourth = login()
+    fifth = refresh(fourth).json['refresh_token']
+    assert client.post('/api/logout', headers={'Authorization': f'Bearer {fifth}'}).status_code == 200
+    assert refresh(fifth).status_code == 401
+    assert refresh(fourth).status_code == 401
+
+    # 修改密码后已签发的刷新令牌失效
+    access, sixth = login()
+    client.post('/api/change-password', json={'old_password': 'refresh123', 'new_password': 'refresh456'},
+                headers={'Authorization': f'Bearer {access}'})
+    assert refresh(sixth).status_code == 401
+
+    total = RefreshToken.query.count()
+    RefreshToken.query.update({'expires_at': datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+    assert prune_refresh_tokens() == total
+    assert RefreshToken.query.count() == 0
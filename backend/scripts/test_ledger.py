@@ -0,0 +1,931 @@
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+
+from app import create_app, db
+from app.models import User, LedgerEntry
+from app.utils.suggestions import init_suggestion_index
+
+
+@pytest.fixture
+def client():
+    app = create_app('testing')
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            yield client
+            db.session.remove()
+            db.drop_all()
+
+
+def auth_headers(client, username='ledger_user', password='secret123', role='power_user'):
+    if not User.query.filter_by(username=username).first():
+        user = User(username=username, role=role)
+        user.set_password(password)
+        db.session.add(user)
+        db.session.commit()
+    response = client.post('/api/login', json={'username': username, 'password': password})
+    return {'Authorization': f"Bearer {response.json['access_token']}"}
+
+
+def create_entries(client, headers, count, **overrides):
+    ids = []
+    for i in range(count):
+        payload = {
+            'province': '上海',
+            'project_name': f'项目{i}',
+            'date': '2024-05-01',
+            'location': '会议室',
+            'personnel': '张三',
+            'nature': '会议纪要',
+            'specific_matters': f'讨论事项{i}。',
+        }
+        payload.update(overrides)
+        response = client.post('/api/ledger', json=payload, headers=headers)
+        assert response.status_code == 201
+        ids.append(response.json['data']['id'])
+    return ids
+
+
+def test_cursor_pagination_walks_all_pages(client):
+    headers = auth_headers(client)
+    ids = create_entries(client, headers, 7)
+
+    seen = []
+    cursor = ''
+    pages = []
+    while cursor is not None:
+        response = client.get('/api/ledger', query_string={'cursor': cursor, 'pageSize': 3}, headers=headers)
+        assert response.status_code == 200
+        data = response.json['data']
+        assert data['total'] is None
+        pages.append(data)
+        seen.extend(item['id'] for item in data['items'])
+        cursor = data['next_cursor']
+
+    assert seen == sorted(ids, reverse=True)
+    assert [len(p['items']) for p in pages] == [3, 3, 1]
+    assert pages[0]['prev_cursor'] is None
+
+    # 从最后一页向前翻页应回到上一页
+    response = client.get('/api/ledger', query_string={'cursor': pages[2]['prev_cursor'], 'pageSize': 3}, headers=headers)
+    assert [item['id'] for item in response.json['data']['items']] == [item['id'] for item in pages[1]['items']]
+
+
+def test_cursor_pagination_with_filters_and_total(client):
+    headers = auth_headers(client)
+    create_entries(client, headers, 2, province='江苏')
+    create_entries(client, headers, 3, province='浙江')
+
+    response = client.get('/api/ledger', query_string={
+        'cursor': '', 'pageSize': 2, 'province': '浙江', 'with_total': 1
+    }, headers=headers)
+    data = response.json['data']
+    assert data['total'] == 3
+    assert all(item['province'] == '浙江' for item in data['items'])
+    assert data['next_cursor']
+
+    response = client.get('/api/ledger', query_string={'cursor': 'not-a-cursor'}, headers=headers)
+    assert response.status_code == 400
+
+
+def test_author_loaded_without_per_row_queries(client):
+    # STRICT_AUTHOR_LOADING 在测试配置中开启，逐行懒加载录入人员会导致 500
+    first = auth_headers(client, 'recorder_a')
+    second = auth_headers(client, 'recorder_b')
+    create_entries(client, first, 2)
+    entry_id = create_entries(client, second, 2)[0]
+    db.session.expunge_all()
+
+    response = client.get('/api/ledger', headers=first)
+    assert response.status_code == 200
+    assert {item['recorder'] for item in response.json['data']['items']} == {'recorder_a', 'recorder_b'}
+
+    response = client.get('/api/ledger', query_string={'recorder': 'recorder_b'}, headers=first)
+    assert [item['recorder'] for item in response.json['data']['items']] == ['recorder_b'] * 2
+
+    response = client.get(f'/api/ledger/{entry_id}', headers=first)
+    assert response.json['data']['recorder'] == 'recorder_b'
+
+    response = client.put(f'/api/ledger/{entry_id}', json={'location': '现场'}, headers=first)
+    assert response.json['data']['recorder'] == 'recorder_b'
+
+    response = client.get('/api/meta/export/ledger', headers=first)
+    assert response.status_code == 200
+    assert 'recorder_b' in response.get_data(as_text=True)
+
+
+def test_strict_author_loading_rejects_lazy_loads(client):
+    headers = auth_headers(client)
+    entry_id = create_entries(client, headers, 1)[0]
+    db.session.expunge_all()
+
+    entry = db.session.get(LedgerEntry, entry_id)
+    with pytest.raises(InvalidRequestError):
+        entry.author
+
+
+def test_full_text_search_tracks_writes(client):
+    headers = auth_headers(client)
+    hongqiao, pudong = create_entries(client, headers, 2)
+    client.put(f'/api/ledger/{hongqiao}', json={'specific_matters': '虹桥枢纽进度讨论。'}, headers=headers)
+    client.put(f'/api/ledger/{pudong}', json={'project_name': '浦东机场扩建', 'location': '虹桥'}, headers=headers)
+
+    def search(keyword):
+        response = client.get('/api/ledger', query_string={'q': keyword}, headers=headers)
+        assert response.status_code == 200
+        return [item['id'] for item in response.json['data']['items']]
+
+    # 项目名称权重高于地点，地点高于具体事项
+    assert search('虹桥') == [pudong, hongqiao]
+    assert search('枢纽') == [hongqiao]
+    assert search('浦') == [pudong]
+    assert search('讨论事项0') == []
+    assert search('讨论事项') == [pudong]
+
+    client.delete(f'/api/ledger/{pudong}', headers=headers)
+    assert search('虹桥') == [hongqiao]
+
+    runner = client.application.test_cli_runner()
+    result = runner.invoke(args=['rebuild-search-index'])
+    assert 'Search index rebuilt: 1 entries' in result.output
+    assert search('虹桥枢纽') == [hongqiao]
+
+
+def test_suggestion_index_matches_database_and_tracks_writes(client):
+    headers = auth_headers(client)
+    own = auth_headers(client, 'plain_user', role='user')
+    create_entries(client, headers, 2, project_name='虹桥枢纽', specific_matters='讨论虹桥进度。确认桥梁方案。')
+    create_entries(client, own, 1, project_name='杭州湾大桥', province='浙江')
+
+    def suggest(query, hdrs=headers, **params):
+        response = client.get('/api/meta/suggestions/project_items', query_string={'query': query, **params}, headers=hdrs)
+        assert response.status_code == 200
+        return {item['value']: item['count'] for item in response.json['data']}
+
+    from_database = suggest('桥')
+    init_suggestion_index(client.application, background=False)
+    assert suggest('桥') == from_database == {
+        '虹桥枢纽': 2, '讨论虹桥进度': 2, '确认桥梁方案': 2, '杭州湾大桥': 1
+    }
+    assert suggest('桥', province='浙江') == {'杭州湾大桥': 1}
+    assert suggest('桥', hdrs=own) == {'杭州湾大桥': 1}
+
+    entry_id = create_entries(client, own, 1, project_name='杭州湾大桥', province='浙江')[0]
+    assert suggest('大桥', hdrs=own) == {'杭州湾大桥': 2}
+    client.put(f'/api/ledger/{entry_id}', json={'project_name': '宁波港'}, headers=headers)
+    assert suggest('大桥', hdrs=own) == {'杭州湾大桥': 1}
+    assert suggest('宁波', hdrs=own) == {'宁波港': 1}
+    client.delete(f'/api/ledger/{entry_id}', headers=headers)
+    assert suggest('宁波', hdrs=own) == {}
+
+    response = client.get('/api/meta/suggestions/locations', query_string={'query': '会议'}, headers=headers)
+    assert response.json['data'] == [{'value': '会议室', 'count': 3}]
+
+
+def test_suggestion_index_rebuild_does_not_double_count_changes_seen_by_the_scan(client, monkeypatch):
+    from app.utils import suggestions
+    from app.utils.ledger_events import LedgerChange, snapshot
+
+    headers = auth_headers(client)
+    first, second = create_entries(client, headers, 2, project_name='虹桥枢纽')
+    created = LedgerChange('create', first, None, snapshot(db.session.get(LedgerEntry, first)))
+    old = snapshot(db.session.get(LedgerEntry, second))
+    renamed = LedgerChange('update', second, old, dict(old, project_name='虹桥二期'))
+    index = suggestions.SuggestionIndex()
+    add = suggestions._SuggestionStore.add
+
+    def add_during_scan(store, values, delta=1):
+        # 扫描期间送达两条提交事件：新建已包含在扫描结果中，改名发生在扫描快照之后
+        if index._pending == []:
+            index.apply([created, renamed])
+        add(store, values, delta)
+
+    monkeypatch.setattr(suggestions._SuggestionStore, 'add', add_during_scan)
+    index.rebuild()
+    assert dict(index.lookup([suggestions.PROJECT], '虹桥')) == {'虹桥枢纽': 1, '虹桥二期': 1}
+
+
+def test_csv_export_is_streamed(client):
+    headers = auth_headers(client)
+    create_entries(client, headers, 3, province='安徽')
+    create_entries(client, headers, 1, province='福建')
+
+    response = client.get('/api/meta/export/ledger', query_string={'province': '安徽'}, headers=headers)
+    assert response.status_code == 200
+    assert response.is_streamed
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0].startswith('\ufeffID,录入人员,省份')
+    assert len(lines) == 4
+    assert all(',安徽,' in line for line in lines[1:])
+
+
+def test_excel_exports_use_write_only_workbooks(client):
+    import io
+    from openpyxl import load_workbook
+
+    headers = auth_headers(client)
+    create_entries(client, headers, 3, specific_matters='这是一个比较长的具体事项描述，用于检查列宽。')
+
+    response = client.get('/api/meta/export/ledger', query_string={'format': 'excel'}, headers=headers)
+    assert response.status_code == 200
+    assert int(response.headers['Content-Length']) == len(response.data)
+    ws = load_workbook(io.BytesIO(response.data)).active
+    rows = list(ws.values)
+    assert rows[0][:3] == ('ID', '录入人员', '省份')
+    assert len(rows) == 4
+    assert ws['A1'].font.bold
+    assert ws.column_dimensions['I'].width == len('这是一个比较长的具体事项描述，用于检查列宽。') + 2
+
+    admin = auth_headers(client, 'admin', 'admin123')
+    response = client.get('/api/admin/export/logs', query_string={'format': 'excel'}, headers=admin)
+    assert response.status_code == 200
+    rows = list(load_workbook(io.BytesIO(response.data)).active.values)
+    assert rows[0] == ('ID', '时间', '级别', '用户', '消息', 'IP地址', '详情')
+    assert 'ledger_user' in {row[3] for row in rows[1:]}
+
+
+def test_export_job_runs_in_background(client, tmp_path):
+    import io
+    import json
+    import time
+    from openpyxl import load_workbook
+    from app.utils.export_jobs import fail_unfinished, read_status
+
+    client.application.config['EXPORT_JOB_DIR'] = str(tmp_path)
+    headers = auth_headers(client)
+    other = auth_headers(client, 'other_user', role='user')
+    create_entries(client, headers, 3, province='山东')
+    create_entries(client, headers, 2, province='江西')
+
+    response = client.post('/api/meta/export/jobs', json={'format': 'excel', 'province': '山东'}, headers=headers)
+    assert response.status_code == 202
+    job = response.json['data']
+    assert job['status'] == 'pending'
+
+    deadline = time.time() + 60
+    while job['status'] in ('pending', 'running') and time.time() < deadline:
+        time.sleep(0.2)
+        job = client.get(job['status_url'], headers=headers).json['data']
+    assert job['status'] == 'done', job
+    assert job['progress'] == job['total'] == 3
+
+    assert client.get(job['status_url'], headers=other).status_code == 404
+    response = client.get(job['file_url'], headers=headers)
+    assert response.status_code == 200
+    rows = list(load_workbook(io.BytesIO(response.data)).active.values)
+    assert len(rows) == 4
+    assert {row[2] for row in rows[1:]} == {'山东'}
+
+    assert client.post('/api/meta/export/jobs', json={'format': 'pdf'}, headers=headers).status_code == 400
+    assert client.get('/api/meta/export/jobs/../../etc', headers=headers).status_code == 404
+
+    # 已完成的任务不会被迟到的失败回调覆盖
+    assert not fail_unfinished(str(tmp_path), job['id'], 'late failure')
+    assert read_status(str(tmp_path), job['id'])['status'] == 'done'
+
+    # worker 重启后遗留的运行中任务超时后标记为失败，不再占用排队名额
+    stale = dict(job, id='f' * 32, status='running', updated_at='2000-01-01T00:00:00')
+    (tmp_path / f"{stale['id']}.json").write_text(json.dumps(stale), encoding='utf-8')
+    client.application.config['EXPORT_JOB_MAX_PENDING'] = 1
+    assert client.get(f"/api/meta/export/jobs/{stale['id']}", headers=headers).json['data']['status'] == 'failed'
+    response = client.post('/api/meta/export/jobs', json={'format': 'csv'}, headers=headers)
+    assert response.status_code == 202
+    job = response.json['data']
+    while job['status'] in ('pending', 'running') and time.time() < deadline:
+        time.sleep(0.2)
+        job = client.get(job['status_url'], headers=headers).json['data']
+    assert job['status'] == 'done', job
+
+
+def test_export_cache_hits_until_ledger_changes(client, tmp_path):
+    client.application.config.update(EXPORT_CACHE_ENABLED=True, EXPORT_CACHE_DIR=str(tmp_path))
+    headers = auth_headers(client)
+    entry_id = create_entries(client, headers, 2)[0]
+
+    def export(**params):
+        return client.get('/api/meta/export/ledger', query_string={'format': 'word', **params}, headers=headers)
+
+    first = export(province='上海')
+    assert first.headers['X-Export-Cache'] == 'MISS'
+    second = export(province='上海')
+    assert second.headers['X-Export-Cache'] == 'HIT'
+    assert second.data == first.data
+    assert export(province='江苏').headers['X-Export-Cache'] == 'MISS'
+
+    client.put(f'/api/ledger/{entry_id}', json={'location': '现场'}, headers=headers)
+    assert export(province='上海').headers['X-Export-Cache'] == 'MISS'
+
+    # 超出容量时淘汰最久未使用的文件
+    client.application.config['EXPORT_CACHE_MAX_BYTES'] = 1
+    export(province='浙江')
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_audit_queue_writes_in_batches(client):
+    from app.models import ActivityLog
+    from app.utils.audit import AuditQueue
+
+    app = client.application
+    audit_queue = AuditQueue(app, flush_interval=0.05, batch_size=2)
+    for i in range(5):
+        assert audit_queue.put({'level': 'INFO', 'message': f'批量日志{i}', 'user_id': None})
+    audit_queue.close()
+    messages = {log.message for log in ActivityLog.query.filter(ActivityLog.message.like('批量日志%'))}
+    assert messages == {f'批量日志{i}' for i in range(5)}
+
+    full_queue = AuditQueue(app, max_size=1)
+    full_queue._ensure_started = lambda: None
+    assert full_queue.put({'level': 'INFO', 'message': 'x'})
+    assert not full_queue.put({'level': 'INFO', 'message': 'y'})
+    full_queue._queue.get_nowait()
+
+
+def test_statistics_rollups_follow_ledger_writes(client):
+    from app.models import LedgerDailyNatureStat
+    from app.utils.rollups import rebuild_rollups
+
+    headers = auth_headers(client)
+    admin = auth_headers(client, username='admin', password='admin123')
+    ids = create_entries(client, headers, 3)
+    create_entries(client, admin, 1, province='江苏', nature='检查')
+    client.put(f'/api/ledger/{ids[0]}', json={'province': '浙江'}, headers=headers)
+    client.delete(f'/api/ledger/{ids[1]}', headers=headers)
+
+    def snapshot():
+        stats = client.get('/api/admin/statistics', headers=admin).json['data']['entries']
+        by_user = client.get('/api/meta/stats/ledger_by_user', headers=headers).json['data']
+        natures = {row.nature: row.count for row in LedgerDailyNatureStat.query if row.count}
+        return stats, sorted(by_user['total'], key=lambda item: item['username']), natures
+
+    stats, totals, natures = snapshot()
+    assert stats == {'total': 3, 'recent_7_days': 3, 'by_province': {'上海': 1, '浙江': 1, '江苏': 1}}
+    assert totals == [{'username': 'admin', 'count': 1}, {'username': 'ledger_user', 'count': 2}]
+    assert natures == {'会议纪要': 2, '检查': 1}
+
+    # 全量重建的结果与增量维护一致
+    assert rebuild_rollups() == 3
+    assert snapshot() == (stats, totals, natures)
+
+    # 最近 7 天包括今天在内共 7 个 UTC 自然日
+    from datetime import datetime, timedelta
+    from app.utils.rollups import rollup_start_day
+    assert rollup_start_day(7) == (datetime.utcnow() - timedelta(days=6)).date()
+    entry = db.session.get(LedgerEntry, ids[2])
+    entry.created_at = datetime.utcnow() - timedelta(days=7)
+    db.session.commit()
+    rebuild_rollups()
+    assert client.get('/api/admin/statistics', headers=admin).json['data']['entries']['recent_7_days'] == 2
+
+
+def test_user_entry_count_is_maintained_and_sortable(client):
+    from sqlalchemy import event
+    from app.utils.rollups import repair_entry_counts
+
+    headers = auth_headers(client)
+    admin = auth_headers(client, username='admin', password='admin123')
+    auth_headers(client, username='idle_user')
+    ids = create_entries(client, headers, 3)
+    create_entries(client, admin, 1)
+    client.delete(f'/api/ledger/{ids[0]}', headers=headers)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get('/api/admin/users', query_string={'sort': 'entry_count', 'order': 'desc'}, headers=admin)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    users = [(user['username'], user['entry_count']) for user in response.json['data']['users']]
+    assert users == [('ledger_user', 2), ('admin', 1), ('idle_user', 0)]
+    # 台账数量直接取自 users 表，不再逐行 COUNT 台账
+    assert not [s for s in statements if 'ledger_entries' in s]
+
+    User.query.filter_by(username='ledger_user').update({'entry_count': 99})
+    db.session.commit()
+    assert repair_entry_counts() == 1
+    assert User.query.filter_by(username='ledger_user').one().entry_count == 2
+
+
+def test_sqlite_pragmas_applied_on_connect(client):
+    from app.utils.sqlite_pragmas import apply_pragmas, read_pragmas
+
+    with db.engine.connect() as conn:
+        assert read_pragmas(conn.connection.dbapi_connection, ['busy_timeout']) == {'busy_timeout': 5000}
+
+    import sqlite3
+    raw = sqlite3.connect(':memory:')
+    apply_pragmas(raw, {'foreign_keys': 'ON', 'temp_store': 'MEMORY', 'cache_size': -2048})
+    assert raw.execute('PRAGMA foreign_keys').fetchone() == (1,)
+    assert raw.execute('PRAGMA temp_store').fetchone() == (2,)
+    assert raw.execute('PRAGMA cache_size').fetchone() == (-2048,)
+    raw.close()
+
+
+def test_migrations_add_indexes_and_advisor_uses_them(client):
+    from sqlalchemy import inspect, text
+    from app.utils.db_advisor import advise
+    from app.utils.migrations import MIGRATIONS, run_migrations, get_schema_version
+
+    app = client.application
+    # 模拟旧库：删除新增索引并回退结构版本
+    with db.engine.begin() as conn:
+        conn.execute(text('DROP INDEX ix_ledger_entries_province_created_at'))
+        conn.execute(text('DROP INDEX ix_activity_logs_level_timestamp'))
+        conn.execute(text("UPDATE data_versions SET version = 0 WHERE name = 'schema'"))
+    applied = run_migrations(app)
+    assert [item.version for item in applied] == [item.version for item in MIGRATIONS]
+    assert run_migrations(app) == []
+    with db.engine.connect() as conn:
+        assert get_schema_version(conn) == MIGRATIONS[-1].version
+    index_names = {index['name'] for index in inspect(db.engine).get_indexes('ledger_entries')}
+    assert 'ix_ledger_entries_province_created_at' in index_names
+
+    create_entries(client, auth_headers(client), 2)
+    # 管理员修改过密码（令牌代数增加）后顾问签发的令牌仍然有效
+    admin = User.query.filter_by(username='admin').one()
+    admin.token_generation += 1
+    db.session.commit()
+    results = {result['name']: result for result in advise(app)}
+    assert all(result['status'] == 200 for result in results.values())
+    for name in ('ledger list by province', 'ledger list by date', 'activity logs by level'):
+        issues = [issue for statement in results[name]['statements'] for issue in statement['issues']]
+        assert not [issue for issue in issues if 'ledger_entries' in issue or 'activity_logs' in issue], (name, issues)
+
+
+def test_advisor_captures_queries_routed_to_read_engine(client, monkeypatch):
+    from app.config import TestingConfig
+    from app.utils.db_advisor import advise
+
+    create_entries(client, auth_headers(client), 2)
+    # 读写分离时 GET 请求的查询走只读引擎（这里用同一数据库文件）
+    monkeypatch.setattr(TestingConfig, 'READ_ROUTING_ENABLED', True)
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_READ_DATABASE_URI',
+                        db.engine.url.render_as_string(hide_password=False))
+    app = create_app('testing')
+    assert app.extensions['read_engine'] is not None
+    with app.app_context():
+        try:
+            results = {result['name']: result for result in advise(app)}
+        finally:
+            db.session.remove()
+            app.extensions['read_engine'].dispose()
+    assert all(result['statements'] for result in results.values()), \
+        [name for name, result in results.items() if not result['statements']]
+
+
+def test_get_requests_read_from_replica_unless_read_your_writes(client, tmp_path):
+    from datetime import date
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from app.utils.db_routing import init_read_routing, READ_YOUR_WRITES_HEADER
+
+    # 用另一个数据库文件模拟副本，其中只有一条台账
+    replica_uri = f"sqlite:///{tmp_path / 'replica.db'}"
+    replica = create_engine(replica_uri)
+    db.metadata.create_all(replica)
+    with Session(replica) as session:
+        session.add(User(id=500, username='replica_user', password_hash='x'))
+        session.add(LedgerEntry(
+            id=1000, user_id=500, province='上海', project_name='副本项目', date=date(2024, 5, 1),
+            location='会议室', personnel='张三', nature='会议纪要', specific_matters='副本'
+        ))
+        session.commit()
+    replica.dispose()
+
+    app = client.application
+    app.config['SQLALCHEMY_READ_DATABASE_URI'] = replica_uri
+    engine = init_read_routing(app, db)
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql('PRAGMA query_only').scalar() == 1
+
+    headers = auth_headers(client)
+    create_entries(client, headers, 2)
+
+    def project_names(extra_headers=None):
+        response = client.get('/api/ledger', headers={**headers, **(extra_headers or {})})
+        assert response.status_code == 200
+        return sorted(item['project_name'] for item in response.json['data']['items'])
+
+    assert project_names() == ['副本项目']
+    assert project_names({READ_YOUR_WRITES_HEADER: '1'}) == ['项目0', '项目1']
+    engine.dispose()
+
+
+def test_lookup_and_detail_endpoints_support_conditional_get(client):
+    from app.models import Province
+
+    headers = auth_headers(client)
+    for path in ('/api/provinces', '/api/meta/provinces', '/api/nature-options', '/api/meta/nature-options'):
+        first = client.get(path, headers=headers)
+        assert first.status_code == 200 and first.headers['ETag']
+        again = client.get(path, headers={**headers, 'If-None-Match': first.headers['ETag']})
+        assert again.status_code == 304 and again.data == b''
+
+    # 省份变更提交后缓存失效、ETag 改变
+    etag = client.get('/api/provinces', headers=headers).headers['ETag']
+    db.session.add(Province(name='北京'))
+    db.session.commit()
+    response = client.get('/api/provinces', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200 and '北京' in response.json['data']
+    assert response.headers['ETag'] != etag
+
+    entry_id = create_entries(client, headers, 1)[0]
+    etag = client.get(f'/api/ledger/{entry_id}', headers=headers).headers['ETag']
+    assert client.get(f'/api/ledger/{entry_id}', headers={**headers, 'If-None-Match': etag}).status_code == 304
+    client.put(f'/api/ledger/{entry_id}', json={'location': '现场'}, headers=headers)
+    response = client.get(f'/api/ledger/{entry_id}', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200 and response.json['data']['location'] == '现场'
+
+    # 详情包含录入人员用户名，用户改名后 ETag 同样改变
+    etag = response.headers['ETag']
+    User.query.filter_by(username='ledger_user').one().username = 'renamed_user'
+    db.session.commit()
+    response = client.get(f'/api/ledger/{entry_id}', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+    assert 'renamed_user' in response.get_data(as_text=True)
+
+
+def test_responses_are_gzip_compressed_including_streams(client):
+    import gzip
+
+    headers = auth_headers(client)
+    create_entries(client, headers, 30, specific_matters='很长的具体事项内容。' * 20)
+
+    plain = client.get('/api/ledger', query_string={'pageSize': 30}, headers=headers)
+    assert 'Content-Encoding' not in plain.headers
+    response = client.get('/api/ledger', query_string={'pageSize': 30},
+                          headers={**headers, 'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert int(response.headers['Content-Length']) < len(plain.data)
+    assert gzip.decompress(response.data) == plain.data
+
+    # 小于阈值的响应不压缩
+    small = client.get('/api/nature-options', headers={**headers, 'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
+
+    # 流式 CSV 导出逐块压缩，仍为流式响应
+    export = client.get('/api/meta/export/ledger', query_string={'format': 'csv'},
+                        headers={**headers, 'Accept-Encoding': 'gzip'}, buffered=False)
+    assert export.headers['Content-Encoding'] == 'gzip'
+    assert export.is_streamed and 'Content-Length' not in export.headers
+    chunks = list(export.response)
+    export.close()
+    assert len(chunks) > 1
+    text = gzip.decompress(b''.join(chunks)).decode('utf-8-sig')
+    assert text.count('很长的具体事项内容') == 30 * 20
+
+
+@pytest.mark.parametrize('provider', ['orjson', 'stdlib'])
+def test_projection_list_matches_orm_serialization(client, provider):
+    from app.models import ActivityLog
+    from app.utils.json_provider import init_json_provider
+
+    app = client.application
+    app.config['JSON_PROVIDER'] = provider
+    init_json_provider(app)
+    headers = auth_headers(client)
+    admin = auth_headers(client, username='admin', password='admin123')
+    entry_id = create_entries(client, headers, 1, follow_up_points=None)[0]
+
+    listed = client.get('/api/ledger', headers=headers).json['data']['items'][0]
+    assert listed == client.get(f'/api/ledger/{entry_id}', headers=headers).json['data']
+
+    db.session.add(ActivityLog(level='INFO', message='投影测试', details='详情', ip_address='127.0.0.1',
+                               user_id=User.query.filter_by(username='admin').one().id))
+    db.session.commit()
+    logs = client.get('/api/admin/logs', headers=admin).json['data']['logs']
+    expected = ActivityLog.query.filter_by(message='投影测试').one().to_dict()
+    assert [log for log in logs if log['message'] == '投影测试'] == [expected]
+
+
+def test_batch_endpoint_validates_all_then_writes_in_one_transaction(client):
+    from app.utils.rollups import rebuild_rollups
+
+    owner = auth_headers(client, username='plain_user', role='user')
+    other = auth_headers(client, username='other_user', role='user')
+    mine = create_entries(client, owner, 2)
+    theirs = create_entries(client, other, 1)
+    new_entry = {
+        'province': '江苏', 'project_name': '批量项目', 'date': '2024-05-02', 'location': '现场',
+        'personnel': '李四', 'nature': '检查', 'specific_matters': '批量新建。'
+    }
+
+    # 任一操作不合法时整批不写入，并返回每项的校验结果
+    response = client.post('/api/ledger/batch', json={'operations': [
+        {'op': 'create', 'data': new_entry},
+        {'op': 'update', 'id': theirs[0], 'data': {'location': '越权'}},
+        {'op': 'delete', 'id': 999999},
+        {'op': 'create', 'data': dict(new_entry, date='2024/05/02')},
+    ]}, headers=owner)
+    assert response.status_code == 400
+    assert [item.get('code') for item in response.json['data']['results']] == [None, 403, 404, 400]
+    assert LedgerEntry.query.count() == 3
+
+    # 修改时必填字段不能置空，字段必须是字符串，id 不能是布尔值
+    response = client.post('/api/ledger/batch', json={'operations': [
+        {'op': 'update', 'id': mine[0], 'data': {'province': None}},
+        {'op': 'update', 'id': mine[1], 'data': {'location': '  '}},
+        {'op': 'update', 'id': True, 'data': {'location': '现场'}},
+        {'op': 'create', 'data': dict(new_entry, personnel=123)},
+    ]}, headers=owner)
+    assert response.status_code == 400
+    assert [item.get('code') for item in response.json['data']['results']] == [400, 400, 400, 400]
+
+    response = client.post('/api/ledger/batch', json={'operations': [
+        {'op': 'create', 'data': new_entry},
+        {'op': 'create', 'data': dict(new_entry, project_name='批量项目二')},
+        {'op': 'update', 'id': mine[0], 'data': {'province': '浙江'}},
+        {'op': 'delete', 'id': mine[1]},
+    ]}, headers=owner)
+    assert response.status_code == 200
+    results = response.json['data']['results']
+    created = [item['id'] for item in results[:2]]
+    assert db.session.get(LedgerEntry, created[1]).project_name == '批量项目二'
+    assert db.session.get(LedgerEntry, mine[0]).province == '浙江'
+    assert db.session.get(LedgerEntry, mine[1]) is None
+
+    # 全文索引、用户台账数和统计汇总与逐条写入时一致
+    response = client.get('/api/ledger', query_string={'q': '批量新建'}, headers=owner)
+    assert sorted(item['id'] for item in response.json['data']['items']) == created
+    assert User.query.filter_by(username='plain_user').one().entry_count == 3
+    admin = auth_headers(client, username='admin', password='admin123')
+    stats = client.get('/api/admin/statistics', headers=admin).json['data']['entries']
+    assert stats['by_province'] == {'江苏': 2, '浙江': 1, '上海': 1}
+    assert rebuild_rollups() == 4
+    assert client.get('/api/admin/statistics', headers=admin).json['data']['entries'] == stats
+
+
+def test_import_reads_exported_files_and_reports_bad_rows(client):
+    import io
+    from datetime import datetime
+    from openpyxl import Workbook
+    from app.utils.ledger_export import LEDGER_EXPORT_HEADERS
+
+    headers = auth_headers(client)
+    importer = auth_headers(client, username='importer')
+    create_entries(client, headers, 3)
+    exported = client.get('/api/meta/export/ledger', query_string={'format': 'csv'}, headers=headers).data
+
+    # 导出的 CSV 可以直接导回，录入人员按用户名映射
+    response = client.post('/api/meta/import/ledger', data={'file': (io.BytesIO(exported), 'ledger.csv')},
+                           headers=importer, content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert response.json['data'] == {'total': 3, 'imported': 3, 'failed': 0, 'dry_run': False, 'errors': []}
+    assert User.query.filter_by(username='ledger_user').one().entry_count == 6
+
+    # Excel：日期单元格、空录入人员（归属导入用户）、未知录入人员和缺少必填字段
+    wb = Workbook()
+    ws = wb.active
+    ws.append(LEDGER_EXPORT_HEADERS)
+    row = ['', '', '江苏', '导入项目', None, '现场', '李四', '检查', '导入事项。', '', '2023-01-02 08:00:00']
+    ws.append(row[:4] + [datetime(2023, 1, 2)] + row[5:])
+    ws.append(row[:1] + ['nobody'] + row[2:4] + ['2023-01-02'] + row[5:])
+    ws.append(row[:4] + ['2023-01-02', ''] + row[6:])
+    output = io.BytesIO()
+    wb.save(output)
+    output.seek(0)
+    response = client.post('/api/meta/import/ledger', data={'file': (output, 'ledger.xlsx')},
+                           headers=importer, content_type='multipart/form-data')
+    data = response.json['data']
+    assert (data['total'], data['imported'], data['failed']) == (3, 1, 2)
+    assert data['errors'] == [
+        {'row': 3, 'message': 'Unknown recorder "nobody"'},
+        {'row': 4, 'message': 'Field "location" is required'},
+    ]
+    entry = LedgerEntry.query.filter_by(project_name='导入项目').one()
+    assert entry.user_id == User.query.filter_by(username='importer').one().id
+    assert entry.created_at == datetime(2023, 1, 2, 8)
+    response = client.get('/api/ledger', query_string={'q': '导入事项'}, headers=headers)
+    assert [item['id'] for item in response.json['data']['items']] == [entry.id]
+
+    # 普通用户不能导入
+    plain = auth_headers(client, username='plain_user', role='user')
+    response = client.post('/api/meta/import/ledger', data={'file': (io.BytesIO(exported), 'ledger.csv')},
+                           headers=plain, content_type='multipart/form-data')
+    assert response.status_code == 403
+
+
+# 生产环境 wsgi 导入（含 create_app）的耗时上限，微秒
+STARTUP_IMPORT_BUDGET_US = 2_000_000
+
+
+def test_production_startup_is_lazy_and_within_import_budget(tmp_path):
+    import os
+    import subprocess
+    import sys
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    database = tmp_path / 'cold.db'
+    env = dict(
+        os.environ,
+        PYTHONPATH=backend_dir,
+        FLASK_ENV='production',
+        DATABASE_URL=f'sqlite:///{database}',
+        SUGGESTION_INDEX_ENABLED='false',
+    )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import wsgi'],
+        cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    # 每行格式：import time: self [us] | cumulative | 模块名（缩进表示层级）
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, total, name = line.split('|')
+            if total.strip().isdigit():
+                cumulative[name.strip()] = int(total)
+    assert cumulative['wsgi'] < STARTUP_IMPORT_BUDGET_US
+    # 导出依赖在第一次导出时才导入
+    assert not [name for name in cumulative if name.split('.')[0] in ('openpyxl', 'docx')]
+    # 启动时不打印路由、不连接数据库（SQLite 连接时才会创建文件）
+    assert '[ROUTE]' not in result.stdout
+    assert not database.exists()
+
+
+def test_user_cache_applies_role_changes_and_revokes_tokens(client):
+    from sqlalchemy import event
+
+    admin = auth_headers(client, username='admin', password='admin123')
+    boss = auth_headers(client, username='boss', role='admin')
+    boss_id = User.query.filter_by(username='boss').one().id
+    assert client.get('/api/admin/users', headers=boss).status_code == 200
+
+    # 令牌校验和 /api/me 命中缓存，不查询用户表
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        response = client.get('/api/me', headers=boss)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert response.json['data']['username'] == 'boss'
+    assert not [s for s in statements if 'users' in s]
+
+    # 降级后旧令牌立即失去管理员权限
+    client.put(f'/api/admin/users/{boss_id}/role', json={'role': 'user'}, headers=admin)
+    assert client.get('/api/admin/users', headers=boss).status_code == 403
+    assert client.get('/api/me', headers=boss).json['data']['role'] == 'user'
+
+    # 修改密码后之前签发的令牌失效
+    response = client.post('/api/change-password', json={'old_password': 'secret123', 'new_password': 'secret456'},
+                           headers=boss)
+    assert response.status_code == 200
+    assert client.get('/api/me', headers=boss).status_code == 401
+    boss = auth_headers(client, username='boss', password='secret456')
+    assert client.get('/api/me', headers=boss).status_code == 200
+
+    # 删除用户后令牌失效
+    client.delete(f'/api/admin/users/{boss_id}', headers=admin)
+    assert client.get('/api/me', headers=boss).status_code == 401
+
+
+def test_metrics_record_latency_db_queries_and_export_rows(client):
+    import re
+
+    headers = auth_headers(client)
+    create_entries(client, headers, 3)
+    client.get('/api/ledger', headers=headers)
+    client.get('/api/no-such-page')
+    export = client.get('/api/meta/export/ledger', query_string={'format': 'csv'}, headers=headers, buffered=False)
+    body = b''.join(export.response)
+    export.close()
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+
+    def sample(name, **labels):
+        label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+        match = re.search(rf'^{name}\{{{re.escape(label_text)}\}} (\S+)$', text, re.M)
+        return float(match.group(1)) if match else None
+
+    assert sample('http_request_duration_seconds_count', endpoint='ledger.create_ledger_entry',
+                  method='POST', status='201') == 3
+    assert sample('http_request_duration_seconds_count', endpoint='unmatched', method='GET', status='404') == 1
+    # 流式导出在响应体输出完毕时记录大小
+    assert sample('http_response_size_bytes_sum', endpoint='meta.export_ledger',
+                  method='GET', status='200') == len(body)
+    assert sample('http_request_db_queries_count', endpoint='ledger.get_ledger_entries') == 1
+    assert sample('http_request_db_queries_sum', endpoint='ledger.get_ledger_entries') >= 1
+    assert sample('export_rows_total', dataset='ledger', format='csv') == 3
+    # 流式导出的查询在输出响应体时执行，同样计入该请求
+    assert sample('http_request_db_queries_sum', endpoint='meta.export_ledger') >= 1
+    assert re.search(r'^db_query_duration_seconds_count \d+$', text, re.M)
+    # 抓取 /metrics 本身正在处理中
+    assert re.search(r'^http_requests_in_flight 1$', text, re.M)
+
+
+def test_metrics_are_aggregated_across_worker_processes(tmp_path, monkeypatch):
+    import json
+    import os
+    import re
+    import subprocess
+    import sys
+    from app.config import TestingConfig
+    from app.utils.metrics import Metrics
+
+    monkeypatch.setattr(TestingConfig, 'METRICS_MULTIPROCESS', True)
+    monkeypatch.setattr(TestingConfig, 'METRICS_MULTIPROCESS_DIR', str(tmp_path))
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    other = Metrics()
+    other.request_duration.observe(0.01, ('ledger.get_ledger_entries', 'GET', '200'))
+    other.in_flight.inc()
+    # 同一 master 下的另外两个 worker（一个仍在运行、一个已退出），以及已停止的旧服务留下的文件
+    for name in (f'{os.getppid()}-{os.getppid()}', f'{os.getppid()}-{exited.pid}', f'{exited.pid}-1'):
+        (tmp_path / f'{name}.json').write_text(json.dumps(other.snapshot()))
+
+    app = create_app('testing')
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            try:
+                headers = auth_headers(client)
+                client.get('/api/ledger', headers=headers)
+                text = client.get('/metrics').get_data(as_text=True)
+                assert re.search(r'^http_request_duration_seconds_count\{endpoint="ledger.get_ledger_entries",'
+                                 r'method="GET",status="200"\} 3$', text, re.M)
+                # 并发数只计入运行中的进程：本进程正在处理的抓取请求和仍在运行的 worker
+                assert re.search(r'^http_requests_in_flight 2$', text, re.M)
+                assert not (tmp_path / f'{exited.pid}-1.json').exists()
+
+                app.extensions['metrics_files'].write(app.extensions['metrics'])
+                snapshot = json.loads((tmp_path / f'{os.getppid()}-{os.getpid()}.json').read_text())
+                assert snapshot['http_request_duration_seconds']
+            finally:
+                db.session.remove()
+                db.drop_all()
+
+
+def test_slow_query_log_records_params_endpoint_and_plan(tmp_path, monkeypatch):
+    import json
+    from app.config import TestingConfig
+
+    log_path = tmp_path / 'slow_queries.jsonl'
+    monkeypatch.setattr(TestingConfig, 'SLOW_QUERY_THRESHOLD_MS', 0)
+    monkeypatch.setattr(TestingConfig, 'SLOW_QUERY_LOG_PATH', str(log_path))
+    app = create_app('testing')
+    with app.test_client() as client:
+        with app.app_context():
+            db.create_all()
+            try:
+                headers = auth_headers(client, username='admin', password='admin123')
+                create_entries(client, headers, 2, province='安徽')
+                response = client.get('/api/ledger', query_string={'province': '安徽'}, headers=headers)
+                assert response.status_code == 200
+                # 其他 worker 进程写入同一日志文件的记录也计入汇总
+                other_worker = {'timestamp': '2024-05-01T08:30:00', 'duration_ms': 5000.0, 'endpoint': 'GET other',
+                                'sql': 'SELECT 1 FROM other_worker', 'parameters': [], 'executemany': False,
+                                'plan': None, 'issues': []}
+                with log_path.open('a', encoding='utf-8') as f:
+                    f.write(json.dumps(other_worker) + '\n')
+
+                response = client.get('/api/admin/slow-queries', query_string={'limit': 100}, headers=headers)
+                assert response.status_code == 200
+                queries = response.json['data']['queries']
+                assert queries[0]['sql'] == other_worker['sql']
+                totals = [q['total_ms'] for q in queries]
+                assert totals == sorted(totals, reverse=True)
+
+                listing = [q for q in queries if 'ledger.get_ledger_entries' in ' '.join(q['endpoints'])
+                           and q['sql'].startswith('SELECT') and '安徽' in (q['parameters'] or [])]
+                assert listing and all(q['plan'] for q in listing)
+
+                # 涉及密码哈希的语句参数脱敏
+                user_selects = [q for q in queries if 'password_hash' in q['sql']]
+                assert user_selects and all(set(q['parameters']) <= {'***'} for q in user_selects)
+
+                records = [json.loads(line) for line in log_path.read_text(encoding='utf-8').splitlines()]
+                assert {'sql', 'parameters', 'endpoint', 'plan', 'duration_ms'} <= set(records[-1])
+                assert len(records) >= sum(q['count'] for q in queries)
+            finally:
+                db.session.remove()
+                db.drop_all()
+
+
+def test_search_index_is_used_without_auto_init(monkeypatch):
+    from app.config import TestingConfig
+
+    # 先按 flask init-db 的方式建库，再以生产默认（不自动初始化）启动应用
+    setup_app = create_app('testing')
+    monkeypatch.setattr(TestingConfig, 'AUTO_INIT_DB', False)
+    app = create_app('testing')
+    assert 'ledger_search' not in app.extensions
+    with app.test_client() as client:
+        with app.app_context():
+            try:
+                headers = auth_headers(client)
+                entry_id, = create_entries(client, headers, 1, project_name='冷启动全文检索')
+                assert app.extensions['ledger_search'] is True
+                indexed = db.session.execute(db.text('SELECT rowid FROM ledger_fts')).scalars().all()
+                assert indexed == [entry_id]
+                response = client.get('/api/ledger', query_string={'q': '冷启动'}, headers=headers)
+                assert [item['id'] for item in response.json['data']['items']] == [entry_id]
+            finally:
+                db.session.remove()
+    with setup_app.app_context():
+        db.drop_all()
@@ -59,12 +59,12 @@ export function getNatureOptions() {
   })
 }
 
-// 获取项目搜索建议
+// 获取项目搜索建议（由后端建议索引提供，可传入关键字或 { query, province }）
 export function getProjectSuggestions(query) {
   return request({
-    url: '/suggestions/project_items',
+    url: '/meta/suggestions/project_items',
     method: 'get',
-    params: { query }
+    params: typeof query === 'string' ? { query } : query
   })
 }
 
@@ -1,4 +1,6 @@
 import { defineStore } from 'pinia'
+import axios from 'axios'
+import { API_BASE_URL } from '@/utils/axios_api_client_setup'
 
 export const useUserStore = defineStore('user', {
   state: () => ({
@@ -35,13 +37,23 @@ export const useUserStore = defineStore('user', {
   
   actions: {
     // 登录成功
-    loginSuccess(token, userInfo) {
+    loginSuccess(token, userInfo, refreshToken) {
       this.token = token
       this.userInfo = userInfo
       
       // 持久化到localStorage
       localStorage.setItem('token', token)
       localStorage.setItem('userInfo', JSON.stringify(userInfo))
+      if (refreshToken) {
+        localStorage.setItem('refresh_token', refreshToken)
+      }
+    },
+    
+    // 访问令牌刷新后更新令牌（刷新令牌每次刷新都会轮换）
+    updateTokens(token, refreshToken) {
+      this.token = token
+      localStorage.setItem('token', token)
+      localStorage.setItem('refresh_token', refreshToken)
     },
     
     // 更新用户信息
@@ -52,11 +64,21 @@ export const useUserStore = defineStore('user', {
     
     // 登出
     logout() {
+      // 通知后端撤销本次登录的刷新令牌（尽力而为，失败不影响本地登出）；
+      // 不经过 ApiClient，避免 401 拦截器再次触发刷新和登出
+      const refreshToken = localStorage.getItem('refresh_token')
+      if (refreshToken) {
+        axios.post(`${API_BASE_URL}/logout`, null, {
+          headers: { Authorization: `Bearer ${refreshToken}` }
+        }).catch(() => {})
+      }
+      
       this.token = null
       this.userInfo = {}
       
       // 清除localStorage
       localStorage.removeItem('token')
+      localStorage.removeItem('refresh_token')
       localStorage.removeItem('userInfo')
     }
   }
@@ -1,10 +1,13 @@
 import axios from 'axios'
 import { ElMessage } from 'element-plus'
 import router from '@/router'
+import { useUserStore } from '@/store/user'
+
+export const API_BASE_URL = 'http://localhost:5000/api'
 
 // 创建 Axios 实例
 const ApiClient = axios.create({
-  baseURL: 'http://localhost:5000/api',
+  baseURL: API_BASE_URL,
   timeout: 10000,
   headers: {
     'Content-Type': 'application/json',
@@ -12,6 +15,34 @@ const ApiClient = axios.create({
   }
 })
 
+// 写操作后的一段时间内，查询请求要求后端读主库（读写分离时保证读到刚写入的数据）
+const READ_YOUR_WRITES_MS = 5000
+let readYourWritesUntil = 0
+
+// 服务繁忙（503，如登录高峰）时按 Retry-After 自动重试的次数
+const BUSY_MAX_RETRIES = 3
+
+// 访问令牌过期时用刷新令牌换取新令牌；并发的 401 请求共用同一次刷新
+let refreshPromise = null
+
+const refreshAccessToken = () => {
+  if (!refreshPromise) {
+    const refreshToken = localStorage.getItem('refresh_token')
+    refreshPromise = (refreshToken
+      ? axios.post(`${API_BASE_URL}/refresh`, null, {
+          headers: { Authorization: `Bearer ${refreshToken}` }
+        }).then(res => {
+          useUserStore().updateTokens(res.data.access_token, res.data.refresh_token)
+          return res.data.access_token
+        })
+      : Promise.reject(new Error('No refresh token'))
+    ).finally(() => {
+      refreshPromise = null
+    })
+  }
+  return refreshPromise
+}
+
 // 请求拦截器
 ApiClient.interceptors.request.use(
   config => {
@@ -21,6 +52,9 @@ ApiClient.interceptors.request.use(
     if (token) {
       config.headers['Authorization'] = `Bearer ${token}`
     }
+    if ((config.method || 'get').toLowerCase() === 'get' && Date.now() < readYourWritesUntil) {
+      config.headers['X-Read-Your-Writes'] = '1'
+    }
     return config
   },
   error => {
@@ -33,9 +67,34 @@ ApiClient.interceptors.request.use(
 ApiClient.interceptors.response.use(
   response => {
     console.log('Response:', response.config.url, response.status, response.data)
+    if ((response.config.method || 'get').toLowerCase() !== 'get') {
+      readYourWritesUntil = Date.now() + READ_YOUR_WRITES_MS
+    }
     return response
   },
-  error => {
+  async error => {
+    const original = error.config
+    if (error.response?.status === 503 && original && (original._busyRetries || 0) < BUSY_MAX_RETRIES) {
+      original._busyRetries = (original._busyRetries || 0) + 1
+      // 跨域时可能读不到 Retry-After，默认等待 1 秒
+      const seconds = Number(error.response.headers['retry-after']) || 1
+      await new Promise(resolve => setTimeout(resolve, seconds * 1000))
+      return ApiClient(original)
+    }
+    
+    // 登录、刷新请求本身的 401 不再尝试刷新；每个请求只重试一次
+    if (error.response?.status === 401 && original && !original._retried &&
+        !['/login', '/refresh'].includes(original.url)) {
+      original._retried = true
+      try {
+        const token = await refreshAccessToken()
+        original.headers['Authorization'] = `Bearer ${token}`
+        return ApiClient(original)
+      } catch (refreshError) {
+        console.error('刷新登录状态失败:', refreshError)
+      }
+    }
+    
     console.error('API请求出错:', error.response || error.message)
     
     const errorMessage = error.response?.data?.message || error.message || '未知错误'
@@ -44,8 +103,7 @@ ApiClient.interceptors.response.use(
       switch (error.response.status) {
         case 401:
           ElMessage.error('登录状态已过期，请重新登录')
-          localStorage.removeItem('token')
-          localStorage.removeItem('userInfo')
+          useUserStore().logout()
           if (router.currentRoute.value.path !== '/login') {
             router.push('/login')
           }
@@ -65,6 +123,9 @@ ApiClient.interceptors.response.use(
         case 500:
           ElMessage.error(errorMessage || '服务器发生内部错误')
           break
+        case 503:
+          ElMessage.warning('服务繁忙，请稍后重试')
+          break
         default:
           ElMessage.error(`请求失败 (${error.response.status}): ${errorMessage}`)
       }